@@ -3,7 +3,7 @@ from django.contrib import admin
 # Register your models here.
 
 from django.contrib import admin
-from .models import ChessGame
+from .models import ChessGame, ImportJob
 
 class ChessGameAdmin(admin.ModelAdmin):
     list_display = ('user', 'game_date', 'time_control', 'white_player', 'black_player', 'result_description', 'moves_count', 'cached_at')
@@ -14,7 +14,7 @@ class ChessGameAdmin(admin.ModelAdmin):
     
     fieldsets = (
         (None, {
-            'fields': ('user', 'pgn'),
+            'fields': ('user', 'game_key', 'pgn'),
         }),
         ('Game Details', {
             'fields': ('game_date', 'time_control', 'result_description', 'moves_count'),
@@ -23,6 +23,16 @@ class ChessGameAdmin(admin.ModelAdmin):
         ('Players', {
             'fields': ('white_player', 'black_player'),
         }),
+        ('Derived Data', {
+            'fields': ('eco', 'opening_name', 'termination', 'final_fen', 'pgn_headers'),
+            'classes': ('collapse',),
+        }),
     )
 
-admin.site.register(ChessGame, ChessGameAdmin)
\ No newline at end of file
+admin.site.register(ChessGame, ChessGameAdmin)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'source_name', 'status', 'bytes_read', 'file_size', 'games_read', 'games_added', 'created_at', 'finished_at')
+    list_filter = ('status', 'is_upload')
+    search_fields = ('user__username', 'source_name')
@@ -0,0 +1,34 @@
+from django.db import connection
+
+
+# Counter tables (GameStats, ExplorerMove) are updated by adding deltas with
+# INSERT ... ON CONFLICT DO UPDATE, one executemany per batch. Both SQLite
+# (3.24+) and PostgreSQL support the syntax; the conflict target must be a
+# unique constraint of the model.
+
+UPSERT_SQL = (
+    'INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+    'ON CONFLICT ({keys}) DO UPDATE SET {increments}'
+)
+
+
+def increment_sql(model, key_fields, counter_fields):
+    table = model._meta.db_table
+    key_columns = [model._meta.get_field(name).column for name in key_fields]
+    counter_columns = [model._meta.get_field(name).column for name in counter_fields]
+    return UPSERT_SQL.format(
+        table=table,
+        columns=', '.join(key_columns + counter_columns),
+        placeholders=', '.join(['%s'] * (len(key_columns) + len(counter_columns))),
+        keys=', '.join(key_columns),
+        increments=', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in counter_columns),
+    )
+
+
+def increment_counters(model, key_fields, counter_fields, rows):
+    # rows: key values followed by counter deltas, in field order
+    if not rows:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.executemany(increment_sql(model, key_fields, counter_fields), rows)
+    return len(rows)
@@ -0,0 +1,96 @@
+import chess # type: ignore
+
+from .models import ChessGame
+from .movecodec import decode_clocks, encode_clocks, encode_moves, starting_board
+from .pgn_scan import scan_pgn
+from .positions import pack_hashes, position_hash
+from .search import opening_from_headers
+
+
+# Per-game data derived once at ingest (and by the backfill_game_data
+# command) and stored on ChessGame, so the analysis page reads one row
+# instead of re-parsing the PGN.
+
+# Phrases of chess.com's Termination header, most specific first
+# ("Game drawn by timeout vs insufficient material" is a draw, not a timeout)
+TERMINATION_PHRASES = (
+    ('checkmate', ChessGame.TERMINATION_CHECKMATE),
+    ('resignation', ChessGame.TERMINATION_RESIGNATION),
+    ('abandoned', ChessGame.TERMINATION_ABANDONED),
+    ('stalemate', ChessGame.TERMINATION_STALEMATE),
+    ('repetition', ChessGame.TERMINATION_REPETITION),
+    ('insufficient material', ChessGame.TERMINATION_INSUFFICIENT),
+    ('50-move', ChessGame.TERMINATION_FIFTY_MOVES),
+    ('agreement', ChessGame.TERMINATION_AGREEMENT),
+    ('on time', ChessGame.TERMINATION_TIMEOUT),
+)
+
+# Fallback when the header is missing, from the final position itself
+OUTCOME_TERMINATIONS = {
+    chess.Termination.CHECKMATE: ChessGame.TERMINATION_CHECKMATE,
+    chess.Termination.STALEMATE: ChessGame.TERMINATION_STALEMATE,
+    chess.Termination.INSUFFICIENT_MATERIAL: ChessGame.TERMINATION_INSUFFICIENT,
+    chess.Termination.FIVEFOLD_REPETITION: ChessGame.TERMINATION_REPETITION,
+    chess.Termination.SEVENTYFIVE_MOVES: ChessGame.TERMINATION_FIFTY_MOVES,
+}
+
+DERIVED_FIELDS = (
+    'moves_count', 'eco', 'opening_name', 'final_fen', 'termination', 'position_hashes',
+    'moves_packed', 'clocks_packed', 'pgn_headers', 'pgn', 'replay_failed',
+)
+
+
+def termination_from(headers, board):
+    text = headers.get('Termination', '').lower()
+    for phrase, termination in TERMINATION_PHRASES:
+        if phrase in text:
+            return termination
+    outcome = board.outcome() if board else None
+    return OUTCOME_TERMINATIONS.get(outcome.termination, '') if outcome else ''
+
+
+def has_full_moves(game):
+    # Whether moves_packed holds the whole mainline, not nothing or a prefix
+    # left by an older ingest
+    plies = len(bytes(game.moves_packed or b'')) // 2
+    return (plies + 1) // 2 == game.moves_count and (plies > 0 or game.final_fen != '')
+
+
+def apply_derived_data(game, summary=None):
+    # Fills the derived fields of an (unsaved or saved) ChessGame in place
+    summary = summary or scan_pgn(game.full_pgn())
+    headers = summary.headers
+
+    try:
+        board = starting_board(headers)
+        hashes = [position_hash(board)]
+        moves = []
+        for san in summary.moves:
+            moves.append(board.push_san(san))
+            hashes.append(position_hash(board))
+    except ValueError as e:
+        # A prefix of the moves would pass for the whole game: keep only the
+        # raw PGN, which the analysis page then parses itself
+        print(f"PGN hamle hatası ({game.game_key}): {e}")
+        board, moves, hashes = None, [], []
+
+    game.moves_count = (len(summary.moves) + 1) // 2
+    game.eco = headers.get('ECO', '')[:3]
+    game.opening_name = opening_from_headers(headers)[:200]
+    game.final_fen = board.fen() if board else ''
+    game.termination = termination_from(headers, board)
+    game.position_hashes = pack_hashes(hashes)
+    game.moves_packed = encode_moves(moves)
+    game.clocks_packed = encode_clocks(summary.clocks[:len(moves)])
+    game.pgn_headers = headers
+    game.replay_failed = board is None
+
+    # The packed form plus the headers rebuild the whole PGN (full_pgn()), so
+    # the text itself is only kept when that would lose something
+    lossless = (
+        board is not None and not summary.annotated and summary.result == headers.get('Result', '*')
+        and decode_clocks(game.clocks_packed) == summary.clocks
+    )
+    if lossless:
+        game.pgn = ''
+    return game
@@ -0,0 +1,216 @@
+import atexit
+import queue
+import shlex
+import threading
+from contextlib import contextmanager
+
+import chess # type: ignore
+import chess.engine # type: ignore
+from django.conf import settings
+
+from . import evalcache
+
+
+# Pool of long-lived local UCI engine processes (e.g. Stockfish) shared by the
+# requests of one web worker. At most CHESS_ENGINE_POOL_SIZE engines run at
+# once; up to CHESS_ENGINE_MAX_QUEUE requests wait for a free one, anything
+# beyond that is rejected right away with EngineBusy (backpressure).
+
+# Queued in place of a crashed engine when requests are waiting: the one that
+# takes it starts a fresh engine in the slot the crashed one held
+START_NEW = object()
+
+
+class EngineUnavailable(Exception):
+    pass
+
+
+class EngineBusy(Exception):
+    pass
+
+
+class EnginePool:
+
+    def __init__(self, command, size, threads=1, hash_mb=64, max_queue=8, queue_timeout=10):
+        self.command = command
+        self.size = size
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._waiting = 0
+        self._closed = False
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def _start_engine(self):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.command)
+        except (OSError, chess.engine.EngineError) as e:
+            raise EngineUnavailable(f"Could not start chess engine {self.command}: {e}") from e
+
+        options = {}
+        if 'Threads' in engine.options:
+            options['Threads'] = self.threads
+        if 'Hash' in engine.options:
+            options['Hash'] = self.hash_mb
+        if options:
+            engine.configure(options)
+        return engine
+
+    def acquire(self):
+        with self._lock:
+            if self._closed:
+                raise EngineUnavailable("Engine pool is closed.")
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = None
+
+            if engine is not None:
+                pass
+            elif self._started < self.size:
+                self._started += 1
+                engine = START_NEW
+            elif self._waiting >= self.max_queue:
+                raise EngineBusy("All engines are busy and the analysis queue is full.")
+            else:
+                self._waiting += 1
+
+        if engine is None:
+            try:
+                engine = self._idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                raise EngineBusy("Timed out waiting for a free engine.")
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        if engine is not START_NEW:
+            return engine
+        # The slot is already counted in _started
+        try:
+            return self._start_engine()
+        except EngineUnavailable:
+            with self._lock:
+                self._started -= 1
+            raise
+
+    def release(self, engine, broken=False):
+        if broken or self._closed:
+            # A crashed engine is dropped; a waiting request or the next
+            # acquire starts a fresh one
+            try:
+                engine.quit()
+            except Exception:
+                pass
+            with self._lock:
+                if self._waiting and not self._closed:
+                    self._idle.put(START_NEW)
+                else:
+                    self._started -= 1
+            return
+        self._idle.put(engine)
+
+    @contextmanager
+    def engine(self):
+        engine = self.acquire()
+        broken = False
+        try:
+            yield engine
+        except chess.engine.EngineError:
+            broken = True
+            raise
+        finally:
+            self.release(engine, broken=broken)
+
+    def analyse(self, board, limit):
+        with self.engine() as engine:
+            return engine.analyse(board, limit)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if engine is START_NEW:
+                continue
+            try:
+                engine.quit()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_engine_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not settings.CHESS_ENGINE_PATH:
+                    raise EngineUnavailable("CHESS_ENGINE_PATH is not configured.")
+                command = settings.CHESS_ENGINE_PATH
+                if isinstance(command, str):
+                    command = shlex.split(command)
+                _pool = EnginePool(
+                    command,
+                    size=settings.CHESS_ENGINE_POOL_SIZE,
+                    threads=settings.CHESS_ENGINE_THREADS,
+                    hash_mb=settings.CHESS_ENGINE_HASH_MB,
+                    max_queue=settings.CHESS_ENGINE_MAX_QUEUE,
+                    queue_timeout=settings.CHESS_ENGINE_QUEUE_TIMEOUT,
+                )
+                atexit.register(_pool.close)
+    return _pool
+
+
+def reset_engine_pool():
+    # Used by tests and after settings changes
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+def score_to_dict(score):
+    # Scores are reported from White's point of view
+    white_score = score.white()
+    return {'cp': white_score.score(), 'mate': white_score.mate()}
+
+
+def evaluate_position(board, depth=None, time_limit=None):
+    depth = min(depth or settings.CHESS_ENGINE_DEFAULT_DEPTH, settings.CHESS_ENGINE_MAX_DEPTH)
+    time_limit = min(time_limit or settings.CHESS_ENGINE_MAX_TIME, settings.CHESS_ENGINE_MAX_TIME)
+
+    # Positions repeat across games and users; a deep enough stored
+    # evaluation saves the engine call entirely
+    cached = evalcache.lookup(board, depth)
+    if cached is not None:
+        return dict(cached, fen=board.fen(), cached=True)
+
+    info = get_engine_pool().analyse(board, chess.engine.Limit(depth=depth, time=time_limit))
+
+    pv = info.get('pv', [])
+    evaluation = {
+        'fen': board.fen(),
+        'depth': info.get('depth', 0),
+        'score': score_to_dict(info['score']) if 'score' in info else None,
+        'best_move': pv[0].uci() if pv else None,
+        'pv': [move.uci() for move in pv],
+        'cached': False,
+    }
+    evalcache.store(board, evaluation)
+    return evaluation
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import PositionEvaluation
+from .positions import position_hash
+
+
+# Transposition-style store of engine evaluations, keyed by Zobrist hash and
+# side to move. An in-process LRU sits in front of the PositionEvaluation
+# table; both answer any request whose depth is at or below the stored depth.
+
+
+class LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = None
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LRUCache(settings.EVAL_CACHE_SIZE)
+    return _local_cache
+
+
+def position_key(board):
+    return position_hash(board), board.turn
+
+
+def row_to_evaluation(row):
+    return {
+        'depth': row.depth,
+        'score': {'cp': row.score_cp, 'mate': row.score_mate},
+        'best_move': row.best_move or None,
+        'pv': row.pv.split() if row.pv else [],
+    }
+
+
+def lookup(board, depth):
+    key = position_key(board)
+    local_cache = get_local_cache()
+
+    evaluation = local_cache.get(key)
+    if evaluation is not None and evaluation['depth'] >= depth:
+        return evaluation
+
+    row = PositionEvaluation.objects.filter(position_hash=key[0], white_to_move=key[1]).first()
+    if row is None:
+        return None
+
+    evaluation = row_to_evaluation(row)
+    local_cache.put(key, evaluation)
+    return evaluation if evaluation['depth'] >= depth else None
+
+
+def store(board, evaluation):
+    # Keeps whichever evaluation is deeper
+    if evaluation.get('score') is None:
+        return
+
+    key = position_key(board)
+    values = {
+        'depth': evaluation['depth'],
+        'score_cp': evaluation['score']['cp'],
+        'score_mate': evaluation['score']['mate'],
+        'best_move': evaluation['best_move'] or '',
+        'pv': ' '.join(evaluation['pv']),
+    }
+
+    updated = PositionEvaluation.objects.filter(
+        position_hash=key[0], white_to_move=key[1], depth__lt=values['depth']
+    ).update(**values)
+
+    if not updated:
+        try:
+            with transaction.atomic():
+                PositionEvaluation.objects.create(position_hash=key[0], white_to_move=key[1], **values)
+        except IntegrityError:
+            # A deeper (or equally deep) evaluation is already stored
+            return
+
+    cached = get_local_cache().get(key)
+    if cached is None or cached['depth'] < values['depth']:
+        get_local_cache().put(key, {k: evaluation[k] for k in ('depth', 'score', 'best_move', 'pv')})
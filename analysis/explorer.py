@@ -0,0 +1,72 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .counters import increment_counters
+from .models import ExplorerMove
+from .movecodec import decode_move, move_codes
+from .positions import position_hash, unpack_hashes
+from .stats import RESULT_FIELDS, user_color
+
+
+# Per-user opening explorer. Every (position, move) pair of the first
+# EXPLORER_MAX_PLY plies of a game is one ExplorerMove counter, split by the
+# color the user had. Ingest adds new games from their stored position
+# hashes and packed moves, no PGN parsing involved.
+
+KEY_FIELDS = ('user', 'color', 'position_hash', 'move')
+COUNTER_FIELDS = ('games', 'wins', 'draws', 'losses')
+
+
+def add_games_to_explorer(user, games):
+    # Call inside the transaction that stores the games
+    deltas = defaultdict(Counter)
+    for game in games:
+        color = user_color(user, game)
+        result_field = RESULT_FIELDS.get(game.result_description)
+        hashes = unpack_hashes(game.position_hashes)
+
+        # A repeated position counts once per game
+        seen = set()
+        for ply, code in enumerate(move_codes(game.moves_packed)[:settings.EXPLORER_MAX_PLY]):
+            key = (color, hashes[ply], code)
+            if key in seen:
+                continue
+            seen.add(key)
+            deltas[key]['games'] += 1
+            if result_field:
+                deltas[key][result_field] += 1
+
+    rows = [
+        [user.pk, *key, *(delta[field] for field in COUNTER_FIELDS)]
+        for key, delta in deltas.items()
+    ]
+    return increment_counters(ExplorerMove, KEY_FIELDS, COUNTER_FIELDS, rows)
+
+
+def rebuild_user_explorer(user, games):
+    ExplorerMove.objects.filter(user=user).delete()
+    return add_games_to_explorer(user, games)
+
+
+def explore(user, board, color):
+    # Moves played from this position, most frequent first
+    rows = ExplorerMove.objects.filter(
+        user=user, color=color, position_hash=position_hash(board)
+    ).order_by('-games', 'move')
+
+    moves = []
+    for row in rows:
+        move = decode_move(row.move)
+        if not board.is_legal(move):
+            # Zobrist collision
+            continue
+        moves.append({
+            'uci': move.uci(),
+            'san': board.san(move),
+            'games': row.games,
+            'wins': row.wins,
+            'draws': row.draws,
+            'losses': row.losses,
+        })
+    return moves
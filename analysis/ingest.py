@@ -0,0 +1,115 @@
+import hashlib
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from users.gamecache import bump_games_version
+from users.ratings import record_game_ratings
+from .derived import apply_derived_data
+from .explorer import add_games_to_explorer
+from .models import ChessGame
+from .positions import index_positions
+from .search import index_games
+from .stats import add_games_to_stats
+
+
+# Batch ingestion of games into ChessGame.
+# Callers build unsaved ChessGame instances; this module deduplicates them
+# against the DB with one query per chunk and writes the new ones with
+# bulk_create inside a single transaction, together with their search
+# documents (analysis/search.py), rating history points (users/ratings.py),
+# stats counters (analysis/stats.py), opening explorer counters
+# (analysis/explorer.py) and position index rows (analysis/positions.py).
+# The user's cached game-list pages are invalidated when it commits.
+
+INGEST_BATCH_SIZE = 500
+
+LINK_RE = re.compile(r'\[Link "([^"]+)"\]')
+
+
+def make_game_key(url=None, pgn=''):
+    # chess.com games are keyed by their URL, so the key survives PGN
+    # formatting changes; anything else falls back to a hash of the PGN.
+    if not url:
+        link = LINK_RE.search(pgn)
+        url = link.group(1) if link else None
+    if url:
+        return re.sub(r'^https?://(www\.)?', '', url.strip())[:100]
+    normalized = ' '.join(pgn.split())
+    return 'sha1:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def stored_game_keys(user, keys, batch_size=INGEST_BATCH_SIZE):
+    existing = set()
+    for batch in chunked(list(keys), batch_size):
+        existing.update(
+            ChessGame.objects.filter(user=user, game_key__in=batch).values_list('game_key', flat=True)
+        )
+    return existing
+
+
+def find_new_games(user, games, batch_size=INGEST_BATCH_SIZE):
+    # Drops games the user already has, and duplicates inside the batch itself
+    candidates = {}
+    for game in games:
+        if not game.pgn:
+            continue
+        if not game.game_key:
+            game.game_key = make_game_key(pgn=game.pgn)
+        candidates.setdefault(game.game_key, game)
+
+    existing = stored_game_keys(user, candidates, batch_size)
+    return [game for key, game in candidates.items() if key not in existing]
+
+
+def ingest_games(user, games, batch_size=INGEST_BATCH_SIZE):
+    new_games = find_new_games(user, games, batch_size)
+    if not new_games:
+        return []
+
+    # Only the games that will actually be written get scanned and replayed
+    # for their derived data (moves_count, opening, final FEN, hashes, clocks)
+    for game in new_games:
+        game.user = user
+        apply_derived_data(game)
+
+    with transaction.atomic():
+        # Ingests of one user run one after the other from here (a row lock
+        # where the backend has them; SQLite serializes writers anyway), and
+        # games another sync, search or import stored since find_new_games
+        # are dropped: the counters and index rows below are only ever added
+        # for rows this insert created.
+        list(get_user_model().objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+        stored_meanwhile = stored_game_keys(user, [game.game_key for game in new_games], batch_size)
+        new_games = [game for game in new_games if game.game_key not in stored_meanwhile]
+
+        for batch in chunked(new_games, batch_size):
+            ChessGame.objects.bulk_create(batch)
+            assign_primary_keys(user, batch)
+
+        if new_games:
+            index_games(new_games)
+            record_game_ratings(user, new_games)
+            add_games_to_stats(user, new_games)
+            add_games_to_explorer(user, new_games)
+            index_positions(user, new_games)
+            # Cached game-list pages (users/gamecache.py) go stale once the games are visible
+            transaction.on_commit(lambda: bump_games_version(user.pk))
+
+    return new_games
+
+
+def assign_primary_keys(user, games):
+    # bulk_create does not report ids back on every backend
+    ids = dict(
+        ChessGame.objects.filter(user=user, game_key__in=[game.game_key for game in games])
+        .values_list('game_key', 'pk')
+    )
+    for game in games:
+        game.pk = ids.get(game.game_key)
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from analysis.derived import DERIVED_FIELDS, apply_derived_data
+from analysis.explorer import rebuild_user_explorer
+from analysis.ingest import chunked
+from analysis.models import ChessGame, GamePosition, GameSearchDocument
+from analysis.positions import index_positions
+from analysis.search import index_games
+from analysis.stats import rebuild_user_stats
+from users.gamecache import bump_games_version
+from users.models import CustomUser
+
+
+def derived_values(game):
+    # BinaryFields come back from the database as memoryview
+    values = [getattr(game, field) for field in DERIVED_FIELDS if field != 'pgn']
+    return [bytes(value) if isinstance(value, memoryview) else value for value in values]
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes the derived per-game data (opening, final FEN, hashes, packed moves) for cached games, '
+        'and rebuilds the position index, search documents, stats and explorer rows of the games that changed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Games updated per transaction.')
+        parser.add_argument('--all', action='store_true', help='Recompute games that already have derived data.')
+
+    def handle(self, *args, **options):
+        games = ChessGame.objects.order_by('pk')
+        if not options['all']:
+            # Games whose moves did not replay are not retried, their PGN won't change
+            games = games.filter(replay_failed=False).filter(Q(final_fen='') | Q(moves_packed=b'', moves_count__gt=0))
+
+        game_ids = list(games.values_list('pk', flat=True))
+        updated = 0
+        changed_users = set()
+        for ids in chunked(game_ids, options['chunk_size']):
+            batch = list(ChessGame.objects.filter(pk__in=ids))
+            before = {game.pk: derived_values(game) for game in batch}
+            for game in batch:
+                apply_derived_data(game)
+            changed = [game for game in batch if derived_values(game) != before[game.pk]]
+
+            with transaction.atomic():
+                ChessGame.objects.bulk_update(batch, DERIVED_FIELDS)
+                if changed:
+                    changed_ids = [game.pk for game in changed]
+                    GamePosition.objects.filter(game_id__in=changed_ids).delete()
+                    GameSearchDocument.objects.filter(game_id__in=changed_ids).delete()
+                    for user_id in {game.user_id for game in changed}:
+                        index_positions(CustomUser(pk=user_id), [game for game in changed if game.user_id == user_id])
+                    index_games(changed)
+            changed_users.update(game.user_id for game in changed)
+
+            # moves_count is shown in the cached game lists
+            for user_id in {game.user_id for game in batch}:
+                bump_games_version(user_id)
+            updated += len(batch)
+            self.stdout.write(f'Updated {updated}/{len(game_ids)} games ({len(changed)} changed)')
+
+        # The stats and explorer counters are per user totals, so they are
+        # recounted from all of the user's games
+        for user in CustomUser.objects.filter(pk__in=changed_users).order_by('pk'):
+            games = ChessGame.objects.filter(user=user).defer('pgn')
+            with transaction.atomic():
+                rebuild_user_stats(user, games.iterator(chunk_size=2000))
+                rebuild_user_explorer(user, games.iterator(chunk_size=1000))
+            self.stdout.write(f'{user.username}: stats and explorer rebuilt')
+
+        self.stdout.write(self.style.SUCCESS(f'Derived data computed for {updated} games.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analysis.ingest import chunked
+from analysis.models import ChessGame
+from analysis.positions import index_positions
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Adds position index rows for cached games that have none yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Games indexed per transaction.')
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for user in CustomUser.objects.filter(cached_games__isnull=False).distinct().order_by('pk'):
+            # Needs position_hashes, see backfill_game_data
+            game_ids = list(
+                ChessGame.objects.filter(user=user, positions__isnull=True).order_by('pk').values_list('pk', flat=True)
+            )
+            for ids in chunked(game_ids, options['chunk_size']):
+                games = ChessGame.objects.filter(pk__in=ids).only('pk', 'position_hashes')
+                with transaction.atomic():
+                    index_positions(user, games)
+                indexed += len(ids)
+            self.stdout.write(f'{user.username}: {len(game_ids)} games indexed')
+
+        self.stdout.write(self.style.SUCCESS(f'Position index filled for {indexed} games.'))
@@ -0,0 +1,88 @@
+import io
+import random
+import re
+import time
+
+import chess # type: ignore
+import chess.pgn # type: ignore
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.pgn_scan import scan_pgn
+
+
+GAME_SEPARATOR_RE = re.compile(r'\n\s*\n(?=\[)')
+
+
+def random_game_pgn(rng, index, max_plies=120):
+    # Random legal game with chess.com style clock comments
+    board = chess.Board()
+    game = chess.pgn.Game()
+    game.headers['Event'] = 'Live Chess'
+    game.headers['White'] = f'white{index}'
+    game.headers['Black'] = f'black{index}'
+    game.headers['Link'] = f'https://www.chess.com/game/live/{index}'
+
+    node = game
+    clocks = [180.0, 180.0]
+    for ply in range(rng.randint(10, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        move = rng.choice(moves)
+        board.push(move)
+        clocks[ply % 2] = max(0.1, clocks[ply % 2] - rng.uniform(0.1, 5))
+        node = node.add_variation(move)
+        node.comment = f'[%clk 0:{int(clocks[ply % 2]) // 60:02d}:{clocks[ply % 2] % 60:04.1f}]'
+
+    game.headers['Result'] = board.result(claim_draw=True)
+    return str(game)
+
+
+def legacy_count(pgn_text):
+    # What ingest used to do for every game
+    game = chess.pgn.read_game(io.StringIO(pgn_text))
+    return len(list(game.mainline_moves())) if game is not None else 0
+
+
+class Command(BaseCommand):
+    help = 'Compares the PGN scanner used at ingest with full python-chess parsing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=3000, help='Size of the generated corpus.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--pgn-file', help='Benchmark the games of a PGN file instead of a generated corpus.')
+
+    def handle(self, *args, **options):
+        if options['pgn_file']:
+            corpus = self.read_corpus(options['pgn_file'])
+        else:
+            rng = random.Random(options['seed'])
+            corpus = [random_game_pgn(rng, i) for i in range(options['games'])]
+
+        if not corpus:
+            raise CommandError('No games to benchmark.')
+
+        started = time.perf_counter()
+        legacy = [legacy_count(pgn) for pgn in corpus]
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanned = [len(scan_pgn(pgn).moves) for pgn in corpus]
+        scan_seconds = time.perf_counter() - started
+
+        mismatches = sum(1 for a, b in zip(legacy, scanned) if a != b)
+
+        self.stdout.write(f'Games:        {len(corpus)}')
+        self.stdout.write(f'python-chess: {legacy_seconds:.3f}s ({len(corpus) / legacy_seconds:.0f} games/s)')
+        self.stdout.write(f'pgn_scan:     {scan_seconds:.3f}s ({len(corpus) / scan_seconds:.0f} games/s)')
+        self.stdout.write(f'Speedup:      {legacy_seconds / scan_seconds:.1f}x')
+
+        if mismatches:
+            raise CommandError(f'{mismatches} games got a different ply count.')
+        self.stdout.write(self.style.SUCCESS('Ply counts match for every game.'))
+
+    def read_corpus(self, path):
+        # Games are separated by a blank line before the next header section
+        with open(path, encoding='utf-8') as pgn_file:
+            text = pgn_file.read()
+        return [pgn for pgn in GAME_SEPARATOR_RE.split(text) if pgn.strip()]
@@ -0,0 +1,81 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.models import ImportJob
+from analysis.pgn_import import claim_import_job, create_import_job, finish_import_job, run_pending_imports
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Imports a PGN file (OTB games, lichess exports) into a user\'s games, resuming an interrupted import of the same file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='PGN file to import.')
+        parser.add_argument('--user', help='App username that receives the games.')
+        parser.add_argument('--as-player', default='', help='Name of the user in the file; defaults to the username.')
+        parser.add_argument('--chunk-size', type=int, help='Games stored (and checkpointed) per transaction.')
+        parser.add_argument('--restart', action='store_true', help='Start from the beginning even if an earlier import was interrupted.')
+        parser.add_argument('--job', type=int, help='Resume this import job (e.g. an upload whose worker died).')
+        parser.add_argument('--force', action='store_true', help='Take over a job marked running, once its worker is known to be dead.')
+        parser.add_argument('--pending', action='store_true', help='Process the queued uploads and exit.')
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            processed = run_pending_imports()
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} import job(s).'))
+            return
+
+        job = self.get_job(options)
+        if job.bytes_read:
+            self.stdout.write(f'Resuming {job.source_name} at byte {job.bytes_read} of {job.file_size}.')
+
+        # Queued and failed jobs are taken over; a running one may still have
+        # a live worker, which would import the same games a second time
+        statuses = [ImportJob.STATUS_PENDING, ImportJob.STATUS_FAILED]
+        if options['force']:
+            statuses.append(ImportJob.STATUS_RUNNING)
+        if not claim_import_job(job, statuses):
+            job.refresh_from_db(fields=['status'])
+            if job.status == ImportJob.STATUS_RUNNING:
+                raise CommandError(f'Import job #{job.pk} is being run by another worker; use --force if that worker died.')
+            raise CommandError(f'Import job #{job.pk} is {job.get_status_display().lower()}.')
+        # Where the previous run got to, as of the claim
+        job.refresh_from_db(fields=['bytes_read', 'games_read', 'games_added'])
+
+        finished = finish_import_job(job, options['chunk_size'], progress=self.report)
+        if not finished:
+            raise CommandError(f'Import stopped at byte {job.bytes_read}; run the command again to resume.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {job.games_added} new games ({job.games_skipped} already stored) from {job.games_read} read.'
+        ))
+
+    def get_job(self, options):
+        if options['job']:
+            try:
+                return ImportJob.objects.select_related('user').get(pk=options['job'])
+            except ImportJob.DoesNotExist:
+                raise CommandError(f"No import job #{options['job']}.")
+
+        if not options['path'] or not options['user']:
+            raise CommandError('Give a PGN file and --user (or --job / --pending).')
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} is not a file.')
+        try:
+            user = CustomUser.objects.get(username__iexact=options['user'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}.")
+
+        # An unfinished or failed import of the same, unchanged file resumes
+        earlier = ImportJob.objects.filter(
+            user=user, file_path=path, file_size=os.path.getsize(path),
+        ).exclude(status=ImportJob.STATUS_DONE).first()
+        if earlier and not options['restart']:
+            return earlier
+        return create_import_job(user, path, path, options['as_player'])
+
+    def report(self, job):
+        self.stdout.write(
+            f'{job.progress:5.1f}%  {job.games_read} games read, {job.games_added} new, {job.games_skipped} already stored'
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analysis.explorer import rebuild_user_explorer
+from analysis.models import ChessGame
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the opening explorer counters from each user's cached games."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this user (app username).')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user named {options['user']}.")
+
+        for user in users:
+            # Needs position_hashes and moves_packed, see backfill_game_data
+            games = ChessGame.objects.filter(user=user).only(
+                'pk', 'white_player', 'black_player', 'result_description', 'player_name',
+                'pgn_headers', 'position_hashes', 'moves_packed',
+            ).iterator(chunk_size=1000)
+            with transaction.atomic():
+                rows = rebuild_user_explorer(user, games)
+            self.stdout.write(f'{user.username}: {rows} explorer rows')
+
+        self.stdout.write(self.style.SUCCESS('Opening explorer rebuilt.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analysis.ingest import chunked
+from analysis.models import ChessGame, GameSearchDocument
+from analysis.search import index_games
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search documents for all cached games.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Games indexed per transaction.')
+
+    def handle(self, *args, **options):
+        GameSearchDocument.objects.all().delete()
+
+        game_ids = list(ChessGame.objects.order_by('pk').values_list('pk', flat=True))
+        indexed = 0
+        for ids in chunked(game_ids, options['chunk_size']):
+            with transaction.atomic():
+                index_games(ChessGame.objects.filter(pk__in=ids))
+            indexed += len(ids)
+            self.stdout.write(f'Indexed {indexed}/{len(game_ids)} games')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {len(game_ids)} games.'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analysis.models import ChessGame
+from analysis.stats import rebuild_user_stats
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-user game stats from the cached games (fixes drift).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this user (app username).')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user named {options['user']}.")
+
+        for user in users:
+            games = ChessGame.objects.filter(user=user).only(
+                'pk', 'time_control', 'white_player', 'black_player', 'result_description', 'player_name',
+                'moves_count', 'eco', 'opening_name', 'pgn_headers',
+            ).iterator(chunk_size=2000)
+            with transaction.atomic():
+                rows = rebuild_user_stats(user, games)
+            self.stdout.write(f'{user.username}: {rows} stats rows')
+
+        self.stdout.write(self.style.SUCCESS('Game stats rebuilt.'))
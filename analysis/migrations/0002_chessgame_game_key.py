@@ -0,0 +1,60 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+LINK_RE = re.compile(r'\[Link "([^"]+)"\]')
+
+
+def make_game_key(pgn):
+    # Frozen copy of analysis.ingest.make_game_key for the backfill
+    link = LINK_RE.search(pgn)
+    if link:
+        return re.sub(r'^https?://(www\.)?', '', link.group(1).strip())[:100]
+    normalized = ' '.join(pgn.split())
+    return 'sha1:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def backfill_game_keys(apps, schema_editor):
+    ChessGame = apps.get_model('analysis', 'ChessGame')
+    seen = set()
+    duplicates = []
+
+    for game in ChessGame.objects.order_by('pk').only('pk', 'user_id', 'pgn').iterator(chunk_size=500):
+        game.game_key = make_game_key(game.pgn)
+        if (game.user_id, game.game_key) in seen:
+            # Same game stored twice with a slightly different PGN text
+            duplicates.append(game.pk)
+            continue
+        seen.add((game.user_id, game.game_key))
+        ChessGame.objects.filter(pk=game.pk).update(game_key=game.game_key)
+
+    ChessGame.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessgame',
+            name='game_key',
+            field=models.CharField(default='', max_length=100, verbose_name='Game Key'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_game_keys, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='chessgame',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='chessgame',
+            constraint=models.UniqueConstraint(fields=('user', 'game_key'), name='unique_user_game_key'),
+        ),
+    ]
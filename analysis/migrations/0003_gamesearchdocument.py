@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import OperationalError, migrations, models
+
+
+# Search index for GameSearchDocument, see analysis/search.py.
+# SQLite: an FTS5 table kept in sync by triggers. PostgreSQL: a GIN index.
+
+SQLITE_SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS analysis_gamesearch_fts USING fts5(owner, document, prefix='2 3 4')",
+    """CREATE TRIGGER IF NOT EXISTS analysis_gamesearch_ai AFTER INSERT ON analysis_gamesearchdocument BEGIN
+        INSERT INTO analysis_gamesearch_fts(rowid, owner, document) VALUES (new.game_id, 'u' || new.user_id, new.document);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS analysis_gamesearch_ad AFTER DELETE ON analysis_gamesearchdocument BEGIN
+        DELETE FROM analysis_gamesearch_fts WHERE rowid = old.game_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS analysis_gamesearch_au AFTER UPDATE ON analysis_gamesearchdocument BEGIN
+        UPDATE analysis_gamesearch_fts SET owner = 'u' || new.user_id, document = new.document WHERE rowid = old.game_id;
+    END""",
+]
+
+SQLITE_TEARDOWN = [
+    'DROP TRIGGER IF EXISTS analysis_gamesearch_au',
+    'DROP TRIGGER IF EXISTS analysis_gamesearch_ad',
+    'DROP TRIGGER IF EXISTS analysis_gamesearch_ai',
+    'DROP TABLE IF EXISTS analysis_gamesearch_fts',
+]
+
+POSTGRES_SETUP = [
+    "CREATE INDEX IF NOT EXISTS analysis_gamesearch_document_gin "
+    "ON analysis_gamesearchdocument USING GIN (to_tsvector('simple', document))",
+]
+
+POSTGRES_TEARDOWN = [
+    'DROP INDEX IF EXISTS analysis_gamesearch_document_gin',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_SETUP, 'postgresql': POSTGRES_SETUP}.get(vendor, [])
+    try:
+        for statement in statements:
+            schema_editor.execute(statement)
+    except OperationalError as e:
+        # SQLite builds without FTS5 keep working through the LIKE fallback
+        print(f"Full-text search index not created ({vendor}): {e}")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in {'sqlite': SQLITE_TEARDOWN, 'postgresql': POSTGRES_TEARDOWN}.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0002_chessgame_game_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameSearchDocument',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='analysis.chessgame', verbose_name='Game')),
+                ('document', models.TextField(verbose_name='Search Document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='game_search_documents', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Game Search Document',
+                'verbose_name_plural': 'Game Search Documents',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_gamesearchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chessgame',
+            options={'ordering': ['-game_date', '-cached_at', '-id'], 'verbose_name': 'Chess Game', 'verbose_name_plural': 'Chess Games'},
+        ),
+        migrations.AddIndex(
+            model_name='chessgame',
+            index=models.Index(fields=['user', '-game_date', '-cached_at', '-id'], name='chessgame_user_recent_idx'),
+        ),
+    ]
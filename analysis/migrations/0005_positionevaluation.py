@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_chessgame_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position_hash', models.BigIntegerField(verbose_name='Zobrist Hash')),
+                ('white_to_move', models.BooleanField(verbose_name='White To Move')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Depth')),
+                ('score_cp', models.IntegerField(blank=True, null=True, verbose_name='Score (centipawns)')),
+                ('score_mate', models.IntegerField(blank=True, null=True, verbose_name='Mate In')),
+                ('best_move', models.CharField(blank=True, max_length=5, verbose_name='Best Move')),
+                ('pv', models.TextField(blank=True, verbose_name='Principal Variation')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Position Evaluation',
+                'verbose_name_plural': 'Position Evaluations',
+                'constraints': [models.UniqueConstraint(fields=('position_hash', 'white_to_move'), name='unique_position_evaluation')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0005_positionevaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessgame',
+            name='clock_times',
+            field=models.JSONField(blank=True, default=list, verbose_name='Clock Times'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='eco',
+            field=models.CharField(blank=True, default='', max_length=3, verbose_name='ECO'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='final_fen',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Final FEN'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='opening_name',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Opening'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='position_hashes',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Position Hashes'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='termination',
+            field=models.CharField(blank=True, choices=[('checkmate', 'Checkmate'), ('resignation', 'Resignation'), ('timeout', 'Timeout'), ('abandoned', 'Abandoned'), ('stalemate', 'Stalemate'), ('repetition', 'Repetition'), ('insufficient', 'Insufficient Material'), ('fifty_moves', '50-Move Rule'), ('agreement', 'Agreement')], default='', max_length=20, verbose_name='Termination'),
+        ),
+    ]
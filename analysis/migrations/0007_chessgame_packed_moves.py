@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0006_chessgame_derived_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chessgame',
+            name='clock_times',
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='clocks_packed',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Packed Clocks'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='moves_packed',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Packed Moves'),
+        ),
+        migrations.AddField(
+            model_name='chessgame',
+            name='pgn_headers',
+            field=models.JSONField(blank=True, default=dict, verbose_name='PGN Headers'),
+        ),
+    ]
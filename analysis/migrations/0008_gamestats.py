@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0007_chessgame_packed_moves'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_class', models.CharField(max_length=10, verbose_name='Time Class')),
+                ('color', models.CharField(max_length=5, verbose_name='Color')),
+                ('dimension', models.CharField(choices=[('all', 'All Games'), ('opening', 'Opening'), ('opponent', 'Opponent Rating')], max_length=10, verbose_name='Dimension')),
+                ('bucket', models.CharField(blank=True, default='', max_length=200, verbose_name='Bucket')),
+                ('games', models.IntegerField(default=0, verbose_name='Games')),
+                ('wins', models.IntegerField(default=0, verbose_name='Wins')),
+                ('draws', models.IntegerField(default=0, verbose_name='Draws')),
+                ('losses', models.IntegerField(default=0, verbose_name='Losses')),
+                ('total_moves', models.IntegerField(default=0, verbose_name='Total Moves')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='game_stats', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Game Stats',
+                'verbose_name_plural': 'Game Stats',
+                'constraints': [models.UniqueConstraint(fields=('user', 'time_class', 'color', 'dimension', 'bucket'), name='unique_game_stats_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0008_gamestats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExplorerMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.CharField(max_length=5, verbose_name='Color')),
+                ('position_hash', models.BigIntegerField(verbose_name='Zobrist Hash')),
+                ('move', models.SmallIntegerField(verbose_name='Move')),
+                ('games', models.IntegerField(default=0, verbose_name='Games')),
+                ('wins', models.IntegerField(default=0, verbose_name='Wins')),
+                ('draws', models.IntegerField(default=0, verbose_name='Draws')),
+                ('losses', models.IntegerField(default=0, verbose_name='Losses')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='explorer_moves', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Explorer Move',
+                'verbose_name_plural': 'Explorer Moves',
+                'constraints': [models.UniqueConstraint(fields=('user', 'color', 'position_hash', 'move'), name='unique_explorer_move')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0009_explorermove'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GamePosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position_hash', models.BigIntegerField(verbose_name='Zobrist Hash')),
+                ('ply', models.PositiveSmallIntegerField(verbose_name='Ply')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='analysis.chessgame', verbose_name='Game')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='game_positions', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Game Position',
+                'verbose_name_plural': 'Game Positions',
+                'indexes': [models.Index(fields=['user', 'position_hash', '-game'], name='gameposition_lookup_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0010_gameposition'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255, verbose_name='Source')),
+                ('file_path', models.CharField(max_length=500, verbose_name='File Path')),
+                ('is_upload', models.BooleanField(default=False, verbose_name='Uploaded')),
+                ('as_player', models.CharField(blank=True, default='', max_length=100, verbose_name='Imported As')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='File Size')),
+                ('bytes_read', models.BigIntegerField(default=0, verbose_name='Bytes Read')),
+                ('games_read', models.IntegerField(default=0, verbose_name='Games Read')),
+                ('games_added', models.IntegerField(default=0, verbose_name='Games Added')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='analysis_im_status_5f87ca_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0011_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessgame',
+            name='player_name',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Player Name'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0012_chessgame_player_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessgame',
+            name='replay_failed',
+            field=models.BooleanField(default=False, verbose_name='Replay Failed'),
+        ),
+    ]
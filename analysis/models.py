@@ -1,9 +1,36 @@
 from django.db import models
 from django.conf import settings 
 
+from .movecodec import rebuild_pgn
+
 
 # Create your models here.
 class ChessGame(models.Model):
+    TERMINATION_CHECKMATE = 'checkmate'
+    TERMINATION_RESIGNATION = 'resignation'
+    TERMINATION_TIMEOUT = 'timeout'
+    TERMINATION_ABANDONED = 'abandoned'
+    TERMINATION_STALEMATE = 'stalemate'
+    TERMINATION_REPETITION = 'repetition'
+    TERMINATION_INSUFFICIENT = 'insufficient'
+    TERMINATION_FIFTY_MOVES = 'fifty_moves'
+    TERMINATION_AGREEMENT = 'agreement'
+
+    TERMINATION_CHOICES = (
+        (TERMINATION_CHECKMATE, 'Checkmate'),
+        (TERMINATION_RESIGNATION, 'Resignation'),
+        (TERMINATION_TIMEOUT, 'Timeout'),
+        (TERMINATION_ABANDONED, 'Abandoned'),
+        (TERMINATION_STALEMATE, 'Stalemate'),
+        (TERMINATION_REPETITION, 'Repetition'),
+        (TERMINATION_INSUFFICIENT, 'Insufficient Material'),
+        (TERMINATION_FIFTY_MOVES, '50-Move Rule'),
+        (TERMINATION_AGREEMENT, 'Agreement'),
+    )
+
+    # Large columns that game lists never show
+    HEAVY_FIELDS = ('pgn', 'position_hashes', 'moves_packed', 'clocks_packed', 'pgn_headers')
+
     # Foreign Key linking the game to the user who fetched it
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -12,10 +39,19 @@ class ChessGame(models.Model):
         verbose_name='User'
     )
     
-    # The full PGN data
+    # The PGN as fetched or imported. Left empty once moves_packed,
+    # clocks_packed and pgn_headers rebuild all of it (see full_pgn()); kept
+    # for games with variations or comments, or moves that did not replay.
     pgn = models.TextField(
         verbose_name='PGN Data'
     )
+
+    # Compact natural key used for deduplication: the chess.com game URL
+    # (without scheme), or "sha1:<hex>" of the normalized PGN for imported games
+    game_key = models.CharField(
+        max_length=100,
+        verbose_name='Game Key'
+    )
     
     # Essential game details for dashboard display
     game_date = models.DateField(
@@ -37,11 +73,78 @@ class ChessGame(models.Model):
         max_length=50,
         verbose_name='Result'
     )
+    # The user's name in the game's PGN when it isn't their chess.com
+    # username (imported files, see analysis/pgn_import.py)
+    player_name = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Player Name'
+    )
     moves_count = models.IntegerField(
         default=0,
         verbose_name='Move Count'
     )
     
+    # Derived from the PGN at ingest (analysis/derived.py), so the analysis
+    # page does not have to parse it again
+    eco = models.CharField(
+        max_length=3,
+        blank=True,
+        default='',
+        verbose_name='ECO'
+    )
+    opening_name = models.CharField(
+        max_length=200,
+        blank=True,
+        default='',
+        verbose_name='Opening'
+    )
+    final_fen = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Final FEN'
+    )
+    termination = models.CharField(
+        max_length=20,
+        choices=TERMINATION_CHOICES,
+        blank=True,
+        default='',
+        verbose_name='Termination'
+    )
+    # Signed Zobrist hash of the position before each ply and after the
+    # last one, packed as little-endian int64s
+    position_hashes = models.BinaryField(
+        blank=True,
+        default=b'',
+        verbose_name='Position Hashes'
+    )
+    # Compact mainline, see analysis/movecodec.py: 16 bits per move and
+    # uint32 tenths of a second per clock, with the PGN headers as JSON.
+    # Together they rebuild the PGN without reading the pgn column.
+    moves_packed = models.BinaryField(
+        blank=True,
+        default=b'',
+        verbose_name='Packed Moves'
+    )
+    clocks_packed = models.BinaryField(
+        blank=True,
+        default=b'',
+        verbose_name='Packed Clocks'
+    )
+    pgn_headers = models.JSONField(
+        blank=True,
+        default=dict,
+        verbose_name='PGN Headers'
+    )
+    # Set when the mainline did not replay (an illegal or unreadable move):
+    # the derived move data stays empty and backfill_game_data skips the game
+    replay_failed = models.BooleanField(
+        default=False,
+        verbose_name='Replay Failed'
+    )
+
     # Timestamp for caching (used for sorting and potential future cache logic)
     cached_at = models.DateTimeField(
         auto_now_add=True,
@@ -51,10 +154,337 @@ class ChessGame(models.Model):
     class Meta:
         verbose_name = "Chess Game"
         verbose_name_plural = "Chess Games"
-        # Ensures a user doesn't save the same PGN multiple times
-        unique_together = ('user', 'pgn') 
+        # Ensures a user doesn't save the same game multiple times
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game_key'], name='unique_user_game_key'),
+        ]
         # Default sorting: Newest games first
-        ordering = ['-game_date', '-cached_at']
+        ordering = ['-game_date', '-cached_at', '-id']
+        # Keyset pagination of a user's game list (users.views.get_games_page)
+        indexes = [
+            models.Index(fields=['user', '-game_date', '-cached_at', '-id'], name='chessgame_user_recent_idx'),
+        ]
+
+    def full_pgn(self):
+        return self.pgn or rebuild_pgn(self.pgn_headers, self.moves_packed, self.clocks_packed)
+
+    def player_name_of(self, user):
+        # Lowercase name of the user on the White or Black side of the game
+        return (self.player_name or user.username).lower()
+
+    def __str__(self):
+        return f"{self.user.username}: {self.white_player} vs {self.black_player} ({self.game_date})"
+
+
+class GameSearchDocument(models.Model):
+    # Searchable text for one game, indexed by FTS5 (SQLite) or a GIN
+    # tsvector index (PostgreSQL), see analysis/search.py
+    game = models.OneToOneField(
+        ChessGame,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Game'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='game_search_documents',
+        verbose_name='User'
+    )
+    document = models.TextField(
+        verbose_name='Search Document'
+    )
+
+    class Meta:
+        verbose_name = "Game Search Document"
+        verbose_name_plural = "Game Search Documents"
+
+    def __str__(self):
+        return f"Search document for game {self.game_id}"
+
+class GameStats(models.Model):
+    # Per-user result counters, kept up to date by ingest (analysis/stats.py).
+    # One row per time class, color and bucket of a dimension; the
+    # DIMENSION_ALL row (bucket '') holds the totals.
+    DIMENSION_ALL = 'all'
+    DIMENSION_OPENING = 'opening'
+    DIMENSION_OPPONENT = 'opponent'
+
+    DIMENSION_CHOICES = (
+        (DIMENSION_ALL, 'All Games'),
+        (DIMENSION_OPENING, 'Opening'),
+        (DIMENSION_OPPONENT, 'Opponent Rating'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='game_stats',
+        verbose_name='User'
+    )
+    time_class = models.CharField(
+        max_length=10,
+        verbose_name='Time Class'
+    )
+    color = models.CharField(
+        max_length=5,
+        verbose_name='Color'
+    )
+    dimension = models.CharField(
+        max_length=10,
+        choices=DIMENSION_CHOICES,
+        verbose_name='Dimension'
+    )
+    # Opening name, or an opponent rating range such as "1800-1999"
+    bucket = models.CharField(
+        max_length=200,
+        blank=True,
+        default='',
+        verbose_name='Bucket'
+    )
+    games = models.IntegerField(default=0, verbose_name='Games')
+    wins = models.IntegerField(default=0, verbose_name='Wins')
+    draws = models.IntegerField(default=0, verbose_name='Draws')
+    losses = models.IntegerField(default=0, verbose_name='Losses')
+    # Sum of moves_count, for the average game length
+    total_moves = models.IntegerField(default=0, verbose_name='Total Moves')
+
+    class Meta:
+        verbose_name = "Game Stats"
+        verbose_name_plural = "Game Stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'time_class', 'color', 'dimension', 'bucket'], name='unique_game_stats_bucket'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.time_class}/{self.color} {self.dimension} {self.bucket}: {self.games}"
+
+    @property
+    def average_moves(self):
+        return round(self.total_moves / self.games, 1) if self.games else 0
+
+
+class GamePosition(models.Model):
+    # Position index: every position reached in a game (after `ply` half
+    # moves, 0 being the start) under its Zobrist hash, see analysis/positions.py
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='game_positions',
+        verbose_name='User'
+    )
+    position_hash = models.BigIntegerField(
+        verbose_name='Zobrist Hash'
+    )
+    game = models.ForeignKey(
+        ChessGame,
+        on_delete=models.CASCADE,
+        related_name='positions',
+        verbose_name='Game'
+    )
+    ply = models.PositiveSmallIntegerField(
+        verbose_name='Ply'
+    )
+
+    class Meta:
+        verbose_name = "Game Position"
+        verbose_name_plural = "Game Positions"
+        # Covers both the lookup of a position and the per-game probe of
+        # analysis.positions.find_games_with_position
+        indexes = [
+            models.Index(fields=['user', 'position_hash', '-game'], name='gameposition_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.position_hash} in game {self.game_id} at ply {self.ply}"
+
+
+class ExplorerMove(models.Model):
+    # Opening explorer over a user's own games (analysis/explorer.py): how often
+    # `move` was played from the position `position_hash`, and with what result,
+    # in the games the user played as `color`. Walking one ply deeper is one
+    # lookup on the unique index.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='explorer_moves',
+        verbose_name='User'
+    )
+    color = models.CharField(
+        max_length=5,
+        verbose_name='Color'
+    )
+    position_hash = models.BigIntegerField(
+        verbose_name='Zobrist Hash'
+    )
+    # 16-bit move code, see analysis/movecodec.py
+    move = models.SmallIntegerField(
+        verbose_name='Move'
+    )
+    games = models.IntegerField(default=0, verbose_name='Games')
+    wins = models.IntegerField(default=0, verbose_name='Wins')
+    draws = models.IntegerField(default=0, verbose_name='Draws')
+    losses = models.IntegerField(default=0, verbose_name='Losses')
+
+    class Meta:
+        verbose_name = "Explorer Move"
+        verbose_name_plural = "Explorer Moves"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'color', 'position_hash', 'move'], name='unique_explorer_move'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.color} {self.position_hash} {self.move}: {self.games}"
+
+
+class PositionEvaluation(models.Model):
+    # Engine evaluations shared across games and users, see analysis/evalcache.py.
+    # A stored row answers any request for the same or a lower depth.
+    position_hash = models.BigIntegerField(
+        verbose_name='Zobrist Hash'
+    )
+    white_to_move = models.BooleanField(
+        verbose_name='White To Move'
+    )
+    depth = models.PositiveSmallIntegerField(
+        verbose_name='Depth'
+    )
+    # Scores from White's point of view; score_mate is set instead of score_cp for mates
+    score_cp = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Score (centipawns)'
+    )
+    score_mate = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Mate In'
+    )
+    best_move = models.CharField(
+        max_length=5,
+        blank=True,
+        verbose_name='Best Move'
+    )
+    # Principal variation as space separated UCI moves
+    pv = models.TextField(
+        blank=True,
+        verbose_name='Principal Variation'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        verbose_name = "Position Evaluation"
+        verbose_name_plural = "Position Evaluations"
+        constraints = [
+            models.UniqueConstraint(fields=['position_hash', 'white_to_move'], name='unique_position_evaluation'),
+        ]
+
+    def __str__(self):
+        return f"{self.position_hash} ({'w' if self.white_to_move else 'b'}) depth {self.depth}"
+
+
+class ImportJob(models.Model):
+    # One PGN file imported into a user's games (analysis/pgn_import.py).
+    # bytes_read only moves forward after a chunk of games is committed, so an
+    # interrupted import resumes from there.
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='import_jobs',
+        verbose_name='User'
+    )
+    # Name shown to the user: the uploaded file name, or the path given to import_pgn
+    source_name = models.CharField(
+        max_length=255,
+        verbose_name='Source'
+    )
+    file_path = models.CharField(
+        max_length=500,
+        verbose_name='File Path'
+    )
+    # Uploaded files belong to the import and are removed once it is done
+    is_upload = models.BooleanField(
+        default=False,
+        verbose_name='Uploaded'
+    )
+    # Player name of the user in the file (OTB or lichess name); defaults to the username
+    as_player = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Imported As'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='Status'
+    )
+    file_size = models.BigIntegerField(
+        default=0,
+        verbose_name='File Size'
+    )
+    bytes_read = models.BigIntegerField(
+        default=0,
+        verbose_name='Bytes Read'
+    )
+    games_read = models.IntegerField(
+        default=0,
+        verbose_name='Games Read'
+    )
+    games_added = models.IntegerField(
+        default=0,
+        verbose_name='Games Added'
+    )
+    error = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Error'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username}: {self.white_player} vs {self.black_player} ({self.game_date})"
\ No newline at end of file
+        return f"{self.user} import #{self.pk} of {self.source_name} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def games_skipped(self):
+        # Duplicates of stored games, or of earlier games in the file
+        return self.games_read - self.games_added
+
+    @property
+    def progress(self):
+        if not self.file_size:
+            return 100 if self.status == self.STATUS_DONE else 0
+        return round(100 * self.bytes_read / self.file_size, 1)
@@ -0,0 +1,93 @@
+import struct
+
+import chess # type: ignore
+import chess.pgn # type: ignore
+
+
+# Compact storage of a game's mainline.
+# Every move takes 16 bits: from square (6) | to square (6) << 6 |
+# promotion piece type (3) << 12. Clocks are tenths of a second as uint32,
+# NO_CLOCK where the PGN had no [%clk]. Both are little-endian, so the
+# blobs read the same on every platform and database.
+
+NO_CLOCK = 0xFFFFFFFF
+
+# PGN header order of the Seven Tag Roster, the rest follow as stored
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+
+def encode_move(move):
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    promotion = (code >> 12) & 0x7
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, promotion=promotion or None)
+
+
+def encode_moves(moves):
+    return struct.pack(f'<{len(moves)}H', *(encode_move(move) for move in moves))
+
+
+def move_codes(data):
+    data = bytes(data or b'')
+    return list(struct.unpack(f'<{len(data) // 2}H', data))
+
+
+def decode_moves(data):
+    return [decode_move(code) for code in move_codes(data)]
+
+
+def encode_clocks(clocks):
+    return struct.pack(
+        f'<{len(clocks)}I', *(NO_CLOCK if clock is None else round(clock * 10) for clock in clocks)
+    )
+
+
+def decode_clocks(data):
+    data = bytes(data or b'')
+    return [None if value == NO_CLOCK else value / 10 for value in struct.unpack(f'<{len(data) // 4}I', data)]
+
+
+def format_clock(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    text = f'{int(hours)}:{int(minutes):02d}:{int(rest):02d}'
+    tenths = round(seconds * 10) % 10
+    return f'{text}.{tenths}' if tenths else text
+
+
+def starting_board(headers):
+    # Chess960 castling only replays on a board that knows the variant
+    chess960 = headers.get('Variant', '').lower().startswith('chess960')
+    if headers.get('SetUp') == '1' and headers.get('FEN'):
+        return chess.Board(headers['FEN'], chess960=chess960)
+    return chess.Board(chess960=chess960)
+
+
+def board_at(headers, moves_packed, ply=None):
+    # Position after the first `ply` moves (all of them when ply is None)
+    board = starting_board(headers)
+    for move in decode_moves(moves_packed)[:ply]:
+        board.push(move)
+    return board
+
+
+def rebuild_pgn(headers, moves_packed, clocks_packed=b''):
+    game = chess.pgn.Game()
+    game.headers.clear()
+    for name in SEVEN_TAG_ROSTER:
+        game.headers[name] = headers.get(name, '?' if name != 'Result' else '*')
+    for name, value in headers.items():
+        if name not in SEVEN_TAG_ROSTER:
+            game.headers[name] = value
+    game.setup(starting_board(headers))
+
+    clocks = decode_clocks(clocks_packed)
+    node = game
+    for ply, move in enumerate(decode_moves(moves_packed)):
+        node = node.add_variation(move)
+        if ply < len(clocks) and clocks[ply] is not None:
+            node.comment = f'[%clk {format_clock(clocks[ply])}]'
+
+    return str(game)
@@ -0,0 +1,248 @@
+import datetime
+import os
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ingest import ingest_games, make_game_key
+from .models import ChessGame, ImportJob
+from .pgn_scan import parse_headers
+
+
+# Bulk import of PGN files (OTB databases, lichess exports) through the same
+# ingest path as chess.com games. The file is read game by game from a byte
+# offset, never as a whole. Every chunk of games is ingested in one
+# transaction together with the job's new offset, so an interrupted import
+# resumes after the last committed chunk; games seen twice are dropped by the
+# game_key dedupe (the Site/Link URL, or a SHA-1 of the PGN).
+
+HEADER_LINE_RE = re.compile(rb'^\s*\[\w+\s+"')
+
+BOM = b'\xef\xbb\xbf'
+
+# lichess classes by estimated duration: base + 40 * increment (seconds)
+TIME_CLASS_LIMITS = ((179, 'Bullet'), (479, 'Blitz'), (1499, 'Rapid'))
+
+PGN_DATE_RE = re.compile(r'^(\d{4})\.(\d{2}|\?\?)\.(\d{2}|\?\?)$')
+
+
+def decode_pgn(data):
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        # Older OTB databases are often Latin-1
+        return data.decode('latin-1')
+
+
+def iter_pgn_games(handle, offset=0):
+    # Yields (pgn_text, end_offset) for every game of a binary file from
+    # offset on; end_offset is where the next game starts, i.e. where an
+    # import that stored this game resumes.
+    handle.seek(offset)
+    position = offset
+    lines = []
+    in_movetext = False
+    comment_depth = 0
+
+    for line in handle:
+        line_start = position
+        position += len(line)
+        if line_start == 0 and line.startswith(BOM):
+            line = line[len(BOM):]
+
+        # A header line after movetext starts the next game, unless it is
+        # inside a multi-line {comment}
+        if in_movetext and not comment_depth and HEADER_LINE_RE.match(line):
+            yield decode_pgn(b''.join(lines)), line_start
+            lines = []
+            in_movetext = False
+
+        if not lines and not line.strip():
+            continue
+        lines.append(line)
+        if line.strip() and not HEADER_LINE_RE.match(line):
+            in_movetext = True
+            comment_depth = max(0, comment_depth + line.count(b'{') - line.count(b'}'))
+
+    if lines:
+        yield decode_pgn(b''.join(lines)), position
+
+
+def parse_pgn_date(headers):
+    # Missing month or day count as the first; no year at all means today
+    for name in ('UTCDate', 'Date', 'EndDate'):
+        match = PGN_DATE_RE.match(headers.get(name, ''))
+        if not match:
+            continue
+        year, month, day = match.groups()
+        try:
+            return datetime.date(int(year), int(month) if month.isdigit() else 1, int(day) if day.isdigit() else 1)
+        except ValueError:
+            continue
+    return timezone.now().date()
+
+
+def time_class(headers):
+    control = headers.get('TimeControl', '')
+    base, _, increment = control.partition('+')
+    if not base.isdigit():
+        return 'Unknown'
+    estimated = int(base) + 40 * (int(increment) if increment.isdigit() else 0)
+    for limit, name in TIME_CLASS_LIMITS:
+        if estimated <= limit:
+            return name
+    return 'Classical'
+
+
+def result_for(headers, player):
+    # Win/Draw/Loss from the player's side, as for chess.com games
+    result = headers.get('Result', '*')
+    if result == '1/2-1/2':
+        return 'Draw'
+    white, black = headers.get('White', '').lower(), headers.get('Black', '').lower()
+    if result in ('1-0', '0-1') and player in (white, black):
+        return 'Win' if (result == '1-0') == (player == white) else 'Loss'
+    return {'1-0': 'White wins', '0-1': 'Black wins'}.get(result, 'Unknown')
+
+
+def player_label(name, elo):
+    name = name or '?'
+    return f'{name} ({elo})'[:200] if elo and elo.isdigit() else name[:200]
+
+
+def game_from_pgn(user, pgn_text, as_player=''):
+    # Builds an unsaved ChessGame from one game of an imported file
+    headers = parse_headers(pgn_text)
+    site = headers.get('Site', '')
+    url = site if site.startswith(('http://', 'https://')) else None
+
+    return ChessGame(
+        user=user, pgn=pgn_text, game_key=make_game_key(url, pgn_text),
+        game_date=parse_pgn_date(headers),
+        white_player=player_label(headers.get('White'), headers.get('WhiteElo')),
+        black_player=player_label(headers.get('Black'), headers.get('BlackElo')),
+        time_control=time_class(headers),
+        result_description=result_for(headers, (as_player or user.username).lower()),
+        player_name=as_player[:100],
+    )
+
+
+def create_import_job(user, file_path, source_name, as_player='', is_upload=False):
+    return ImportJob.objects.create(
+        user=user, file_path=file_path, source_name=source_name[:255], as_player=as_player[:100],
+        is_upload=is_upload, file_size=os.path.getsize(file_path),
+    )
+
+
+def save_chunk(job, games, end_offset):
+    # Stores a chunk and moves the resume offset past it in one transaction
+    with transaction.atomic():
+        added = len(ingest_games(job.user, games))
+        ImportJob.objects.filter(pk=job.pk).update(
+            bytes_read=end_offset, games_read=F('games_read') + len(games), games_added=F('games_added') + added,
+        )
+    job.bytes_read = end_offset
+    job.games_read += len(games)
+    job.games_added += added
+
+
+def import_chunk(job, chunk_size=None):
+    # Stores the next chunk of games of a claimed job; False once the file
+    # has nothing left
+    chunk_size = chunk_size or settings.PGN_IMPORT_CHUNK_SIZE
+    games = []
+    end_offset = job.bytes_read
+
+    with open(job.file_path, 'rb') as handle:
+        for pgn_text, end_offset in iter_pgn_games(handle, job.bytes_read):
+            games.append(game_from_pgn(job.user, pgn_text, job.as_player))
+            if len(games) >= chunk_size:
+                break
+
+    if not games:
+        return False
+    save_chunk(job, games, end_offset)
+    return True
+
+
+def run_import(job, chunk_size=None, progress=None):
+    # Imports the file of a claimed job from job.bytes_read on. progress(job)
+    # is called after every committed chunk.
+    while import_chunk(job, chunk_size):
+        if progress:
+            progress(job)
+    return job.games_added
+
+
+def claim_import_job(job, statuses=(ImportJob.STATUS_PENDING,)):
+    # Several workers may poll the same queue
+    claimed = ImportJob.objects.filter(pk=job.pk, status__in=statuses).update(
+        status=ImportJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if claimed:
+        job.status = ImportJob.STATUS_RUNNING
+    return bool(claimed)
+
+
+def claim_next_import_job():
+    pending_jobs = ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).select_related('user').order_by('created_at')
+    for job in pending_jobs:
+        if claim_import_job(job):
+            return job
+    return None
+
+
+def fail_import_job(job, error):
+    print(f"PGN import #{job.pk} failed at byte {job.bytes_read}: {error}")
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.STATUS_FAILED, error=str(error), finished_at=timezone.now()
+    )
+    job.status = ImportJob.STATUS_FAILED
+
+
+def complete_import_job(job):
+    print(f"Imported {job.games_added} new games from {job.source_name} for {job.user.username}.")
+    ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_DONE, error='', finished_at=timezone.now())
+    job.status = ImportJob.STATUS_DONE
+    if job.is_upload:
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+
+
+def finish_import_job(job, chunk_size=None, progress=None):
+    # Runs a claimed (running) job to the end and records the outcome
+    try:
+        run_import(job, chunk_size, progress)
+    except Exception as e:
+        fail_import_job(job, e)
+        return False
+    complete_import_job(job)
+    return True
+
+
+def step_import_job(job, chunk_size=None):
+    # One chunk of a claimed job, for a worker that interleaves it with other
+    # jobs; records the outcome once the job ends. True while it has more.
+    try:
+        if import_chunk(job, chunk_size):
+            return True
+    except Exception as e:
+        fail_import_job(job, e)
+        return False
+    complete_import_job(job)
+    return False
+
+
+def run_pending_imports():
+    processed = 0
+    job = claim_next_import_job()
+    while job is not None:
+        finish_import_job(job)
+        processed += 1
+        job = claim_next_import_job()
+    return processed
@@ -0,0 +1,109 @@
+import re
+import time
+from collections import namedtuple
+
+from chess_coach.monitoring import record_pgn_parse
+
+
+# Lightweight PGN scanner for ingest.
+# Pulls out the headers, the mainline SAN tokens, the [%clk] annotations and
+# the result with a single regex pass, without building Board objects or
+# checking move legality. Use chess.pgn when positions are actually needed.
+# `annotated` tells whether the movetext holds anything else (variations,
+# comments, NAGs, !? glyphs), which the packed form of a game can't keep.
+
+PgnSummary = namedtuple('PgnSummary', ['headers', 'moves', 'clocks', 'result', 'annotated'])
+
+HEADER_RE = re.compile(r'^\s*\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+
+TOKEN_RE = re.compile(r'''
+    (?P<comment>\{[^}]*\}?)
+  | (?P<line_comment>;[^\n]*)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<nag>\$\d+)
+  | (?P<result>1-0|0-1|1/2-1/2|\*)
+  | (?P<number>\d+\.+)
+  | (?P<san>[^\s{}();$]+)
+''', re.VERBOSE)
+
+CLOCK_RE = re.compile(r'\[%clk\s+(\d+):(\d+):(\d+(?:\.\d+)?)\]')
+
+CLOCK_ONLY_RE = re.compile(r'^\{\s*\[%clk\s+\d+:\d+:\d+(?:\.\d+)?\]\s*\}$')
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+def split_pgn(pgn_text):
+    # Returns (header lines, movetext) of a single game
+    lines = pgn_text.splitlines()
+    index = 0
+    while index < len(lines) and (not lines[index].strip() or lines[index].lstrip().startswith('[')):
+        index += 1
+    return lines[:index], '\n'.join(lines[index:])
+
+
+def parse_headers(pgn_text):
+    headers = {}
+    header_lines, _ = split_pgn(pgn_text)
+    for line in header_lines:
+        match = HEADER_RE.match(line)
+        if match:
+            headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+    return headers
+
+
+def parse_clock(comment):
+    match = CLOCK_RE.search(comment)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def scan_pgn(pgn_text):
+    started = time.perf_counter()
+    header_lines, movetext = split_pgn(pgn_text)
+    headers = parse_headers('\n'.join(header_lines))
+
+    moves = []
+    # clocks[i] is the clock (seconds) left after move i, or None
+    clocks = []
+    result = headers.get('Result', '*')
+    variation_depth = 0
+    annotated = False
+
+    for match in TOKEN_RE.finditer(movetext):
+        kind = match.lastgroup
+
+        if kind == 'open':
+            variation_depth += 1
+            annotated = True
+        elif kind == 'close':
+            variation_depth = max(0, variation_depth - 1)
+        elif variation_depth:
+            continue
+        elif kind == 'san':
+            # Annotation glyphs (!, ?!) are not part of the SAN
+            san = match.group().rstrip('!?')
+            annotated = annotated or san != match.group()
+            moves.append(san)
+            clocks.append(None)
+        elif kind == 'comment':
+            comment = match.group()
+            if not (moves and clocks[-1] is None and CLOCK_ONLY_RE.match(comment)):
+                annotated = True
+            if moves and clocks[-1] is None:
+                clocks[-1] = parse_clock(comment)
+        elif kind in ('line_comment', 'nag'):
+            annotated = True
+        elif kind == 'result':
+            result = match.group()
+
+    record_pgn_parse('scan', time.perf_counter() - started)
+    return PgnSummary(headers, moves, clocks, result, annotated)
+
+
+def count_moves(pgn_text):
+    # Full moves, as shown on the dashboard: 1. e4 e5 2. Nf3 is 2 moves
+    return (len(scan_pgn(pgn_text).moves) + 1) // 2
@@ -0,0 +1,58 @@
+import struct
+
+import chess.polyglot # type: ignore
+from django.db.models import Exists, OuterRef
+
+from .models import ChessGame, GamePosition
+
+
+POSITION_SEARCH_LIMIT = 50
+
+
+def position_hash(board):
+    # Polyglot Zobrist hash of the position, shifted into the signed 64-bit
+    # range so it fits a BigIntegerField on every database backend
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+def pack_hashes(hashes):
+    return struct.pack(f'<{len(hashes)}q', *hashes)
+
+
+def unpack_hashes(data):
+    data = bytes(data or b'')
+    return list(struct.unpack(f'<{len(data) // 8}q', data))
+
+
+def index_positions(user, games):
+    # games must be saved and carry position_hashes (analysis/derived.py)
+    rows = [
+        GamePosition(user_id=user.pk, position_hash=key, game_id=game.pk, ply=ply)
+        for game in games
+        for ply, key in enumerate(unpack_hashes(game.position_hashes))
+    ]
+    GamePosition.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def find_games_with_position(user, board, limit=POSITION_SEARCH_LIMIT):
+    # [(game, [plies])], newest games first (by game date, as the game list:
+    # archive syncs store the newest months first, so ids run the other way).
+    # The database walks the user's games in that order and probes the
+    # position index for each, stopping at `limit` matches.
+    key = position_hash(board)
+    games = list(
+        ChessGame.objects.filter(user=user)
+        .filter(Exists(GamePosition.objects.filter(user=user, position_hash=key, game=OuterRef('pk'))))
+        .defer(*ChessGame.HEAVY_FIELDS).order_by('-game_date', '-cached_at', '-id')[:limit]
+    )
+
+    plies_by_game = {game.pk: [] for game in games}
+    matches = (
+        GamePosition.objects.filter(user=user, position_hash=key, game_id__in=plies_by_game)
+        .order_by('ply').values_list('game_id', 'ply')
+    )
+    for game_id, ply in matches:
+        plies_by_game[game_id].append(ply)
+    return [(game, plies_by_game[game.pk]) for game in games]
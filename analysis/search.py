@@ -0,0 +1,112 @@
+import re
+
+from django.db import connection
+
+from .models import ChessGame, GameSearchDocument
+from .pgn_scan import parse_headers
+
+
+# Full-text search over a user's games (opponent names, dates, opening,
+# result and time control).
+# Every game gets one GameSearchDocument row at ingest. On SQLite an FTS5
+# table is kept in sync with those rows by triggers; on PostgreSQL the rows
+# carry a GIN index over to_tsvector('simple', document). Other backends
+# fall back to a LIKE scan of the documents.
+
+FTS_TABLE = 'analysis_gamesearch_fts'
+
+SEARCH_RESULT_LIMIT = 50
+
+RATING_SUFFIX_RE = re.compile(r'\s*\(\d+\)$')
+
+
+def opening_from_headers(headers):
+    if headers.get('Opening'):
+        return headers['Opening']
+    eco_url = headers.get('ECOUrl', '')
+    if eco_url:
+        return eco_url.rstrip('/').split('/')[-1].replace('-', ' ')
+    return ''
+
+
+def build_document(game):
+    headers = game.pgn_headers or parse_headers(game.pgn)
+    parts = [
+        RATING_SUFFIX_RE.sub('', game.white_player),
+        RATING_SUFFIX_RE.sub('', game.black_player),
+        game.game_date.strftime('%Y-%m-%d'),
+        game.game_date.strftime('%b %B %d %Y'),
+        str(game.game_date.day),
+        game.result_description,
+        game.time_control,
+        headers.get('ECO', ''),
+        opening_from_headers(headers),
+    ]
+    return ' '.join(part for part in parts if part).lower()
+
+
+def index_games(games):
+    # games must be saved (have a pk)
+    documents = [
+        GameSearchDocument(game_id=game.pk, user_id=game.user_id, document=build_document(game))
+        for game in games
+    ]
+    GameSearchDocument.objects.bulk_create(documents, ignore_conflicts=True)
+
+
+def query_tokens(query):
+    return re.findall(r'\w+', query.lower())
+
+
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        with connection.cursor() as cursor:
+            _fts_available = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_available
+
+
+def ranked_game_ids(user, tokens, limit):
+    vendor = connection.vendor
+
+    if vendor == 'sqlite' and fts_available():
+        # Every token is a prefix query, all of them must match
+        match = f'owner:u{user.pk} AND ' + ' AND '.join(f'"{token}"*' for token in tokens)
+        sql = (
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s'
+        )
+        params = [match, limit]
+
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        sql = (
+            "SELECT game_id FROM analysis_gamesearchdocument "
+            "WHERE user_id = %s AND to_tsvector('simple', document) @@ to_tsquery('simple', %s) "
+            "ORDER BY ts_rank(to_tsvector('simple', document), to_tsquery('simple', %s)) DESC, game_id DESC LIMIT %s"
+        )
+        params = [user.pk, tsquery, tsquery, limit]
+
+    else:
+        documents = GameSearchDocument.objects.filter(user=user)
+        for token in tokens:
+            documents = documents.filter(document__icontains=token)
+        return list(documents.order_by('-game__game_date').values_list('game_id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_user_games(user, query, limit=SEARCH_RESULT_LIMIT):
+    # Best matches first; equally ranked games keep the newest-first order
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+
+    game_ids = ranked_game_ids(user, tokens, limit)
+    games = ChessGame.objects.filter(user=user, pk__in=game_ids).defer(*ChessGame.HEAVY_FIELDS).in_bulk()
+    return [games[game_id] for game_id in game_ids if game_id in games]
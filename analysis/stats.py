@@ -0,0 +1,105 @@
+import re
+from collections import Counter, defaultdict
+
+from .counters import increment_counters
+from .models import GameStats
+
+
+# Per-user result aggregates (GameStats), updated incrementally: ingest adds
+# the deltas of its new games (analysis/counters.py) inside the ingest
+# transaction, so the profile never scans ChessGame. manage.py rebuild_stats
+# recomputes them from scratch.
+
+OPPONENT_BUCKET_SIZE = 200
+
+RESULT_FIELDS = {'Win': 'wins', 'Draw': 'draws', 'Loss': 'losses'}
+
+KEY_FIELDS = ('user', 'time_class', 'color', 'dimension', 'bucket')
+COUNTER_FIELDS = ('games', 'wins', 'draws', 'losses', 'total_moves')
+
+PLAYER_RATING_RE = re.compile(r'\((\d+)\)\s*$')
+
+
+def user_color(user, game):
+    username = game.player_name_of(user)
+    if game.pgn_headers.get('White', '').lower() == username:
+        return 'white'
+    if game.pgn_headers.get('Black', '').lower() == username:
+        return 'black'
+    return 'white' if game.white_player.lower().startswith(f'{username} (') else 'black'
+
+
+def opponent_rating(game, color):
+    elo = game.pgn_headers.get('BlackElo' if color == 'white' else 'WhiteElo', '')
+    if elo.isdigit():
+        return int(elo)
+    match = PLAYER_RATING_RE.search(game.black_player if color == 'white' else game.white_player)
+    return int(match.group(1)) if match else None
+
+
+def opponent_bucket(rating):
+    if rating is None:
+        return 'Unknown'
+    low = rating // OPPONENT_BUCKET_SIZE * OPPONENT_BUCKET_SIZE
+    return f'{low}-{low + OPPONENT_BUCKET_SIZE - 1}'
+
+
+def game_buckets(user, game):
+    color = user_color(user, game)
+    opening = game.opening_name or game.eco or 'Unknown'
+    return [
+        (game.time_control.lower(), color, GameStats.DIMENSION_ALL, ''),
+        (game.time_control.lower(), color, GameStats.DIMENSION_OPENING, opening[:200]),
+        (game.time_control.lower(), color, GameStats.DIMENSION_OPPONENT, opponent_bucket(opponent_rating(game, color))),
+    ]
+
+
+def add_games_to_stats(user, games):
+    # Call inside the transaction that stores the games
+    deltas = defaultdict(Counter)
+    for game in games:
+        result_field = RESULT_FIELDS.get(game.result_description)
+        for key in game_buckets(user, game):
+            delta = deltas[key]
+            delta['games'] += 1
+            delta['total_moves'] += game.moves_count
+            if result_field:
+                delta[result_field] += 1
+
+    rows = [
+        [user.pk, *key, *(delta[field] for field in COUNTER_FIELDS)]
+        for key, delta in deltas.items()
+    ]
+    return increment_counters(GameStats, KEY_FIELDS, COUNTER_FIELDS, rows)
+
+
+def rebuild_user_stats(user, games):
+    GameStats.objects.filter(user=user).delete()
+    return add_games_to_stats(user, games)
+
+
+def get_user_stats(user, opening_limit=5):
+    # Totals per time class and the most played openings, for the profile page
+    rows = list(GameStats.objects.filter(user=user).order_by('-games'))
+
+    totals = {}
+    for row in rows:
+        if row.dimension != GameStats.DIMENSION_ALL:
+            continue
+        total = totals.setdefault(row.time_class, {'time_class': row.time_class, **dict.fromkeys(COUNTER_FIELDS, 0)})
+        for field in COUNTER_FIELDS:
+            total[field] += getattr(row, field)
+    for total in totals.values():
+        total['average_moves'] = round(total['total_moves'] / total['games'], 1) if total['games'] else 0
+        total['win_rate'] = round(100 * total['wins'] / total['games']) if total['games'] else 0
+
+    openings = [row for row in rows if row.dimension == GameStats.DIMENSION_OPENING][:opening_limit]
+    opponents = sorted(
+        (row for row in rows if row.dimension == GameStats.DIMENSION_OPPONENT),
+        key=lambda row: (row.time_class, row.color, row.bucket),
+    )
+    return {
+        'totals': sorted(totals.values(), key=lambda total: -total['games']),
+        'openings': openings,
+        'opponents': opponents,
+    }
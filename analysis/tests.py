@@ -1,3 +1,799 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+from unittest import mock
+
+import chess # type: ignore
+import chess.pgn # type: ignore
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import CustomUser, RatingHistory
+from . import ingest, pgn_import
+from .engine import EngineBusy, EnginePool, reset_engine_pool
+from .evalcache import get_local_cache, lookup, store
+from .ingest import ingest_games, make_game_key
+from .models import ChessGame, ExplorerMove, GamePosition, GameSearchDocument, GameStats, ImportJob
+from .movecodec import board_at, decode_clocks, decode_moves, encode_clocks, encode_moves, rebuild_pgn
+from .pgn_import import iter_pgn_games, run_pending_imports
+from .pgn_scan import count_moves, scan_pgn
+from .positions import find_games_with_position, position_hash, unpack_hashes
+from .search import search_user_games
+from .stats import get_user_stats
 
 # Create your tests here.
+
+
+def make_game(index, user=None):
+    pgn = (
+        f'[Event "Live Chess"]\n[White "magnus"]\n[Black "opponent{index}"]\n[Result "1-0"]\n'
+        f'[Link "https://www.chess.com/game/live/{index}"]\n\n1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n'
+    )
+    return ChessGame(
+        user=user, pgn=pgn, game_date=datetime.date(2024, 9, 1) + datetime.timedelta(days=index % 28),
+        white_player='magnus (2800)', black_player=f'opponent{index} (2700)',
+        time_control='Blitz', result_description='Win',
+    )
+
+
+class IngestTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+
+    def test_month_of_games_is_deduplicated_with_constant_selects(self):
+        ingest_games(self.user, [make_game(i, self.user) for i in range(0, 300, 2)])
+
+        with CaptureQueriesContext(connection) as queries:
+            created = ingest_games(self.user, [make_game(i, self.user) for i in range(300)])
+
+        selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        # Dedupe lookup, user row lock, dedupe recheck inside the transaction, lookup of the new ids
+        self.assertEqual(len(selects), 4)
+        # Regression guard: the old per-game exists()/create() loop cost ~600 queries here.
+        # The games and the position index rows (one per ply) are inserted in
+        # as many batches as the backend's parameter limit needs.
+        game_inserts = [q for q in inserts if q['sql'].startswith('INSERT INTO "analysis_chessgame"')]
+        other_queries = [
+            q for q in queries.captured_queries
+            if 'analysis_gameposition' not in q['sql'] and q not in game_inserts
+        ]
+        self.assertLessEqual(len(other_queries), 9)
+        self.assertGreaterEqual(len(game_inserts), 1)
+
+        self.assertEqual(len(created), 150)
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 300)
+        self.assertEqual(created[0].moves_count, 4)
+
+    def test_duplicates_inside_a_batch_are_written_once(self):
+        created = ingest_games(self.user, [make_game(1, self.user), make_game(1, self.user)])
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(ingest_games(self.user, [make_game(1, self.user)]), [])
+
+    def test_game_stored_by_another_writer_meanwhile_is_counted_once(self):
+        real_find_new_games = ingest.find_new_games
+
+        def racing_find_new_games(user, games, batch_size):
+            new_games = real_find_new_games(user, games, batch_size)
+            # A concurrent sync stores the same game before this one's transaction
+            with mock.patch.object(ingest, 'find_new_games', real_find_new_games):
+                ingest_games(user, [make_game(1, user)])
+            return new_games
+
+        with mock.patch.object(ingest, 'find_new_games', racing_find_new_games):
+            created = ingest_games(self.user, [make_game(1, self.user), make_game(2, self.user)])
+
+        self.assertEqual([game.game_key for game in created], ['chess.com/game/live/2'])
+        game = ChessGame.objects.get(game_key='chess.com/game/live/1')
+        self.assertEqual(GameStats.objects.get(user=self.user, time_class='blitz', dimension=GameStats.DIMENSION_ALL).games, 2)
+        self.assertEqual(GamePosition.objects.filter(game=game).count(), 8)
+        self.assertEqual(GameSearchDocument.objects.filter(game__user=self.user).count(), 2)
+
+
+class PgnScanTests(TestCase):
+
+    ANNOTATED_PGN = (
+        '[Event "Live Chess"]\n[White "Player \\"One\\""]\n[Result "1-0"]\n\n'
+        '1. e4 {[%clk 0:02:59.9]} 1... e5 {[%clk 0:02:58]} 2. Qh5!? (2. Nf3 Nc6 {side line} (2... d6)) '
+        '2... Nc6 $2 3. Bc4 ; rest of line\nNf6?? 4. Qxf7# {[%clk 0:02:50]} 1-0\n'
+    )
+
+    def test_scan_matches_python_chess_mainline(self):
+        summary = scan_pgn(self.ANNOTATED_PGN)
+        game = chess.pgn.read_game(io.StringIO(self.ANNOTATED_PGN))
+
+        self.assertEqual(summary.headers, {'Event': 'Live Chess', 'White': 'Player "One"', 'Result': '1-0'})
+        board = game.board()
+        self.assertEqual(summary.moves, [board.san_and_push(move) for move in game.mainline_moves()])
+        self.assertEqual(summary.clocks, [179.9, 178.0, None, None, None, None, 170.0])
+        self.assertEqual(summary.result, '1-0')
+        self.assertTrue(summary.annotated)
+        self.assertEqual(count_moves(self.ANNOTATED_PGN), 4)
+
+    def test_clock_comments_alone_are_not_annotations(self):
+        self.assertFalse(scan_pgn('1. e4 {[%clk 0:02:59.9]} 1... e5 {[%clk 0:02:58]} 2. Qh5 1-0').annotated)
+        self.assertTrue(scan_pgn('1. e4 {[%clk 0:02:59.9] best by test} 1... e5 1-0').annotated)
+        self.assertTrue(scan_pgn('{Start} 1. e4 e5 1-0').annotated)
+
+    def test_empty_and_headerless_games(self):
+        self.assertEqual(count_moves(''), 0)
+        self.assertEqual(scan_pgn('1. d4 d5 *').moves, ['d4', 'd5'])
+
+
+class DerivedDataTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        game = make_game(1, self.user)
+        game.pgn = game.pgn.replace(
+            '[Result "1-0"]\n',
+            '[Result "1-0"]\n[ECO "C20"]\n[ECOUrl "https://www.chess.com/openings/Kings-Pawn-Opening"]\n'
+            '[Termination "magnus won by checkmate"]\n',
+        ).replace('1. e4 e5', '1. e4 {[%clk 0:03:00]} 1... e5 {[%clk 0:02:59.5]}')
+        self.pgn_text = game.pgn
+        ingest_games(self.user, [game])
+        self.game = ChessGame.objects.get(user=self.user)
+
+    def test_ingest_stores_derived_data(self):
+        board = chess.Board()
+        for san in ['e4', 'e5', 'Qh5', 'Nc6', 'Bc4', 'Nf6', 'Qxf7#']:
+            board.push_san(san)
+
+        self.assertEqual(self.game.eco, 'C20')
+        self.assertEqual(self.game.opening_name, 'Kings Pawn Opening')
+        self.assertEqual(self.game.final_fen, board.fen())
+        self.assertEqual(self.game.termination, ChessGame.TERMINATION_CHECKMATE)
+        self.assertEqual(decode_clocks(self.game.clocks_packed), [180.0, 179.5, None, None, None, None, None])
+        self.assertEqual(self.game.pgn_headers['ECO'], 'C20')
+
+        hashes = unpack_hashes(self.game.position_hashes)
+        self.assertEqual(len(hashes), 8)
+        self.assertEqual(hashes[0], position_hash(chess.Board()))
+        self.assertEqual(hashes[-1], position_hash(board))
+
+    def test_analysis_page_does_not_reparse_cached_games(self):
+        self.client.force_login(self.user)
+        with mock.patch('analysis.views.get_final_fen') as get_final_fen:
+            response = self.client.get(reverse('analysis:analyze_game'), {'game_id': self.game.pk})
+
+        get_final_fen.assert_not_called()
+        self.assertEqual(response.context['final_fen'], self.game.final_fen)
+        self.assertContains(response, 'Kings Pawn Opening')
+
+    def test_backfill_fills_missing_rows(self):
+        ChessGame.objects.update(
+            pgn=self.pgn_text, eco='', opening_name='', final_fen='', termination='', position_hashes=b'',
+            moves_packed=b'', clocks_packed=b'', pgn_headers={},
+        )
+        # Nothing was indexed for rows stored without position hashes
+        GamePosition.objects.all().delete()
+
+        call_command('backfill_game_data', stdout=io.StringIO())
+
+        game = ChessGame.objects.get(pk=self.game.pk)
+        self.assertEqual(game.pgn, '')
+        self.assertEqual(game.final_fen, self.game.final_fen)
+        self.assertEqual(bytes(game.position_hashes), bytes(self.game.position_hashes))
+        self.assertEqual(bytes(game.moves_packed), bytes(self.game.moves_packed))
+        self.assertEqual(game.pgn_headers, self.game.pgn_headers)
+        self.assertEqual(GamePosition.objects.filter(game=game).count(), 8)
+
+    def test_backfill_all_rebuilds_the_rows_derived_from_changed_games(self):
+        ChessGame.objects.update(pgn=self.pgn_text.replace('Kings-Pawn-Opening', 'Vienna-Game'))
+
+        call_command('backfill_game_data', '--all', stdout=io.StringIO())
+
+        openings = set(
+            GameStats.objects.filter(user=self.user, dimension=GameStats.DIMENSION_OPENING).values_list('bucket', flat=True)
+        )
+        self.assertEqual(openings, {'Vienna Game'})
+        self.assertEqual(search_user_games(self.user, 'vienna'), [self.game])
+        self.assertEqual(search_user_games(self.user, 'kings'), [])
+        self.assertEqual(GamePosition.objects.filter(game=self.game).count(), 8)
+        self.assertEqual(ExplorerMove.objects.filter(user=self.user).count(), 7)
+
+    def test_backfill_skips_games_whose_moves_do_not_replay(self):
+        game = make_game(2, self.user)
+        game.pgn = game.pgn.replace('3. Bc4 Nf6', '3. Ne3 Nf6')
+        ingest_games(self.user, [game])
+        game = ChessGame.objects.get(user=self.user, black_player__startswith='opponent2')
+        self.assertTrue(game.replay_failed)
+
+        stdout = io.StringIO()
+        call_command('backfill_game_data', stdout=stdout)
+
+        self.assertIn('Derived data computed for 0 games.', stdout.getvalue())
+
+    def test_chess960_castling_replays(self):
+        game = make_game(2, self.user)
+        game.pgn = (
+            '[Event "Live Chess 960"]\n[White "magnus"]\n[Black "opponent2"]\n[Result "*"]\n'
+            '[Variant "Chess960"]\n[SetUp "1"]\n[FEN "bqnbrkrn/pppppppp/8/8/8/8/PPPPPPPP/BQNBRKRN w GEge - 0 1"]\n\n'
+            '1. Ng3 Ng6 2. Nd3 Nd6 3. O-O O-O 4. e4 e5 *\n'
+        )
+        pgn_text = game.pgn
+        ingest_games(self.user, [game])
+        game = ChessGame.objects.get(user=self.user, black_player__startswith='opponent2')
+
+        self.assertEqual(game.moves_count, 4)
+        self.assertEqual(len(decode_moves(game.moves_packed)), 8)
+        self.assertEqual(scan_pgn(game.full_pgn()).moves, scan_pgn(pgn_text).moves)
+
+    def test_moves_that_do_not_replay_are_not_stored_as_a_prefix(self):
+        game = make_game(2, self.user)
+        game.pgn = game.pgn.replace('3. Bc4 Nf6', '3. Ne3 Nf6')
+        ingest_games(self.user, [game])
+        game = ChessGame.objects.get(user=self.user, black_player__startswith='opponent2')
+
+        self.assertEqual(game.moves_count, 4)
+        self.assertEqual(bytes(game.moves_packed), b'')
+        self.assertEqual(bytes(game.position_hashes), b'')
+        self.assertEqual(game.final_fen, '')
+        self.assertFalse(GamePosition.objects.filter(game=game).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('analysis:analyze_game'), {'game_id': game.pk})
+        self.assertEqual(response.context['pgn'], game.pgn)
+
+    def test_analysis_page_falls_back_to_the_pgn_for_truncated_moves(self):
+        # Rows stored before partial replays were discarded, which kept their PGN
+        ChessGame.objects.filter(pk=self.game.pk).update(pgn=self.pgn_text, moves_packed=bytes(self.game.moves_packed)[:12])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('analysis:analyze_game'), {'game_id': self.game.pk})
+
+        self.assertEqual(response.context['pgn'], self.pgn_text)
+
+
+class MoveCodecTests(TestCase):
+
+    def test_moves_and_clocks_round_trip_through_the_pgn(self):
+        board = chess.Board()
+        moves = [board.push_san(san) for san in ['e4', 'd5', 'exd5', 'c6', 'dxc6', 'Qd7', 'cxb7', 'Kd8', 'bxa8=N']]
+        clocks = [180.0, 179.9, 3725.5, None, 0.1, 12.0, 11.0, 10.0, 9.5]
+
+        moves_packed = encode_moves(moves)
+        clocks_packed = encode_clocks(clocks)
+        self.assertEqual(len(moves_packed), 2 * len(moves))
+        self.assertEqual(decode_moves(moves_packed), moves)
+        self.assertEqual(decode_clocks(clocks_packed), clocks)
+
+        headers = {'Event': 'Live Chess', 'White': 'magnus', 'Black': 'hikaru', 'Result': '*', 'ECO': 'B01'}
+        pgn = rebuild_pgn(headers, moves_packed, clocks_packed)
+        summary = scan_pgn(pgn)
+
+        self.assertEqual(summary.moves, ['e4', 'd5', 'exd5', 'c6', 'dxc6', 'Qd7', 'cxb7', 'Kd8', 'bxa8=N'])
+        self.assertEqual(summary.clocks, clocks)
+        self.assertEqual(summary.headers['ECO'], 'B01')
+        self.assertEqual(board_at(headers, moves_packed).fen(), board.fen())
+
+    def test_plain_games_are_stored_without_the_pgn_text(self):
+        user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        plain, annotated = make_game(1, user), make_game(2, user)
+        annotated.pgn = annotated.pgn.replace('2. Qh5', '2. Qh5!? {Early queen}')
+        plain_text, annotated_text = plain.pgn, annotated.pgn
+        ingest_games(user, [plain, annotated])
+        plain = ChessGame.objects.get(user=user, black_player__startswith='opponent1')
+        annotated = ChessGame.objects.get(user=user, black_player__startswith='opponent2')
+
+        self.assertEqual(plain.pgn, '')
+        self.assertEqual(annotated.pgn, annotated_text)
+
+        self.client.force_login(user)
+        response = self.client.get(reverse('analysis:analyze_game'), {'game_id': plain.pk})
+        self.assertEqual(scan_pgn(response.context['pgn'])[1:], scan_pgn(plain_text)[1:])
+        self.assertEqual(scan_pgn(response.context['pgn']).headers['Link'], 'https://www.chess.com/game/live/1')
+        response = self.client.get(reverse('analysis:analyze_game'), {'game_id': annotated.pk})
+        self.assertEqual(response.context['pgn'], annotated_text)
+
+
+class GameStatsTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+
+    def make_games(self, indexes):
+        games = [make_game(i, self.user) for i in indexes]
+        for game in games:
+            if game.black_player.startswith('opponent1'):
+                game.result_description = 'Loss'
+        return games
+
+    def test_ingest_increments_stats_in_place(self):
+        ingest_games(self.user, self.make_games(range(3)))
+        ingest_games(self.user, self.make_games(range(3, 5)))
+
+        total = GameStats.objects.get(user=self.user, dimension=GameStats.DIMENSION_ALL)
+        self.assertEqual(
+            (total.time_class, total.color, total.games, total.wins, total.losses, total.average_moves),
+            ('blitz', 'white', 5, 4, 1, 4.0),
+        )
+        opponents = GameStats.objects.get(user=self.user, dimension=GameStats.DIMENSION_OPPONENT)
+        self.assertEqual((opponents.bucket, opponents.games), ('2600-2799', 5))
+
+        stats = get_user_stats(self.user)
+        self.assertEqual(stats['totals'][0]['win_rate'], 80)
+        self.assertEqual(stats['openings'][0].bucket, 'Unknown')
+
+    def test_rebuild_fixes_drift(self):
+        ingest_games(self.user, self.make_games(range(4)))
+        expected = list(GameStats.objects.values_list('dimension', 'bucket', 'games', 'wins', 'losses').order_by('pk'))
+        GameStats.objects.update(games=100, wins=0)
+
+        call_command('rebuild_stats', stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(GameStats.objects.values_list('dimension', 'bucket', 'games', 'wins', 'losses')), sorted(expected)
+        )
+
+    def test_profile_shows_stats(self):
+        ingest_games(self.user, self.make_games(range(2)))
+        self.client.force_login(self.user)
+
+        with mock.patch('users.views.aupdate_player_data', return_value=False) as update:
+            response = self.client.get(reverse('users:profile'))
+
+        self.assertTrue(update.called)
+        self.assertContains(response, 'Game Stats')
+        self.assertEqual(response.context['game_stats']['totals'][0]['games'], 2)
+
+
+class ExplorerTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        games = [make_game(i, self.user) for i in range(3)]
+        # 1. e4 e5 2. Nf3 instead of 2. Qh5, and lost
+        games[2].pgn = games[2].pgn.replace('2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0', '2. Nf3 Nc6 0-1')
+        games[2].result_description = 'Loss'
+        ingest_games(self.user, games)
+
+    def explore(self, **params):
+        return self.client.get(reverse('analysis:explorer'), params).json()['moves']
+
+    def test_tree_counts_moves_and_results_per_position(self):
+        self.assertEqual(self.explore(), [{'uci': 'e2e4', 'san': 'e4', 'games': 3, 'wins': 2, 'draws': 0, 'losses': 1}])
+        self.assertEqual(
+            [(m['san'], m['games'], m['losses']) for m in self.explore(moves='e2e4,e7e5')],
+            [('Qh5', 2, 0), ('Nf3', 1, 1)],
+        )
+        self.assertEqual(self.explore(color='black'), [])
+
+    def test_one_indexed_lookup_per_ply(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.explore(moves='e2e4 e7e5 d1h5')
+        self.assertEqual(len([q for q in queries.captured_queries if 'analysis_explorermove' in q['sql']]), 1)
+
+    def test_rebuild_matches_incremental_counts(self):
+        expected = sorted(ExplorerMove.objects.values_list('position_hash', 'move', 'games', 'wins', 'losses'))
+        ExplorerMove.objects.update(games=0)
+
+        call_command('rebuild_explorer', stdout=io.StringIO())
+
+        self.assertEqual(sorted(ExplorerMove.objects.values_list('position_hash', 'move', 'games', 'wins', 'losses')), expected)
+
+    def test_invalid_moves_are_rejected(self):
+        response = self.client.get(reverse('analysis:explorer'), {'moves': 'e2e5'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PositionSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        games = [make_game(i, self.user) for i in range(3)]
+        # Reaches the position after 1. e4 e5 2. Qh5 Nc6 through another move order
+        games[2].pgn = games[2].pgn.replace('1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0', '1. e4 Nc6 2. Qh5 e5 1-0')
+        ingest_games(self.user, games)
+        self.games = {game.black_player: game for game in ChessGame.objects.filter(user=self.user)}
+
+    def search(self, *moves):
+        board = chess.Board()
+        for san in moves:
+            board.push_san(san)
+        response = self.client.get(reverse('analysis:position_search'), {'fen': board.fen()})
+        return [(game['black_player'], game['plies']) for game in response.json()['games']]
+
+    def test_finds_games_through_transpositions(self):
+        self.assertEqual(self.search('e4', 'e5', 'Qh5', 'Nc6'), [
+            ('opponent2 (2700)', [4]), ('opponent1 (2700)', [4]), ('opponent0 (2700)', [4]),
+        ])
+        self.assertEqual(self.search('e4', 'e5', 'Qh5', 'Nc6', 'Bc4'), [
+            ('opponent1 (2700)', [5]), ('opponent0 (2700)', [5]),
+        ])
+        self.assertEqual(self.search('d4'), [])
+
+    def test_matches_are_ordered_by_game_date_and_limited(self):
+        # Stored newest first, like an archive sync: the newest game has the lowest id
+        ingest_games(self.user, [make_game(20, self.user), make_game(10, self.user)])
+
+        self.assertEqual([name for name, _ in self.search('e4', 'e5', 'Qh5', 'Nc6', 'Bc4')], [
+            'opponent20 (2700)', 'opponent10 (2700)', 'opponent1 (2700)', 'opponent0 (2700)',
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            matches = find_games_with_position(self.user, chess.Board(), limit=2)
+        self.assertEqual([game.black_player for game, _ in matches], ['opponent20 (2700)', 'opponent10 (2700)'])
+        self.assertIn('LIMIT 2', queries.captured_queries[0]['sql'])
+
+    def test_backfill_indexes_games_without_positions(self):
+        GamePosition.objects.all().delete()
+        call_command('backfill_positions', stdout=io.StringIO())
+        self.assertEqual(GamePosition.objects.filter(game=self.games['opponent0 (2700)']).count(), 8)
+        self.assertEqual(len(self.search('e4', 'e5')), 2)
+
+
+class GameKeyTests(TestCase):
+
+    def test_chesscom_games_are_keyed_by_url(self):
+        pgn = make_game(7).pgn
+        self.assertEqual(make_game_key('https://www.chess.com/game/live/7', pgn), 'chess.com/game/live/7')
+        self.assertEqual(make_game_key(pgn=pgn), 'chess.com/game/live/7')
+
+    def test_imported_games_fall_back_to_normalized_pgn_hash(self):
+        pgn = '[Event "OTB"]\n\n1. e4 e5 2. Nf3 *\n'
+        key = make_game_key(pgn=pgn)
+
+        self.assertTrue(key.startswith('sha1:'))
+        self.assertEqual(key, make_game_key(pgn=pgn.replace('\n', '\r\n') + '\n\n'))
+
+
+class GameSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        games = [make_game(i, self.user) for i in range(3)]
+        games[2].pgn = games[2].pgn.replace(
+            '[Result "1-0"]', '[Result "1-0"]\n[ECO "C50"]\n[ECOUrl "https://www.chess.com/openings/Italian-Game"]'
+        )
+        ingest_games(self.user, games)
+
+    def test_prefix_search_over_opponents_dates_and_openings(self):
+        self.assertEqual([g.black_player for g in search_user_games(self.user, 'opponent1')], ['opponent1 (2700)'])
+        self.assertEqual(len(search_user_games(self.user, 'oppo')), 3)
+        self.assertEqual(len(search_user_games(self.user, '2024-09-02')), 1)
+        self.assertEqual(len(search_user_games(self.user, 'sep 3')), 1)
+        self.assertEqual([g.black_player for g in search_user_games(self.user, 'italian')], ['opponent2 (2700)'])
+        self.assertEqual(search_user_games(self.user, 'ruy'), [])
+
+    def test_search_is_scoped_to_the_user_and_follows_deletes(self):
+        other = CustomUser.objects.create_user('hikaru', 'hikaru@example.com', 'pass12345')
+        self.assertEqual(search_user_games(other, 'opponent'), [])
+
+        ChessGame.objects.filter(user=self.user).delete()
+        self.assertEqual(GameSearchDocument.objects.count(), 0)
+        self.assertEqual(search_user_games(self.user, 'opponent'), [])
+
+
+# Minimal UCI engine: always answers "+0.25, e2e4" at the requested depth
+STAND_IN_ENGINE = textwrap.dedent("""
+    import sys
+
+    for line in sys.stdin:
+        command = line.split()
+        if not command:
+            continue
+        if command[0] == 'uci':
+            print('id name StandIn')
+            print('option name Threads type spin default 1 min 1 max 64')
+            print('option name Hash type spin default 16 min 1 max 1024')
+            print('uciok')
+        elif command[0] == 'isready':
+            print('readyok')
+        elif command[0] == 'go':
+            depth = int(command[command.index('depth') + 1]) if 'depth' in command else 1
+            print(f'info depth {depth} score cp 25 pv e2e4 e7e5')
+            print('bestmove e2e4')
+        elif command[0] == 'quit':
+            break
+        sys.stdout.flush()
+""")
+
+
+class EngineTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handle, cls.engine_script = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(handle, 'w') as script:
+            script.write(STAND_IN_ENGINE)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.engine_script)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        self.addCleanup(reset_engine_pool)
+        self.addCleanup(get_local_cache().clear)
+
+    def test_evaluate_endpoint_returns_json(self):
+        with override_settings(CHESS_ENGINE_PATH=[sys.executable, self.engine_script], CHESS_ENGINE_MAX_DEPTH=12):
+            reset_engine_pool()
+            response = self.client.get(reverse('analysis:evaluate'), {'fen': chess.STARTING_FEN, 'depth': 30})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'fen': chess.STARTING_FEN, 'depth': 12, 'score': {'cp': 25, 'mate': None},
+            'best_move': 'e2e4', 'pv': ['e2e4', 'e7e5'], 'cached': False,
+        })
+
+    def test_evaluate_replays_a_cached_game_to_the_requested_ply(self):
+        ingest_games(self.user, [make_game(1, self.user)])
+        game = ChessGame.objects.get(user=self.user)
+        board = chess.Board()
+        board.push_san('e4')
+        store(board, {'depth': 30, 'score': {'cp': 40, 'mate': None}, 'best_move': 'e7e5', 'pv': ['e7e5']})
+
+        with override_settings(CHESS_ENGINE_PATH=''):
+            response = self.client.get(reverse('analysis:evaluate'), {'game_id': game.pk, 'ply': 1})
+
+        self.assertEqual(response.json()['fen'], board.fen())
+        self.assertEqual(response.json()['best_move'], 'e7e5')
+
+    def test_stored_evaluations_answer_shallower_requests_without_an_engine(self):
+        with override_settings(CHESS_ENGINE_PATH=[sys.executable, self.engine_script]):
+            reset_engine_pool()
+            self.client.get(reverse('analysis:evaluate'), {'depth': 10})
+
+        # Same position reached by a different move order, other process (empty LRU), no engine
+        get_local_cache().clear()
+        reset_engine_pool()
+        board = chess.Board()
+        for move in ['Nf3', 'Nf6', 'Ng1', 'Ng8']:
+            board.push_san(move)
+
+        with override_settings(CHESS_ENGINE_PATH=''):
+            response = self.client.get(reverse('analysis:evaluate'), {'fen': board.fen(), 'depth': 8})
+            self.assertEqual(response.json()['cached'], True)
+            self.assertEqual(response.json()['depth'], 10)
+
+            deeper = self.client.get(reverse('analysis:evaluate'), {'fen': board.fen(), 'depth': 14})
+            self.assertEqual(deeper.status_code, 503)
+
+    def test_full_pool_applies_backpressure(self):
+        pool = EnginePool([sys.executable, self.engine_script], size=1, max_queue=0)
+        self.addCleanup(pool.close)
+
+        with pool.engine():
+            with self.assertRaises(EngineBusy):
+                pool.acquire()
+
+        # The engine went back to the pool and is reused
+        with pool.engine() as engine:
+            self.assertEqual(engine.id['name'], 'StandIn')
+
+    def test_waiting_request_gets_an_engine_when_another_one_breaks(self):
+        pool = EnginePool([sys.executable, self.engine_script], size=1, max_queue=1, queue_timeout=10)
+        self.addCleanup(pool.close)
+        broken = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        while not pool.waiting:
+            time.sleep(0.01)
+
+        pool.release(broken, broken=True)
+        waiter.join(timeout=5)
+
+        self.assertEqual(len(acquired), 1)
+        self.assertIsNot(acquired[0], broken)
+        self.assertEqual(acquired[0].id['name'], 'StandIn')
+        pool.release(acquired[0])
+
+    @override_settings(CHESS_ENGINE_PATH='')
+    def test_missing_engine_answers_503(self):
+        reset_engine_pool()
+        response = self.client.get(reverse('analysis:evaluate'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_invalid_fen_is_rejected(self):
+        response = self.client.get(reverse('analysis:evaluate'), {'fen': 'not a fen'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_limits_below_one_are_rejected_before_the_engine(self):
+        with mock.patch('analysis.views.evaluate_position') as evaluate_position:
+            for params in ({'depth': '0'}, {'depth': '-5'}, {'time': '-1'}, {'time': 'nan'}, {'game_id': '1', 'ply': '-2'}):
+                response = self.client.get(reverse('analysis:evaluate'), params)
+                self.assertEqual(response.status_code, 400, params)
+        evaluate_position.assert_not_called()
+
+
+class EvaluationCacheTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(get_local_cache().clear)
+
+    def test_shallower_evaluation_never_replaces_a_deeper_one(self):
+        board = chess.Board()
+        store(board, {'depth': 20, 'score': {'cp': 30, 'mate': None}, 'best_move': 'e2e4', 'pv': ['e2e4']})
+        store(board, {'depth': 12, 'score': {'cp': 10, 'mate': None}, 'best_move': 'd2d4', 'pv': ['d2d4']})
+        get_local_cache().clear()
+
+        self.assertEqual(lookup(board, 18)['best_move'], 'e2e4')
+        self.assertIsNone(lookup(board, 22))
+
+        board.push_san('e4')
+        self.assertIsNone(lookup(board, 1))
+
+
+IMPORT_PGN = textwrap.dedent('''\
+    [Event "Club championship"]
+    [Site "Hastings ENG"]
+    [Date "2019.??.??"]
+    [White "Carlsen, M"]
+    [Black "magnus"]
+    [Result "0-1"]
+    [WhiteElo "2100"]
+
+    1. e4 e5 2. Nf3 {A long comment
+    [that looks like a header] } Nc6 0-1
+
+    [Event "Rated Blitz game"]
+    [Site "https://lichess.org/abcd1234"]
+    [UTCDate "2024.05.06"]
+    [White "magnus"]
+    [Black "hikaru"]
+    [Result "1/2-1/2"]
+    [TimeControl "180+2"]
+
+    1. d4 d5 1/2-1/2
+
+    [Event "Rated Blitz game"]
+    [Site "https://lichess.org/abcd1234"]
+    [UTCDate "2024.05.06"]
+    [White "magnus"]
+    [Black "hikaru"]
+    [Result "1/2-1/2"]
+    [TimeControl "180+2"]
+
+    1. d4 d5 1/2-1/2
+''')
+
+
+class PgnImportTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, 'games.pgn')
+        with open(self.path, 'w', encoding='utf-8') as pgn_file:
+            pgn_file.write(IMPORT_PGN)
+
+    def import_pgn(self, *args):
+        output = io.StringIO()
+        with mock.patch('builtins.print'):
+            call_command('import_pgn', self.path, '--user', 'magnus', *args, stdout=output)
+        return output.getvalue()
+
+    def test_games_are_split_without_reading_the_whole_file(self):
+        with open(self.path, 'rb') as handle:
+            games = list(iter_pgn_games(handle))
+        self.assertEqual(len(games), 3)
+        self.assertIn('[that looks like a header]', games[0][0])
+        self.assertEqual(games[-1][1], os.path.getsize(self.path))
+
+        # Resuming at a game boundary yields the rest of the file
+        with open(self.path, 'rb') as handle:
+            rest = list(iter_pgn_games(handle, games[0][1]))
+        self.assertEqual(rest, games[1:])
+
+    def test_import_dedupes_and_reports_progress(self):
+        output = self.import_pgn('--chunk-size', '1')
+
+        games = ChessGame.objects.filter(user=self.user).order_by('game_date')
+        self.assertEqual(games.count(), 2)
+        otb, online = games
+        self.assertEqual((otb.game_date, otb.white_player, otb.result_description), (datetime.date(2019, 1, 1), 'Carlsen, M (2100)', 'Win'))
+        self.assertEqual((online.game_key, online.time_control, online.result_description), ('lichess.org/abcd1234', 'Blitz', 'Draw'))
+        self.assertEqual(otb.moves_count, 2)
+
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.games_read, job.games_added, job.progress), (ImportJob.STATUS_DONE, 3, 2, 100))
+        self.assertIn('100.0%', output)
+
+        # A second import of the same file is a new job that only finds duplicates
+        self.import_pgn()
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ImportJob.objects.first().games_skipped, 3)
+
+    def test_interrupted_import_resumes_from_its_offset(self):
+        real_ingest = pgn_import.ingest_games
+        calls = []
+
+        def failing_ingest(user, games):
+            calls.append(len(games))
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return real_ingest(user, games)
+
+        with mock.patch.object(pgn_import, 'ingest_games', side_effect=failing_ingest):
+            with self.assertRaises(CommandError):
+                self.import_pgn('--chunk-size', '1')
+
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.games_read), (ImportJob.STATUS_FAILED, 1))
+        self.assertGreater(job.bytes_read, 0)
+
+        with mock.patch.object(pgn_import, 'ingest_games', side_effect=real_ingest) as ingest:
+            output = self.import_pgn('--chunk-size', '1')
+        self.assertIn(f'Resuming {self.path} at byte {job.bytes_read}', output)
+        self.assertEqual(sum(len(call.args[1]) for call in ingest.call_args_list), 2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.games_read, job.games_added), (ImportJob.STATUS_DONE, 3, 2))
+
+    def test_running_job_is_only_taken_over_with_force(self):
+        job = pgn_import.create_import_job(self.user, self.path, self.path)
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_RUNNING)
+
+        with self.assertRaisesMessage(CommandError, 'being run by another worker'):
+            self.import_pgn()
+        self.assertFalse(ChessGame.objects.filter(user=self.user).exists())
+
+        self.import_pgn('--force')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.games_added), (ImportJob.STATUS_DONE, 2))
+
+    def test_worker_imports_one_chunk_per_step(self):
+        pgn_import.create_import_job(self.user, self.path, self.path)
+        job = pgn_import.claim_next_import_job()
+
+        with mock.patch('builtins.print'):
+            steps = [pgn_import.step_import_job(job, chunk_size=1) for _ in range(4)]
+
+        self.assertEqual(steps, [True, True, True, False])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.games_read, job.games_added), (ImportJob.STATUS_DONE, 3, 2))
+        self.assertIsNone(pgn_import.claim_next_import_job())
+
+    def test_as_player_decides_the_result_color_and_rating(self):
+        self.import_pgn('--as-player', 'Carlsen, M')
+        game = ChessGame.objects.get(user=self.user, white_player__startswith='Carlsen')
+        self.assertEqual((game.result_description, game.player_name), ('Loss', 'Carlsen, M'))
+
+        stats = GameStats.objects.get(user=self.user, time_class='unknown', dimension=GameStats.DIMENSION_ALL)
+        self.assertEqual((stats.color, stats.losses), ('white', 1))
+        first_move = ExplorerMove.objects.get(user=self.user, color='white', position_hash=position_hash(chess.Board()))
+        self.assertEqual((first_move.games, first_move.losses), (1, 1))
+        self.assertEqual(list(RatingHistory.objects.filter(user=self.user).values_list('rating', flat=True)), [2100])
+
+    def test_upload_is_queued_for_the_worker(self):
+        self.client.force_login(self.user)
+        with override_settings(PGN_IMPORT_DIR=self.directory), open(self.path, 'rb') as pgn_file:
+            response = self.client.post(reverse('analysis:import_pgn'), {'pgn_file': pgn_file})
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get(pk=response.json()['job'])
+        self.assertTrue(job.is_upload)
+        self.assertEqual(job.source_name, 'games.pgn')
+
+        with mock.patch('builtins.print'):
+            self.assertEqual(run_pending_imports(), 1)
+
+        status = self.client.get(reverse('analysis:import_status'), {'job': job.pk}).json()
+        self.assertEqual((status['status'], status['games_added'], status['progress']), ('done', 2, 100))
+        self.assertFalse(os.path.exists(job.file_path))
+
+    @override_settings(PGN_IMPORT_MAX_BYTES=10)
+    def test_oversized_upload_is_rejected(self):
+        self.client.force_login(self.user)
+        with open(self.path, 'rb') as pgn_file:
+            response = self.client.post(reverse('analysis:import_pgn'), {'pgn_file': pgn_file})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(ImportJob.objects.exists())
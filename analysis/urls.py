@@ -5,4 +5,9 @@ app_name = 'analysis'
 
 urlpatterns = [
     path('analyze_game/', views.analyze_game, name='analyze_game'), 
+    path('evaluate/', views.evaluate, name='evaluate'),
+    path('explorer/', views.explorer, name='explorer'),
+    path('position_search/', views.position_search, name='position_search'),
+    path('import_pgn/', views.import_pgn, name='import_pgn'),
+    path('import_status/', views.import_status, name='import_status'),
 ]
\ No newline at end of file
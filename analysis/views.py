@@ -1,13 +1,230 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.conf import settings as django_settings
+from django.http import JsonResponse
+import io
+import os
+import uuid
+import chess # type: ignore
+import chess.engine # type: ignore
+import chess.pgn # type: ignore
+
+from chess_coach.monitoring import timed_pgn_parse
+
+from .derived import has_full_moves
+from .engine import EngineBusy, EngineUnavailable, evaluate_position
+from .explorer import explore
+from .models import ChessGame, ImportJob
+from .movecodec import board_at, decode_clocks, decode_moves
+from .pgn_import import create_import_job
+from .positions import find_games_with_position
 
 # Create your views here.
 
+def get_final_fen(pgn_text):
+    if not pgn_text:
+        return ''
+    try:
+        with timed_pgn_parse('python-chess'):
+            game = chess.pgn.read_game(io.StringIO(pgn_text))
+    except Exception as e:
+        print(f"PGN okuma hatası: {e}")
+        return ''
+    if game is None:
+        return ''
+    return game.end().board().fen()
+
 @login_required 
 def analyze_game(request):
+    game_id = request.POST.get('game_id') or request.GET.get('game_id')
     pgn_data = request.GET.get('pgn', '')
-    
+    game_obj = None
+
+    # The dashboard posts the id of one of the user's cached games
+    if game_id and game_id.isdigit():
+        game_obj = get_object_or_404(ChessGame, pk=game_id, user=request.user)
+        # Rebuilt from the packed moves unless the stored PGN has more to show
+        # (comments, variations) or moves that did not replay at ingest
+        pgn_data = game_obj.full_pgn()
+
+    # Cached games carry their derived data; only ad-hoc PGNs get parsed here
+    if game_obj and has_full_moves(game_obj):
+        final_fen = game_obj.final_fen
+        game_data = {
+            'eco': game_obj.eco,
+            'opening': game_obj.opening_name,
+            'termination': game_obj.get_termination_display(),
+            'moves': [move.uci() for move in decode_moves(game_obj.moves_packed)],
+            'clock_times': decode_clocks(game_obj.clocks_packed),
+        }
+    else:
+        final_fen = get_final_fen(pgn_data)
+        game_data = None
+
     context = {
         'pgn': pgn_data,
+        'game': game_obj,
+        'final_fen': final_fen,
+        'game_data': game_data,
     }
-    return render(request, 'analyze.html', context)
\ No newline at end of file
+    return render(request, 'analyze.html', context)
+
+def pgn_board_at(pgn_text, ply=None):
+    # Slow path of board_at for games whose packed moves are incomplete
+    game = chess.pgn.read_game(io.StringIO(pgn_text or ''))
+    if game is None:
+        raise ValueError('Empty PGN.')
+    board = game.board()
+    for move in list(game.mainline_moves())[:ply]:
+        board.push(move)
+    return board
+
+def parse_int(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def parse_float(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+@login_required
+def evaluate(request):
+    fen = request.GET.get('fen', '').strip()
+    game_id = parse_int(request.GET.get('game_id'))
+    ply = parse_int(request.GET.get('ply'))
+    depth = parse_int(request.GET.get('depth'))
+    time_limit = parse_float(request.GET.get('time'))
+
+    # Nothing below 1 reaches chess.engine.Limit, nor a negative ply the move slice
+    if (ply is not None and ply < 0) or (depth is not None and depth < 1) or (time_limit is not None and not time_limit > 0):
+        return JsonResponse({'error': 'Depth and time must be positive, ply at least 0.'}, status=400)
+
+    try:
+        if game_id:
+            # Position of one of the user's games, replayed from the packed moves
+            game_obj = get_object_or_404(
+                ChessGame.objects.only('pgn_headers', 'moves_packed', 'moves_count', 'final_fen'), pk=game_id, user=request.user
+            )
+            if has_full_moves(game_obj):
+                board = board_at(game_obj.pgn_headers, game_obj.moves_packed, ply)
+            else:
+                board = pgn_board_at(game_obj.pgn, ply)
+        else:
+            board = chess.Board(fen) if fen else chess.Board()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid FEN.'}, status=400)
+
+    if not board.is_valid():
+        return JsonResponse({'error': 'Illegal position.'}, status=400)
+
+    try:
+        evaluation = evaluate_position(board, depth=depth, time_limit=time_limit)
+    except EngineBusy as e:
+        response = JsonResponse({'error': str(e)}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    except EngineUnavailable as e:
+        print(f"Engine unavailable: {e}")
+        return JsonResponse({'error': 'Engine analysis is not available.'}, status=503)
+    except chess.engine.EngineError as e:
+        print(f"Engine error while analysing {board.fen()}: {e}")
+        return JsonResponse({'error': 'Engine analysis failed.'}, status=502)
+
+    return JsonResponse(evaluation)
+
+@login_required
+def explorer(request):
+    # Position from a FEN, or from UCI moves played from the start
+    fen = request.GET.get('fen', '').strip()
+    moves = request.GET.get('moves', '').replace(',', ' ').split()
+    color = request.GET.get('color', 'white')
+    if color not in ('white', 'black'):
+        return JsonResponse({'error': 'Invalid color.'}, status=400)
+
+    try:
+        board = chess.Board(fen) if fen else chess.Board()
+        for uci in moves:
+            board.push_uci(uci)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid position.'}, status=400)
+
+    return JsonResponse({'fen': board.fen(), 'color': color, 'moves': explore(request.user, board, color)})
+
+@login_required
+def position_search(request):
+    # Every game of the user that reached the position, with the plies it occurred at
+    fen = request.GET.get('fen', '').strip()
+    try:
+        board = chess.Board(fen) if fen else chess.Board()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid FEN.'}, status=400)
+
+    games = [
+        {
+            'pk': game_obj.pk,
+            'white_player': game_obj.white_player,
+            'black_player': game_obj.black_player,
+            'game_date': game_obj.game_date.isoformat(),
+            'time_control': game_obj.time_control,
+            'result_description': game_obj.result_description,
+            'plies': plies,
+        }
+        for game_obj, plies in find_games_with_position(request.user, board)
+    ]
+    return JsonResponse({'fen': board.fen(), 'games': games})
+
+def import_job_to_dict(job):
+    return {
+        'job': job.pk,
+        'source': job.source_name,
+        'status': job.status,
+        'finished': job.is_finished,
+        'progress': job.progress,
+        'bytes_read': job.bytes_read,
+        'file_size': job.file_size,
+        'games_read': job.games_read,
+        'games_added': job.games_added,
+        'games_skipped': job.games_skipped,
+        'error': job.error,
+    }
+
+@login_required
+def import_pgn(request):
+    # Stores the upload and queues it; the sync_chesscom worker imports it
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a PGN file as pgn_file.'}, status=405)
+
+    upload = request.FILES.get('pgn_file')
+    if upload is None:
+        return JsonResponse({'error': 'No PGN file.'}, status=400)
+    if upload.size > django_settings.PGN_IMPORT_MAX_BYTES:
+        return JsonResponse({'error': 'The file is too large.'}, status=413)
+
+    os.makedirs(django_settings.PGN_IMPORT_DIR, exist_ok=True)
+    file_path = os.path.join(django_settings.PGN_IMPORT_DIR, f'{uuid.uuid4().hex}.pgn')
+    # Chunk by chunk: large uploads are already spooled to disk by Django
+    with open(file_path, 'wb') as destination:
+        for chunk in upload.chunks():
+            destination.write(chunk)
+
+    job = create_import_job(
+        request.user, file_path, upload.name, request.POST.get('as_player', '').strip(), is_upload=True,
+    )
+    return JsonResponse(import_job_to_dict(job), status=202)
+
+@login_required
+def import_status(request):
+    import_jobs = ImportJob.objects.filter(user=request.user)
+
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        import_jobs = import_jobs.filter(pk=job_id)
+
+    job = import_jobs.first()
+    if job is None:
+        return JsonResponse({'error': 'No import job.'}, status=404)
+    return JsonResponse(import_job_to_dict(job))
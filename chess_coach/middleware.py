@@ -0,0 +1,95 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import monitoring
+
+
+# Times every request and counts its SQL queries, chess.com calls and PGN
+# parses into chess_coach/monitoring.py. Requests slower than
+# METRICS_SLOW_REQUEST_MS are printed with their most expensive queries, for
+# a METRICS_SLOW_REQUEST_SAMPLE share of requests (collecting the SQL text
+# costs a little, so only sampled requests do it).
+#
+# Sync only on purpose: under ASGI Django runs it in the thread that also
+# runs the thread-sensitive sync_to_async calls of async views, so their
+# queries go through the same execute_wrapper.
+
+SLOW_LOG_QUERIES = 5
+
+
+class QueryTimer:
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.stats.queries += 1
+            self.stats.db_seconds += seconds
+            if self.stats.query_log is not None:
+                self.stats.query_log.append((sql, seconds))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def slow_request_report(request, view, seconds, stats):
+    lines = [
+        f"Slow request: {request.method} {request.path} ({view}) {seconds * 1000:.0f} ms, "
+        f"{stats.queries} queries in {stats.db_seconds * 1000:.0f} ms, "
+        f"{stats.upstream_calls} chess.com calls in {stats.upstream_seconds * 1000:.0f} ms, "
+        f"{stats.pgn_parses} PGN parses in {stats.pgn_seconds * 1000:.0f} ms"
+    ]
+    # Same statement with other parameters counts as one
+    totals = {}
+    for sql, query_seconds in stats.query_log:
+        count, total = totals.get(sql, (0, 0.0))
+        totals[sql] = (count + 1, total + query_seconds)
+    slowest = sorted(totals.items(), key=lambda item: -item[1][1])[:SLOW_LOG_QUERIES]
+    for sql, (count, total) in slowest:
+        lines.append(f"  {total * 1000:8.1f} ms  x{count:<4} {sql[:300]}")
+    return '\n'.join(lines)
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        slow_ms = settings.METRICS_SLOW_REQUEST_MS
+        sampled = slow_ms > 0 and random.random() < settings.METRICS_SLOW_REQUEST_SAMPLE
+        stats = monitoring.RequestStats(collect_queries=sampled)
+        token = monitoring.current_request.set(stats)
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                timer = QueryTimer(stats)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            monitoring.current_request.reset(token)
+        seconds = time.perf_counter() - started
+
+        view = view_name(request)
+        monitoring.record_view(view, response.status_code, seconds, stats)
+        if sampled and seconds * 1000 >= slow_ms:
+            print(slow_request_report(request, view, seconds, stats))
+        return response
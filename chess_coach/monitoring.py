@@ -0,0 +1,193 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# In-process metrics for the /metrics endpoint (Prometheus text format).
+# chess_coach/middleware.py times every view with its DB queries,
+# users/ratelimit.py records every upstream chess.com call and
+# analysis/pgn_scan.py every PGN parse. Each process keeps its own numbers
+# (scrape every worker, or run a single one behind the scraper); counters
+# start from zero on restart, as Prometheus expects.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+PGN_PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+PREFIX = 'chesscoach_'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = PREFIX + name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.label_names, labels)), value
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket (non cumulative, last one is +Inf), sum]
+        self.values = {}
+
+    def observe(self, value, labels=()):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self.values.items()):
+            label_dict = dict(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**label_dict, 'le': str(bound)}, cumulative
+            yield f'{self.name}_sum', label_dict, total
+            yield f'{self.name}_count', label_dict, cumulative
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def counter(self, *args, **kwargs):
+        return self.add(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.add(Histogram(*args, **kwargs))
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+
+registry = Registry()
+
+view_requests = registry.counter('view_requests_total', 'Requests served, by view and status code.', ('view', 'status'))
+view_latency = registry.histogram('view_latency_seconds', 'Time spent in the view and the middleware below it.', ('view',))
+view_queries = registry.histogram('view_db_queries', 'SQL queries per request.', ('view',), QUERY_COUNT_BUCKETS)
+view_db_time = registry.histogram('view_db_seconds', 'Time spent in SQL per request.', ('view',))
+view_upstream_calls = registry.counter('view_upstream_calls_total', 'chess.com calls made while serving a view.', ('view',))
+view_pgn_parse_time = registry.counter('view_pgn_parse_seconds_total', 'PGN parsing time while serving a view.', ('view',))
+upstream_requests = registry.counter('upstream_requests_total', 'chess.com calls, by host and status code.', ('host', 'status'))
+upstream_latency = registry.histogram('upstream_latency_seconds', 'chess.com call latency, retries excluded.', ('host',))
+pgn_parse_time = registry.histogram('pgn_parse_seconds', 'Time to parse one PGN.', ('parser',), PGN_PARSE_BUCKETS)
+cache_lookups = registry.counter('cache_lookups_total', 'Cached page lookups, by page and hit or miss.', ('page', 'result'))
+
+
+class RequestStats:
+    # What one request spent, filled while it runs (see the middleware)
+
+    def __init__(self, collect_queries=False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.pgn_parses = 0
+        self.pgn_seconds = 0.0
+        # (sql, seconds) of every query, only for sampled slow-log requests
+        self.query_log = [] if collect_queries else None
+
+
+# Set by the middleware; copied into sync_to_async and asyncio.to_thread calls
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+def record_view(view, status, seconds, stats):
+    labels = (view,)
+    with registry.lock:
+        view_requests.inc((view, str(status)))
+        view_latency.observe(seconds, labels)
+        view_queries.observe(stats.queries, labels)
+        view_db_time.observe(stats.db_seconds, labels)
+        if stats.upstream_calls:
+            view_upstream_calls.inc(labels, stats.upstream_calls)
+        if stats.pgn_parses:
+            view_pgn_parse_time.inc(labels, stats.pgn_seconds)
+
+
+def record_upstream(host, status, seconds):
+    # status is the HTTP status, or the exception name of a failed call
+    with registry.lock:
+        upstream_requests.inc((host, str(status)))
+        upstream_latency.observe(seconds, (host,))
+    stats = current_request.get()
+    if stats is not None:
+        stats.upstream_calls += 1
+        stats.upstream_seconds += seconds
+
+
+def record_pgn_parse(parser, seconds):
+    with registry.lock:
+        pgn_parse_time.observe(seconds, (parser,))
+    stats = current_request.get()
+    if stats is not None:
+        stats.pgn_parses += 1
+        stats.pgn_seconds += seconds
+
+
+def record_cache(page, hit):
+    with registry.lock:
+        cache_lookups.inc((page, 'hit' if hit else 'miss'))
+
+
+@contextmanager
+def timed_pgn_parse(parser):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_pgn_parse(parser, time.perf_counter() - started)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+        name = f'{name}{{{label_text}}}'
+    return f'{name} {value}'
+
+
+def render(extra_gauges=()):
+    # Prometheus text exposition (version 0.0.4). extra_gauges: (name, help,
+    # [(labels, value)]) read at scrape time, such as the scheduler state.
+    lines = []
+    with registry.lock:
+        for metric in registry.metrics:
+            kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {kind}')
+            lines.extend(format_sample(*sample) for sample in metric.samples())
+
+    for name, help_text, samples in extra_gauges:
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} gauge')
+        lines.extend(format_sample(PREFIX + name, labels, value) for labels, value in samples)
+    return '\n'.join(lines) + '\n'
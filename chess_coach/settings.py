@@ -60,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chess_coach.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'chess_coach.urls'
@@ -94,6 +95,27 @@ DATABASES = {
 }
 
 
+# Per-process memory by default. Any Django backend works, e.g. CACHE_BACKEND=
+# django.core.cache.backends.filebased.FileBasedCache with a directory as CACHE_LOCATION,
+# or django.core.cache.backends.redis.RedisCache with a redis:// URL, to share it between workers.
+# 'game_versions' (users/gamecache.py) must be shared by the web workers and the sync
+# worker: files on this host by default, the same redis as 'default' across hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'chess-coach'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+    },
+    'game_versions': {
+        'BACKEND': os.getenv('GAME_VERSIONS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('GAME_VERSIONS_CACHE_LOCATION', os.path.join(BASE_DIR, '.game_versions')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('GAME_VERSIONS_MAX_ENTRIES', 100000))},
+    },
+}
+
+# Keeps the tests off the shared cache directories
+TEST_RUNNER = 'chess_coach.test_runner.TestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -143,3 +165,82 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "users.CustomUser"
 
 LOGIN_URL = 'users:login'
+
+# Chess.com API client (users/chesscom.py)
+CHESSCOM_API_BASE = os.getenv('CHESSCOM_API_BASE', 'https://api.chess.com/pub')
+# Response bodies for conditional GETs; archives of finished months are kept forever
+CHESSCOM_CACHE_DIR = os.getenv('CHESSCOM_CACHE_DIR', os.path.join(BASE_DIR, '.chesscom_cache'))
+# live: talk to chess.com; record: talk to chess.com and keep every profile and archive
+# response in CHESSCOM_MIRROR_DIR; replay: answer from that mirror only, without network
+CHESSCOM_API_MODE = os.getenv('CHESSCOM_API_MODE', 'live')
+CHESSCOM_MIRROR_DIR = os.getenv('CHESSCOM_MIRROR_DIR', os.path.join(BASE_DIR, '.chesscom_mirror'))
+# Keep-alive connections per process
+CHESSCOM_POOL_SIZE = int(os.getenv('CHESSCOM_POOL_SIZE', 10))
+# Upper bound (seconds) for the concurrent profile + stats fetch in the async profile view
+CHESSCOM_PROFILE_TIMEOUT = float(os.getenv('CHESSCOM_PROFILE_TIMEOUT', 5))
+# Request scheduler shared by all processes (users/ratelimit.py): token bucket rate
+# (requests/s) and burst, requests in flight per host, and the longest a call waits
+# for its turn (seconds) before failing like any other upstream error
+CHESSCOM_RATE_LIMIT = float(os.getenv('CHESSCOM_RATE_LIMIT', 3))
+CHESSCOM_RATE_BURST = int(os.getenv('CHESSCOM_RATE_BURST', 6))
+CHESSCOM_MAX_CONCURRENCY = int(os.getenv('CHESSCOM_MAX_CONCURRENCY', 4))
+CHESSCOM_SCHEDULER_TIMEOUT = float(os.getenv('CHESSCOM_SCHEDULER_TIMEOUT', 30))
+# Retries of throttled (429) and failed attempts, with exponential backoff and full jitter
+CHESSCOM_MAX_RETRIES = int(os.getenv('CHESSCOM_MAX_RETRIES', 3))
+CHESSCOM_BACKOFF_BASE = float(os.getenv('CHESSCOM_BACKOFF_BASE', 0.5))
+CHESSCOM_BACKOFF_MAX = float(os.getenv('CHESSCOM_BACKOFF_MAX', 30))
+# Lock and bucket files; defaults to <CHESSCOM_CACHE_DIR>/ratelimit
+CHESSCOM_RATELIMIT_DIR = os.getenv('CHESSCOM_RATELIMIT_DIR', '')
+# Profile ratings younger than this (seconds) are served as they are; older ones are
+# still served, and the sync worker refreshes them in the background
+CHESSCOM_PROFILE_TTL = int(os.getenv('CHESSCOM_PROFILE_TTL', 600))
+
+# Chess.com sync worker (manage.py sync_chesscom)
+# A dashboard visit only queues a new archive sync if the last one finished longer ago than this
+CHESSCOM_SYNC_INTERVAL = int(os.getenv('CHESSCOM_SYNC_INTERVAL', 300))
+# A job still running this many seconds after it started is taken for one whose worker
+# died: it is marked failed so that a new one can be queued
+CHESSCOM_SYNC_STALE_AFTER = int(os.getenv('CHESSCOM_SYNC_STALE_AFTER', 3600))
+# search_games fallback: how many recent months to scan, and how many to download at once
+CHESSCOM_SEARCH_MONTHS = int(os.getenv('CHESSCOM_SEARCH_MONTHS', 6))
+CHESSCOM_SEARCH_CONCURRENCY = int(os.getenv('CHESSCOM_SEARCH_CONCURRENCY', 3))
+
+# Server-side engine analysis (analysis/engine.py)
+# Path (or command line) of a local UCI engine such as Stockfish; analysis is disabled when empty
+CHESS_ENGINE_PATH = os.getenv('CHESS_ENGINE_PATH', '')
+# Engine processes per web worker; by default the CPUs are split between the WEB_CONCURRENCY workers
+CHESS_ENGINE_POOL_SIZE = int(os.getenv(
+    'CHESS_ENGINE_POOL_SIZE', max(1, (os.cpu_count() or 1) // int(os.getenv('WEB_CONCURRENCY', 1)))
+))
+# UCI "Threads" and "Hash" (MB) of each engine process
+CHESS_ENGINE_THREADS = int(os.getenv('CHESS_ENGINE_THREADS', 1))
+CHESS_ENGINE_HASH_MB = int(os.getenv('CHESS_ENGINE_HASH_MB', 64))
+# Requests allowed to wait for a busy pool, and for how long (seconds), before answering 503
+CHESS_ENGINE_MAX_QUEUE = int(os.getenv('CHESS_ENGINE_MAX_QUEUE', 8))
+CHESS_ENGINE_QUEUE_TIMEOUT = float(os.getenv('CHESS_ENGINE_QUEUE_TIMEOUT', 10))
+# Per-request limits; clients may ask for less but never for more
+CHESS_ENGINE_DEFAULT_DEPTH = int(os.getenv('CHESS_ENGINE_DEFAULT_DEPTH', 16))
+CHESS_ENGINE_MAX_DEPTH = int(os.getenv('CHESS_ENGINE_MAX_DEPTH', 24))
+CHESS_ENGINE_MAX_TIME = float(os.getenv('CHESS_ENGINE_MAX_TIME', 5))
+# Evaluations kept in each process's LRU in front of the PositionEvaluation table
+EVAL_CACHE_SIZE = int(os.getenv('EVAL_CACHE_SIZE', 10000))
+
+# Cached dashboard game list and load_more_games pages (users/gamecache.py), in seconds;
+# new games invalidate them right away, this only bounds how long unused pages stay around
+GAME_CACHE_TIMEOUT = int(os.getenv('GAME_CACHE_TIMEOUT', 3600))
+
+# Opening explorer (analysis/explorer.py): plies of every game counted into the move tree
+EXPLORER_MAX_PLY = int(os.getenv('EXPLORER_MAX_PLY', 30))
+
+# PGN imports (analysis/pgn_import.py): where uploads wait for the worker, the largest
+# upload accepted (bytes), and games stored per transaction (the resume checkpoint)
+PGN_IMPORT_DIR = os.getenv('PGN_IMPORT_DIR', os.path.join(BASE_DIR, '.pgn_imports'))
+PGN_IMPORT_MAX_BYTES = int(os.getenv('PGN_IMPORT_MAX_BYTES', 1024 ** 3))
+PGN_IMPORT_CHUNK_SIZE = int(os.getenv('PGN_IMPORT_CHUNK_SIZE', 1000))
+
+# Request metrics (chess_coach/middleware.py), exported at /metrics for staff
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# Requests slower than this (ms) are printed with their most expensive queries; 0 turns the log off
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', 0))
+# Share of requests (0-1) that collect the query breakdown the slow log needs
+METRICS_SLOW_REQUEST_SAMPLE = float(os.getenv('METRICS_SLOW_REQUEST_SAMPLE', 0.1))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+# Runs the tests with every cache alias in this process's memory. The real
+# 'game_versions' alias is a directory shared with the running web and sync
+# workers, which a test must never read from or clear.
+
+
+def local_caches():
+    return {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'chess-coach-test-{alias}'}
+        for alias in settings.CACHES
+    }
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(CACHES=local_caches())
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -22,5 +22,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('users.urls')),
     path('',views.home, name='home'),
+    path('metrics/', views.metrics, name='metrics'),
     path('analysis/', include('analysis.urls')),
 ]
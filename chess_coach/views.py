@@ -1,6 +1,36 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
 from django.shortcuts import render, redirect
 
+from users import ratelimit
+from . import monitoring
+
 # Home view
 def home(request):
-    return render(request, 'home.html', {'user': request.user})
\ No newline at end of file
+    return render(request, 'home.html', {'user': request.user})
+
+def scheduler_gauges():
+    # Shared state of the chess.com request scheduler, read at scrape time
+    snapshot = ratelimit.snapshot()
+    gauges = [
+        (f'upstream_scheduler_{name}', f'chess.com request scheduler: {name.replace("_", " ")} in this process.', [({}, value)])
+        for name, value in snapshot['process'].items()
+    ]
+    for name, help_text in (
+        ('tokens', 'Tokens left in the shared bucket.'),
+        ('blocked_for', 'Seconds the host is still paused after a 429.'),
+        ('slots_busy', 'Requests in flight across all processes.'),
+    ):
+        gauges.append((
+            f'upstream_host_{name}', help_text,
+            [({'host': host}, state[name]) for host, state in snapshot['hosts'].items()],
+        ))
+    return gauges
+
+# Prometheus scrape target
+@staff_member_required
+def metrics(request):
+    return HttpResponse(
+        monitoring.render(scheduler_gauges()), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
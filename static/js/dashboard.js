@@ -1,15 +1,21 @@
 // static/js/dashboard.js
 
 const DEFAULT_LIMIT = 5;
+const SYNC_POLL_INTERVAL = 3000;
 
 document.addEventListener("DOMContentLoaded", function () {
-    let currentOffset = DEFAULT_LIMIT; 
+    // Keyset pagination: the server hands out an opaque cursor for the next page.
+    // loadedPages remembers where each extra page started so Collapse can step back.
+    const gamesPageData = document.getElementById('games-page-data');
+    let nextCursor = gamesPageData ? JSON.parse(gamesPageData.textContent).next_cursor : null;
+    const loadedPages = [];
 
     const searchInput = document.querySelector(".search-input");
     const gameTableBody = document.querySelector(".game-table tbody");
     const loadMoreBtn = document.getElementById('load-more-btn');
     const collapseBtn = document.getElementById('collapse-btn');
     const loadingMessage = document.querySelector('.loading-message');
+    const syncMessage = document.querySelector('.sync-message');
 
     if (typeof loadMoreGamesUrl === 'undefined' || typeof searchGamesUrl === 'undefined' || typeof analyzeGameUrl === 'undefined') {
         console.error("ERROR: Django URL variables are NOT defined globally.");
@@ -32,6 +38,42 @@ document.addEventListener("DOMContentLoaded", function () {
     }
     const csrfToken = getCookie('csrftoken');
 
+    // Archives are fetched by the background worker; poll until the queued job finishes.
+    // onProgress runs whenever the job has stored more games than at the last poll.
+    const pollingJobs = new Set();
+
+    function waitForSync(syncJob, onDone, onProgress) {
+        if (!syncJob || syncJob.finished || pollingJobs.has(syncJob.job)) {
+            return;
+        }
+        pollingJobs.add(syncJob.job);
+        syncMessage.style.display = 'block';
+        let gamesSeen = syncJob.games_added;
+
+        setTimeout(function poll() {
+            fetch(`${syncStatusUrl}?job=${syncJob.job}`)
+                .then(res => res.json())
+                .then(data => {
+                    if (!data.finished) {
+                        if (onProgress && data.games_added > gamesSeen) {
+                            gamesSeen = data.games_added;
+                            onProgress(data);
+                        }
+                        setTimeout(poll, SYNC_POLL_INTERVAL);
+                        return;
+                    }
+                    pollingJobs.delete(syncJob.job);
+                    syncMessage.style.display = 'none';
+                    onDone(data);
+                })
+                .catch(err => {
+                    console.error("Sync status check failed:", err);
+                    pollingJobs.delete(syncJob.job);
+                    syncMessage.style.display = 'none';
+                });
+        }, SYNC_POLL_INTERVAL);
+    }
+
     function createGameRow(game) {
         let resultClass;
         if (game.result_description.includes("Win")) {
@@ -98,7 +140,13 @@ document.addEventListener("DOMContentLoaded", function () {
 
                 if (data.games.length === 0) {
                     gameTableBody.innerHTML = `<tr><td colspan="6" class="no-games">No games found.</td></tr>`;
-                    currentOffset = 0;
+                    // Matches from the chess.com archive scan are shown as soon as they are stored
+                    const refreshSearch = status => {
+                        if (status.games_added > 0 && searchInput.value.trim() === query) {
+                            performSearch(query);
+                        }
+                    };
+                    waitForSync(data.sync_job, refreshSearch, refreshSearch);
                     return;
                 }
 
@@ -106,7 +154,6 @@ document.addEventListener("DOMContentLoaded", function () {
                     gameTableBody.insertAdjacentHTML('beforeend', createGameRow(game));
                 });
                 
-                currentOffset = data.games.length;
                 updateControlButtons(); 
             })
             .catch(err => {
@@ -124,7 +171,8 @@ document.addEventListener("DOMContentLoaded", function () {
         loadingMessage.style.display = 'block';
         loadMoreBtn.disabled = true; 
 
-        const url = `${loadMoreGamesUrl}?offset=${currentOffset}`;
+        const pageCursor = nextCursor;
+        const url = pageCursor ? `${loadMoreGamesUrl}?cursor=${encodeURIComponent(pageCursor)}` : loadMoreGamesUrl;
 
         fetch(url)
             .then(response => response.json())
@@ -134,11 +182,17 @@ document.addEventListener("DOMContentLoaded", function () {
                         gameTableBody.insertAdjacentHTML('beforeend', createGameRow(game));
                     });
                     
-                    currentOffset += data.games.length;
-                    
-                    const newUrl = `${window.location.pathname}?offset=${currentOffset}`;
-                    window.history.pushState({count: currentOffset}, '', newUrl);
+                    loadedPages.push({cursor: pageCursor, count: data.games.length});
+                    nextCursor = data.next_cursor;
                     
+                } else if (data.sync_job && !data.sync_job.finished) {
+                    waitForSync(data.sync_job, status => {
+                        if (status.games_added > 0) {
+                            loadMoreBtn.click();
+                        } else {
+                            alert("No more games found in your history.");
+                        }
+                    });
                 } else {
                     alert("No more games found in your history.");
                 }
@@ -156,24 +210,16 @@ document.addEventListener("DOMContentLoaded", function () {
     });
 
     collapseBtn.addEventListener('click', function() {
-        const rows = gameTableBody.querySelectorAll('tr');
+        const lastPage = loadedPages.pop();
         
-        if (rows.length > DEFAULT_LIMIT) {
-            for (let i = 0; i < DEFAULT_LIMIT; i++) {
+        if (lastPage) {
+            for (let i = 0; i < lastPage.count; i++) {
                 if (gameTableBody.lastElementChild) {
                     gameTableBody.removeChild(gameTableBody.lastElementChild);
                 }
             }
             
-            currentOffset = gameTableBody.querySelectorAll('tr').length;
-            const rowsAfterCollapse = currentOffset;
-
-            if (rowsAfterCollapse === DEFAULT_LIMIT) {
-                window.history.pushState(null, '', window.location.pathname); 
-            } else {
-                const newUrl = `${window.location.pathname}?offset=${rowsAfterCollapse}`;
-                window.history.pushState({count: rowsAfterCollapse}, '', newUrl);
-            }
+            nextCursor = lastPage.cursor;
         }
 
         updateControlButtons();
@@ -199,24 +245,26 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     });
 
+    const syncJobData = document.getElementById('sync-job-data');
+    if (syncJobData) {
+        waitForSync(JSON.parse(syncJobData.textContent), status => {
+            if (status.games_added > 0 && searchInput.value.trim() === '') {
+                location.reload();
+            }
+        });
+    }
+
     const urlParams = new URLSearchParams(window.location.search);
     const initialQuery = urlParams.get('query');
-    const initialOffsetParam = urlParams.get('offset'); 
-    const rowsOnScreen = gameTableBody.querySelectorAll('tr').length; 
 
     if (initialQuery) {
         searchInput.value = initialQuery;
         performSearch(initialQuery); 
     } 
     else {
-        if (initialOffsetParam && rowsOnScreen === DEFAULT_LIMIT) {
-            
-            const cleanUrl = window.location.pathname; 
-            window.history.replaceState(null, '', cleanUrl);
-            currentOffset = DEFAULT_LIMIT; 
-            
-        } else if (initialOffsetParam && rowsOnScreen > DEFAULT_LIMIT) {
-             currentOffset = rowsOnScreen;
+        if (urlParams.get('offset')) {
+            // Links from before cursor pagination
+            window.history.replaceState(null, '', window.location.pathname);
         }
 
         updateControlButtons();
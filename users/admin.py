@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser
+from .models import CustomUser, SyncJob
 from django.contrib.auth.admin import UserAdmin
 
 # Register your models here.
@@ -21,3 +21,10 @@ class CustomUserAdmin(UserAdmin):
     )
     search_fields = ('username', 'email')
     ordering = ('username',)
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'query', 'status', 'games_added', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('user__username',)
@@ -0,0 +1,290 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+
+from . import ratelimit
+
+
+# Shared client for the chess.com public API.
+# One pooled session per process (keep-alive), conditional GETs with ETag /
+# Last-Modified, and an on-disk cache of response bodies. Archives of months
+# that are already over never change, so they are cached permanently.
+# Every request goes through the cross-process scheduler in users/ratelimit.py.
+# CHESSCOM_API_MODE=record keeps every response in a local mirror, and replay
+# serves the whole app from that mirror with no network access.
+
+API_HEADERS = {
+    'User-Agent': 'ChessCoach(but still under development)/1.0 (contact: meleknurbacakli5@gmail.com)'
+}
+
+ARCHIVE_MONTH_RE = re.compile(r'/games/(\d{4})/(\d{2})/?$')
+
+# CHESSCOM_API_MODE: live requests, live requests recorded into the mirror,
+# or requests answered from the mirror only
+API_MODE_LIVE = 'live'
+API_MODE_RECORD = 'record'
+API_MODE_REPLAY = 'replay'
+API_MODES = (API_MODE_LIVE, API_MODE_RECORD, API_MODE_REPLAY)
+
+# Error responses worth replaying; anything else is transient
+MIRRORED_ERRORS = (404, 410)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class MirrorMiss(requests.exceptions.RequestException):
+    # Replay mode and the URL was never recorded; callers fall back as when offline
+    pass
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(API_HEADERS)
+                adapter = HTTPAdapter(
+                    pool_connections=settings.CHESSCOM_POOL_SIZE,
+                    pool_maxsize=settings.CHESSCOM_POOL_SIZE,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def player_url(username):
+    return f'{settings.CHESSCOM_API_BASE}/player/{username.lower()}'
+
+
+def stats_url(username):
+    return f'{player_url(username)}/stats'
+
+
+def archives_url(username):
+    return f'{player_url(username)}/games/archives'
+
+
+def is_closed_archive(url):
+    # True for monthly archive URLs of a month that has already ended (UTC)
+    match = ARCHIVE_MONTH_RE.search(url)
+    if not match:
+        return False
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return (int(match.group(1)), int(match.group(2))) < (today.year, today.month)
+
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    directory = os.path.join(settings.CHESSCOM_CACHE_DIR, key[:2])
+    return os.path.join(directory, f'{key}.meta'), os.path.join(directory, f'{key}.body')
+
+
+def _read_cache(url):
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        with open(body_path, 'rb') as body_file:
+            body = body_file.read()
+    except (OSError, ValueError):
+        return None
+    return meta, body
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_cache(url, response, permanent):
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'permanent': permanent,
+    }
+    meta_path, body_path = _cache_paths(url)
+    try:
+        # Body first: a meta file always points at a complete body
+        _write_atomic(body_path, response.content)
+        _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+    except OSError as e:
+        print(f"Could not write API cache for {url}: {e}")
+
+
+def _write_cache_meta_permanent(url, meta):
+    # A month that was revalidated while still current has ended since then
+    meta_path, _ = _cache_paths(url)
+    try:
+        _write_atomic(meta_path, json.dumps(dict(meta, permanent=True)).encode('utf-8'))
+    except OSError as e:
+        print(f"Could not write API cache for {url}: {e}")
+
+
+def fetch_body(url, timeout=10):
+    # Response body of a live request, through the conditional cache
+    cached = _read_cache(url)
+
+    if cached:
+        meta, body = cached
+        if meta.get('permanent'):
+            return body
+
+    conditional_headers = {}
+    if cached:
+        if meta.get('etag'):
+            conditional_headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            conditional_headers['If-Modified-Since'] = meta['last_modified']
+
+    response = ratelimit.send(get_session(), url, headers=conditional_headers, timeout=timeout)
+
+    if response.status_code == 304 and cached:
+        if is_closed_archive(url):
+            _write_cache_meta_permanent(url, meta)
+        return body
+
+    response.raise_for_status()
+    _write_cache(url, response, permanent=is_closed_archive(url))
+    return response.content
+
+
+def get_api_mode():
+    mode = settings.CHESSCOM_API_MODE
+    if mode not in API_MODES:
+        raise ImproperlyConfigured(f"CHESSCOM_API_MODE must be one of {', '.join(API_MODES)}, not {mode!r}.")
+    return mode
+
+
+# Mirror of recorded responses (CHESSCOM_API_MODE=record), served back by
+# replay mode without any network access. Bodies are stored once under
+# their SHA-256 (objects/), and every URL points at its body (refs/), so
+# repeated identical responses cost one file.
+
+def _mirror_ref_path(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(settings.CHESSCOM_MIRROR_DIR, 'refs', key[:2], f'{key}.json')
+
+
+def _mirror_object_path(digest):
+    return os.path.join(settings.CHESSCOM_MIRROR_DIR, 'objects', digest[:2], digest)
+
+
+def read_mirror(url):
+    # (ref, body) of a recorded URL, or None
+    try:
+        with open(_mirror_ref_path(url), 'r', encoding='utf-8') as ref_file:
+            ref = json.load(ref_file)
+        with open(_mirror_object_path(ref['sha256']), 'rb') as body_file:
+            return ref, body_file.read()
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def record_mirror(url, status_code, body):
+    digest = hashlib.sha256(body).hexdigest()
+    ref_path = _mirror_ref_path(url)
+    try:
+        object_path = _mirror_object_path(digest)
+        if not os.path.exists(object_path):
+            _write_atomic(object_path, body)
+
+        try:
+            with open(ref_path, 'r', encoding='utf-8') as ref_file:
+                ref = json.load(ref_file)
+        except (OSError, ValueError):
+            ref = {}
+        if ref.get('sha256') == digest and ref.get('status') == status_code:
+            return
+
+        ref = {'url': url, 'status': status_code, 'sha256': digest, 'recorded_at': time.time()}
+        _write_atomic(ref_path, json.dumps(ref).encode('utf-8'))
+    except OSError as e:
+        print(f"Could not write the chess.com mirror for {url}: {e}")
+
+
+def replay_body(url):
+    recorded = read_mirror(url)
+    if recorded is None:
+        raise MirrorMiss(f"{url} is not in the chess.com mirror.")
+    ref, body = recorded
+    if ref['status'] != 200:
+        # Recorded errors (unknown player, ...) fail like the live request did
+        response = requests.Response()
+        response.status_code = ref['status']
+        response.url = url
+        response._content = body
+        response.raise_for_status()
+    return body
+
+
+def get_json(url, timeout=10):
+    mode = get_api_mode()
+    if mode == API_MODE_REPLAY:
+        return json.loads(replay_body(url))
+
+    try:
+        body = fetch_body(url, timeout)
+    except requests.exceptions.HTTPError as e:
+        if mode == API_MODE_RECORD and e.response is not None and e.response.status_code in MIRRORED_ERRORS:
+            record_mirror(url, e.response.status_code, e.response.content)
+        raise
+
+    if mode == API_MODE_RECORD:
+        record_mirror(url, 200, body)
+    return json.loads(body)
+
+
+def get_player(username, timeout=5):
+    return get_json(player_url(username), timeout=timeout)
+
+
+def get_stats(username, timeout=5):
+    return get_json(stats_url(username), timeout=timeout)
+
+
+def get_archives(username, timeout=10):
+    return get_json(archives_url(username), timeout=timeout).get('archives', [])
+
+
+def get_archive_games(archive_url, timeout=10):
+    return get_json(archive_url, timeout=timeout).get('games', [])
+
+
+# Async wrappers for async views. Each call runs in a worker thread on the
+# shared session, so concurrent calls reuse the same keep-alive pool and the
+# same conditional cache as the sync helpers above.
+
+async def aget_json(url, timeout=10):
+    return await asyncio.to_thread(get_json, url, timeout)
+
+
+async def aget_player(username, timeout=5):
+    return await aget_json(player_url(username), timeout=timeout)
+
+
+async def aget_stats(username, timeout=5):
+    return await aget_json(stats_url(username), timeout=timeout)
@@ -0,0 +1,233 @@
+import datetime
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chess # type: ignore
+
+
+# Local stand-in for the chess.com public API, for benchmarks (manage.py
+# bench_views) and tests. Point CHESSCOM_API_BASE at stub.api_base and every
+# player added with add_player() gets a profile, stats, an archive list and
+# monthly archives of synthetic games. Archives are generated on request,
+# deterministically from the seed, so nothing has to be kept in memory.
+
+# ECO code, ECOUrl name and the moves that open every game of the line
+OPENINGS = (
+    ('C20', 'Kings-Pawn-Opening', ('e4', 'e5')),
+    ('B20', 'Sicilian-Defense', ('e4', 'c5')),
+    ('C00', 'French-Defense', ('e4', 'e6')),
+    ('D00', 'Queens-Pawn-Opening', ('d4', 'd5')),
+    ('A10', 'English-Opening', ('c4',)),
+    ('A40', 'Queens-Pawn-Opening-Horwitz-Defense', ('d4', 'e6')),
+)
+
+TIME_CLASSES = (('blitz', '180'), ('rapid', '600'), ('bullet', '60'))
+
+# How the synthetic user's result reads in the archive and in the PGN
+RESULT_CODES = (
+    ('win', 'resigned', 'won by resignation'),
+    ('win', 'timeout', 'won on time'),
+    ('resigned', 'win', 'won by resignation'),
+    ('checkmated', 'win', 'won by checkmate'),
+    ('agreed', 'agreed', 'drawn by agreement'),
+    ('repetition', 'repetition', 'drawn by repetition'),
+)
+
+OPPONENTS = 200
+
+ARCHIVE_PATH_RE = re.compile(r'^/pub/player/([^/]+)(/stats|/games/archives|/games/(\d{4})/(\d{2}))?/?$')
+
+
+def random_movetext(rng, prefix, max_plies=80):
+    # chess.com style movetext with clock comments, for a random legal game
+    board = chess.Board()
+    clocks = [180.0, 180.0]
+    parts = []
+    for ply in range(rng.randint(16, max_plies)):
+        if ply < len(prefix):
+            move = board.parse_san(prefix[ply])
+        else:
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            move = rng.choice(moves)
+        clocks[ply % 2] = max(0.1, clocks[ply % 2] - rng.uniform(0.1, 4))
+        clock = clocks[ply % 2]
+        number = f'{ply // 2 + 1}.' if ply % 2 == 0 else f'{ply // 2 + 1}...'
+        parts.append(f'{number} {board.san(move)} {{[%clk 0:{int(clock) // 60:02d}:{clock % 60:04.1f}]}}')
+        board.push(move)
+    return ' '.join(parts)
+
+
+class ChesscomStub:
+
+    def __init__(self, seed=1, games_per_month=500, movetext_pool=200):
+        self.seed = seed
+        self.games_per_month = games_per_month
+        self.players = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+        rng = random.Random(seed)
+        self._movetexts = []
+        for _ in range(movetext_pool):
+            eco, name, prefix = rng.choice(OPENINGS)
+            self._movetexts.append((eco, name, random_movetext(rng, prefix)))
+
+    @property
+    def api_base(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/pub'
+
+    def add_player(self, username, games):
+        self.players[username.lower()] = games
+
+    def months(self, username):
+        # Newest archive is last month, so every month is closed (cached for good)
+        count = -(-self.players[username] // self.games_per_month)
+        first_of_month = datetime.date.today().replace(day=1)
+        months = []
+        for _ in range(count):
+            first_of_month = (first_of_month - datetime.timedelta(days=1)).replace(day=1)
+            months.append((first_of_month.year, first_of_month.month))
+        return list(reversed(months))
+
+    def archive_games(self, username, year, month):
+        months = self.months(username)
+        if (year, month) not in months:
+            return None
+        index = months.index((year, month))
+        # Newer months are full, the oldest one holds the remainder
+        skipped = len(months) - 1 - index
+        count = min(self.games_per_month, self.players[username] - skipped * self.games_per_month)
+
+        rng = random.Random(f'{self.seed}:{username}:{year}:{month}')
+        start = datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc)
+        seconds = 27 * 24 * 3600
+        games = []
+        for number in range(count):
+            end_time = start + datetime.timedelta(seconds=seconds * (number + 1) // (count + 1))
+            games.append(self.make_game(rng, username, end_time, f'{year}{month:02d}{number:05d}'))
+        return games
+
+    def make_game(self, rng, username, end_time, game_id):
+        opponent = f'opponent{rng.randrange(OPPONENTS):03d}'
+        user_is_white = rng.random() < 0.5
+        user_code, opponent_code, termination = rng.choice(RESULT_CODES)
+        time_class, time_control = rng.choice(TIME_CLASSES)
+        user_rating, opponent_rating = rng.randint(1200, 1600), rng.randint(900, 2000)
+
+        white, black = (username, opponent) if user_is_white else (opponent, username)
+        white_code, black_code = (user_code, opponent_code) if user_is_white else (opponent_code, user_code)
+        white_rating, black_rating = (user_rating, opponent_rating) if user_is_white else (opponent_rating, user_rating)
+
+        if white_code == 'win':
+            result, termination = '1-0', f'{white} {termination}'
+        elif black_code == 'win':
+            result, termination = '0-1', f'{black} {termination}'
+        else:
+            result, termination = '1/2-1/2', f'Game {termination}'
+
+        eco, opening, movetext = rng.choice(self._movetexts)
+        url = f'https://www.chess.com/game/live/{game_id}'
+        headers = {
+            'Event': 'Live Chess', 'Site': 'Chess.com',
+            'Date': end_time.strftime('%Y.%m.%d'), 'Round': '-',
+            'White': white, 'Black': black, 'Result': result,
+            'ECO': eco, 'ECOUrl': f'https://www.chess.com/openings/{opening}',
+            'WhiteElo': str(white_rating), 'BlackElo': str(black_rating),
+            'TimeControl': time_control, 'Termination': termination,
+            'EndDate': end_time.strftime('%Y.%m.%d'), 'EndTime': end_time.strftime('%H:%M:%S'),
+            'Link': url,
+        }
+        pgn = ''.join(f'[{name} "{value}"]\n' for name, value in headers.items())
+        pgn += f'\n{movetext} {result}\n'
+
+        return {
+            'url': url, 'pgn': pgn, 'time_control': time_control,
+            'end_time': int(end_time.timestamp()), 'rated': True,
+            'time_class': time_class, 'rules': 'chess',
+            'white': {'username': white, 'rating': white_rating, 'result': white_code},
+            'black': {'username': black, 'rating': black_rating, 'result': black_code},
+        }
+
+    def player(self, username):
+        return {
+            'username': username, 'player_id': 1000 + sorted(self.players).index(username),
+            'country': f'{self.api_base}/country/TR', 'status': 'basic',
+            'joined': 1500000000, 'last_online': 1700000000, 'followers': 0,
+        }
+
+    def stats(self, username):
+        rng = random.Random(f'{self.seed}:{username}:stats')
+        date = int(datetime.datetime.now(datetime.timezone.utc).timestamp()) - 3600
+        return {
+            f'chess_{time_class}': {
+                'last': {'rating': rng.randint(1200, 1600), 'date': date, 'rd': 50},
+                'best': {'rating': 1700, 'date': date},
+                'record': {'win': 10, 'loss': 8, 'draw': 2},
+            }
+            for time_class, _ in TIME_CLASSES
+        }
+
+    def respond(self, path):
+        # (status, payload) for a request path
+        match = ARCHIVE_PATH_RE.match(path)
+        if not match or match.group(1).lower() not in self.players:
+            return 404, {'code': 0, 'message': 'User not found.'}
+        username, suffix = match.group(1).lower(), match.group(2) or ''
+
+        if not suffix:
+            return 200, self.player(username)
+        if suffix == '/stats':
+            return 200, self.stats(username)
+        if suffix == '/games/archives':
+            return 200, {'archives': [
+                f'{self.api_base}/player/{username}/games/{year}/{month:02d}'
+                for year, month in self.months(username)
+            ]}
+        games = self.archive_games(username, int(match.group(3)), int(match.group(4)))
+        if games is None:
+            return 404, {'code': 0, 'message': 'Archive not found.'}
+        return 200, {'games': games}
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                status, payload = stub.respond(self.path.split('?')[0])
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from chess_coach import monitoring
+
+
+# Cached game-list pages (the dashboard fragment, load_more_games JSON).
+# Every key embeds the user's game-list version, which ingest bumps whenever
+# it stores new games: invalidation is one cache write, and stale entries
+# are simply never read again and age out.
+# Versions live in their own cache alias ('game_versions', files by default)
+# because the sync worker that bumps them is another process than the web
+# workers, whose per-process page caches only need to agree on the version.
+# A version is a clock reading, so two concurrent bumps never write the same
+# value and a lost version can't collide with older entries.
+
+VERSION_KEY = 'games:version:{user_id}'
+PAGE_KEY = 'games:{user_id}:{version}:{name}'
+
+
+def games_version(user_id):
+    versions = caches['game_versions']
+    key = VERSION_KEY.format(user_id=user_id)
+    version = versions.get(key)
+    if version is None:
+        versions.add(key, time.time_ns(), timeout=None)
+        version = versions.get(key)
+    return version
+
+
+def bump_games_version(user_id):
+    caches['game_versions'].set(VERSION_KEY.format(user_id=user_id), time.time_ns(), timeout=None)
+
+
+def page_key(user_id, name):
+    return PAGE_KEY.format(user_id=user_id, version=games_version(user_id), name=name)
+
+
+def get_or_build(user_id, name, build):
+    # build() returns the value to cache, or None for something not worth keeping
+    key = page_key(user_id, name)
+    value = cache.get(key)
+    monitoring.record_cache(name.split(':')[0], value is not None)
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=settings.GAME_CACHE_TIMEOUT)
+    return value
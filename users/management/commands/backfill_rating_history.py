@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analysis.ingest import chunked
+from analysis.models import ChessGame
+from users.models import CustomUser
+from users.ratings import record_game_ratings
+
+
+class Command(BaseCommand):
+    help = 'Adds rating history points (and rollups) for games cached before the history existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Games processed per transaction.')
+
+    def handle(self, *args, **options):
+        recorded = 0
+        for user in CustomUser.objects.filter(cached_games__isnull=False).distinct().order_by('pk'):
+            # Needs pgn_headers, see backfill_game_data
+            games = ChessGame.objects.filter(user=user, rating_points__isnull=True).only(
+                'pk', 'game_date', 'time_control', 'pgn_headers', 'player_name'
+            ).order_by('pk')
+            for batch in chunked(list(games), options['chunk_size']):
+                with transaction.atomic():
+                    recorded += record_game_ratings(user, batch)
+            self.stdout.write(f'{user.username}: {recorded} rating points so far')
+
+        self.stdout.write(self.style.SUCCESS(f'Recorded {recorded} rating points.'))
@@ -0,0 +1,240 @@
+import contextlib
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from analysis.models import ChessGame
+from chess_coach.test_runner import local_caches
+from users.chesscom_stub import ChesscomStub
+from users.models import CustomUser
+from users.sync import sync_user_archives
+from users.views import GAME_LIST_ORDER, encode_cursor
+
+
+# Latency and query-count benchmark of the game views against synthetic users
+# of several sizes. The games come from a local chess.com stand-in
+# (users/chesscom_stub.py) through the real archive sync, into a throwaway
+# test database with in-memory caches, so the dev database, the shared caches
+# and chess.com are never touched.
+# The JSON report can be compared with the one of another commit (--baseline).
+
+PERCENTILES = (50, 90, 95, 99)
+
+# A regression is reported when p95 grows past this factor of the baseline
+REGRESSION_FACTOR = 1.2
+
+
+def percentile(sorted_values, percent):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, query_counts):
+    latencies = sorted(latencies)
+    query_counts = sorted(query_counts)
+    summary = {f'p{percent}': round(percentile(latencies, percent), 2) for percent in PERCENTILES}
+    summary['mean'] = round(sum(latencies) / len(latencies), 2)
+    summary['max'] = round(latencies[-1], 2)
+    return {
+        'latency_ms': summary,
+        'queries': {
+            'min': query_counts[0],
+            'median': percentile(query_counts, 50),
+            'max': query_counts[-1],
+        },
+    }
+
+
+def seed_user(stub, username, games):
+    # Creates the user and syncs its games from the stub, unless a kept
+    # database already holds them
+    user = CustomUser.objects.filter(username=username).first()
+    if user is None:
+        user = CustomUser.objects.create_user(username, f'{username}@example.com', 'bench-password')
+    stub.add_player(username, games)
+
+    if ChessGame.objects.filter(user=user).count() < games:
+        sync_user_archives(user)
+    return user
+
+
+def view_cases(user):
+    # (name, url) of every measured request; the deep page starts halfway
+    # through the game list
+    games = ChessGame.objects.filter(user=user).defer(*ChessGame.HEAVY_FIELDS).order_by(*GAME_LIST_ORDER)
+    total = games.count()
+    deep_game = games[total // 2] if total else None
+
+    cases = [
+        ('dashboard', reverse('users:dashboard')),
+        ('load_more_games', reverse('users:load_more_games')),
+        ('search_games', reverse('users:search_games') + '?query=opponent01'),
+        ('search_games_date', reverse('users:search_games') + '?query=' + datetime.date.today().strftime('%b')),
+        ('profile', reverse('users:profile')),
+    ]
+    if deep_game is not None:
+        cases.insert(2, ('load_more_games_deep', reverse('users:load_more_games') + '?cursor=' + encode_cursor(deep_game)))
+    return cases
+
+
+def measure_view(client, url, requests, warmup):
+    for _ in range(warmup):
+        client.get(url)
+
+    latencies = []
+    query_counts = []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise CommandError(f'{url} answered {response.status_code}.')
+        query_counts.append(len(queries))
+    return summarize(latencies, query_counts)
+
+
+def bench_user(user, requests, warmup):
+    client = Client()
+    client.force_login(user)
+    return {
+        name: measure_view(client, url, requests, warmup)
+        for name, url in view_cases(user)
+    }
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def compare_reports(report, baseline):
+    # Lines describing the change of every view measured in both reports
+    previous = {(row['games'], row['view']): row for row in baseline.get('results', [])}
+    lines = []
+    for row in report['results']:
+        old = previous.get((row['games'], row['view']))
+        if old is None:
+            continue
+        p50, p95 = row['latency_ms']['p50'], row['latency_ms']['p95']
+        old_p50, old_p95 = old['latency_ms']['p50'], old['latency_ms']['p95']
+        queries, old_queries = row['queries']['max'], old['queries']['max']
+        regression = p95 > old_p95 * REGRESSION_FACTOR or queries > old_queries
+        lines.append((
+            regression,
+            f"{row['view']:<22} {row['games']:>7} games  "
+            f"p50 {old_p50:>8.2f} -> {p50:>8.2f} ms  p95 {old_p95:>8.2f} -> {p95:>8.2f} ms  "
+            f"queries {old_queries} -> {queries}" + ('  REGRESSION' if regression else ''),
+        ))
+    return lines
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the game views against synthetic users served by a local chess.com stand-in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated game counts, one user each.')
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per view.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per view first.')
+        parser.add_argument('--games-per-month', type=int, default=500, help='Size of the stub monthly archives.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--baseline', help='JSON report of an earlier run to compare with.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database (and its users) for the next run.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes takes comma separated integers.')
+        if not sizes or min(sizes) < 1 or options['requests'] < 1:
+            raise CommandError('Nothing to benchmark.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # SQLite test databases live in memory; a kept one needs a file
+        if options['keepdb'] and connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'bench_views.sqlite3')
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            # Progress prints of the views and the sync stay out of a report on stdout
+            with contextlib.redirect_stdout(sys.stderr):
+                report = self.run_benchmark(sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            lines = compare_reports(report, baseline)
+            for regression, line in lines:
+                self.stdout.write(self.style.ERROR(line) if regression else line)
+            if not lines:
+                self.stdout.write('Nothing in common with the baseline.')
+
+    def run_benchmark(self, sizes, options):
+        results = []
+        seed_seconds = {}
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                ChesscomStub(seed=options['seed'], games_per_month=options['games_per_month']) as stub, \
+                override_settings(
+                    CHESSCOM_API_BASE=stub.api_base, CHESSCOM_CACHE_DIR=cache_dir, CHESSCOM_RATELIMIT_DIR='',
+                    CHESSCOM_RATE_LIMIT=1000, CHESSCOM_RATE_BURST=1000, CACHES=local_caches(),
+                ):
+            for size in sizes:
+                self.stderr.write(f'Seeding a user with {size} games...')
+                started = time.perf_counter()
+                user = seed_user(stub, f'bench{size}', size)
+                seed_seconds[size] = round(time.perf_counter() - started, 2)
+
+                self.stderr.write(f'Measuring {size} games...')
+                for view, summary in bench_user(user, options['requests'], options['warmup']).items():
+                    results.append({'games': size, 'view': view, **summary})
+
+            stub_requests = stub.requests
+
+        return {
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests_per_view': options['requests'],
+            'stub_requests': stub_requests,
+            'seed_seconds': seed_seconds,
+            'results': results,
+        }
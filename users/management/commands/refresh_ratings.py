@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from analysis.ingest import chunked
+from users import chesscom
+from users.models import CustomUser
+from users.sync import PLAYER_BATCH_SIZE, save_players_data
+
+
+def fetch_player(user):
+    username = user.username.lower()
+    try:
+        return user, chesscom.get_player(username), chesscom.get_stats(username)
+    except requests.exceptions.RequestException as e:
+        print(f"API Connection Error for {username}: {e}")
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the chess.com profile and ratings of every active user (e.g. nightly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PLAYER_BATCH_SIZE, help='Players written per upsert.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Players fetched from chess.com at once.')
+
+    def handle(self, *args, **options):
+        users = list(CustomUser.objects.filter(is_active=True).order_by('pk'))
+        refreshed = 0
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for batch in chunked(users, options['batch_size']):
+                entries = [entry for entry in executor.map(fetch_player, batch) if entry is not None]
+                refreshed += save_players_data(entries, batch_size=options['batch_size'])
+                self.stdout.write(f'Refreshed {refreshed}/{len(users)} players')
+
+        self.stdout.write(self.style.SUCCESS(f'Ratings refreshed for {refreshed} players.'))
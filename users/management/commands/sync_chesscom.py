@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analysis.pgn_import import claim_next_import_job, run_pending_imports, step_import_job
+from users.models import CustomUser
+from users.sync import enqueue_sync, fail_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Background worker that syncs chess.com game archives for queued users and imports uploaded PGN files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs and exit.')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--enqueue-all', action='store_true', help='Queue a sync for every active user first.')
+
+    def handle(self, *args, **options):
+        # Jobs left running by a worker that was killed
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(f'Marked {stale} stale running job(s) as failed.')
+
+        if options['enqueue_all']:
+            for user in CustomUser.objects.filter(is_active=True):
+                enqueue_sync(user, force=True)
+
+        self.stdout.write('Waiting for sync jobs...')
+
+        import_job = None
+        while True:
+            close_old_connections()
+            processed = run_pending_jobs()
+
+            if processed:
+                self.stdout.write(f'Processed {processed} sync job(s).')
+
+            if options['once']:
+                imported = run_pending_imports()
+                if imported:
+                    self.stdout.write(f'Processed {imported} import job(s).')
+                break
+
+            # One chunk of an import per round, so that a large file does not
+            # hold up the sync jobs queued behind it
+            if import_job is None:
+                import_job = claim_next_import_job()
+            if import_job is not None:
+                processed += 1
+                if not step_import_job(import_job):
+                    self.stdout.write(f'Processed import job #{import_job.pk}.')
+                    import_job = None
+
+            if not processed:
+                time.sleep(options['sleep'])
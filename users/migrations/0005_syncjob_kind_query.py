@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('archives', 'Archive Sync'), ('search', 'Archive Search')], default='archives', max_length=10, verbose_name='Kind'),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='query',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Query'),
+        ),
+    ]
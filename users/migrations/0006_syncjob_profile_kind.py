@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_syncjob_kind_query'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('archives', 'Archive Sync'), ('search', 'Archive Search'), ('profile', 'Profile Refresh')], default='archives', max_length=10, verbose_name='Kind'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('user', 'kind', 'query'), name='unique_active_sync_job'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0007_chessgame_packed_moves'),
+        ('users', '0006_syncjob_profile_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_class', models.CharField(max_length=10, verbose_name='Time Class')),
+                ('rating', models.IntegerField(verbose_name='Rating')),
+                ('recorded_at', models.DateTimeField(verbose_name='Recorded At')),
+                ('source', models.CharField(choices=[('game', 'Game'), ('stats', 'Stats Refresh')], max_length=10, verbose_name='Source')),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rating_points', to='analysis.chessgame', verbose_name='Game')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_history', to=settings.AUTH_USER_MODEL, verbose_name='App User')),
+            ],
+            options={
+                'verbose_name': 'Rating History',
+                'verbose_name_plural': 'Rating History',
+                'constraints': [models.UniqueConstraint(fields=('user', 'time_class', 'recorded_at'), name='unique_rating_point')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RatingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_class', models.CharField(max_length=10, verbose_name='Time Class')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4, verbose_name='Period')),
+                ('period_start', models.DateField(verbose_name='Period Start')),
+                ('open_rating', models.IntegerField(verbose_name='Open')),
+                ('close_rating', models.IntegerField(verbose_name='Close')),
+                ('min_rating', models.IntegerField(verbose_name='Low')),
+                ('max_rating', models.IntegerField(verbose_name='High')),
+                ('samples', models.IntegerField(default=0, verbose_name='Samples')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_rollups', to=settings.AUTH_USER_MODEL, verbose_name='App User')),
+            ],
+            options={
+                'verbose_name': 'Rating Rollup',
+                'verbose_name_plural': 'Rating Rollups',
+                'constraints': [models.UniqueConstraint(fields=('user', 'time_class', 'period', 'period_start'), name='unique_rating_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_ratinghistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='archives_synced_through',
+            field=models.DateField(blank=True, null=True, verbose_name='Archives Synced Through'),
+        ),
+    ]
@@ -33,6 +33,13 @@ class CustomUser(AbstractUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # First day of the newest archive month of the last complete archive
+    # sync; older months hold nothing new (see users/sync.py)
+    archives_synced_through = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Archives Synced Through'
+    )
 
     objects = CustomUserManager()
 
@@ -115,3 +122,192 @@ class PlayerRating(models.Model):
         unique_together = ('player', 'time_class')
         verbose_name = 'Player Rating'
         verbose_name_plural = 'Player Ratings'
+
+
+class RatingHistory(models.Model):
+    # Append-only rating time series, one point per ingested game (the user's
+    # rating in that game) or per rating change reported by the stats endpoint.
+    # See users/ratings.py.
+    SOURCE_GAME = 'game'
+    SOURCE_STATS = 'stats'
+
+    SOURCE_CHOICES = (
+        (SOURCE_GAME, 'Game'),
+        (SOURCE_STATS, 'Stats Refresh'),
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='rating_history',
+        verbose_name='App User'
+    )
+    time_class = models.CharField(
+        max_length=10,
+        verbose_name='Time Class'
+    )
+    rating = models.IntegerField(
+        verbose_name='Rating'
+    )
+    recorded_at = models.DateTimeField(
+        verbose_name='Recorded At'
+    )
+    source = models.CharField(
+        max_length=10,
+        choices=SOURCE_CHOICES,
+        verbose_name='Source'
+    )
+    # Set for SOURCE_GAME points, so they go away with the game
+    game = models.ForeignKey(
+        'analysis.ChessGame',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='rating_points',
+        verbose_name='Game'
+    )
+
+    def __str__(self):
+        return f"{self.user.username} {self.time_class} {self.rating} @ {self.recorded_at}"
+
+    class Meta:
+        verbose_name = 'Rating History'
+        verbose_name_plural = 'Rating History'
+        # Doubles as the (user, time_class, recorded_at) range index; a stats
+        # point for the moment of the last game is the same point as the game's
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'time_class', 'recorded_at'], name='unique_rating_point'),
+        ]
+
+
+class RatingRollup(models.Model):
+    # Daily and weekly downsampling of RatingHistory, kept up to date on every append
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+
+    PERIOD_CHOICES = (
+        (PERIOD_DAY, 'Day'),
+        (PERIOD_WEEK, 'Week'),
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='rating_rollups',
+        verbose_name='App User'
+    )
+    time_class = models.CharField(
+        max_length=10,
+        verbose_name='Time Class'
+    )
+    period = models.CharField(
+        max_length=4,
+        choices=PERIOD_CHOICES,
+        verbose_name='Period'
+    )
+    # UTC day, or the Monday of the week
+    period_start = models.DateField(
+        verbose_name='Period Start'
+    )
+    open_rating = models.IntegerField(verbose_name='Open')
+    close_rating = models.IntegerField(verbose_name='Close')
+    min_rating = models.IntegerField(verbose_name='Low')
+    max_rating = models.IntegerField(verbose_name='High')
+    samples = models.IntegerField(default=0, verbose_name='Samples')
+
+    def __str__(self):
+        return f"{self.user.username} {self.time_class} {self.period} {self.period_start}: {self.close_rating}"
+
+    class Meta:
+        verbose_name = 'Rating Rollup'
+        verbose_name_plural = 'Rating Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'time_class', 'period', 'period_start'], name='unique_rating_rollup'),
+        ]
+
+
+class SyncJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    KIND_ARCHIVES = 'archives'
+    KIND_SEARCH = 'search'
+    KIND_PROFILE = 'profile'
+
+    KIND_CHOICES = (
+        (KIND_ARCHIVES, 'Archive Sync'),
+        (KIND_SEARCH, 'Archive Search'),
+        (KIND_PROFILE, 'Profile Refresh'),
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='sync_jobs',
+        verbose_name='App User'
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        default=KIND_ARCHIVES,
+        verbose_name='Kind'
+    )
+    # Search term for KIND_SEARCH jobs
+    query = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Query'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='Status'
+    )
+    games_added = models.IntegerField(
+        default=0,
+        verbose_name='Games Added'
+    )
+    error = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Error'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} sync #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    class Meta:
+        verbose_name = 'Sync Job'
+        verbose_name_plural = 'Sync Jobs'
+        ordering = ['-created_at']
+        # The worker polls for the oldest pending jobs
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        # At most one queued or running job per user and kind, even when
+        # several processes enqueue at the same moment
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'query'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_sync_job',
+            ),
+        ]
@@ -0,0 +1,282 @@
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+from chess_coach import monitoring
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Scheduler for upstream chess.com requests, shared by every thread and every
+# process (web workers, sync worker) on the host through lock files:
+#  - a token bucket (CHESSCOM_RATE_LIMIT requests/s, bursts of CHESSCOM_RATE_BURST)
+#    kept in <dir>/<host>/bucket.json under an exclusive file lock;
+#  - at most CHESSCOM_MAX_CONCURRENCY requests in flight per host, one lock
+#    file per slot. The OS drops the lock if a process dies mid-request.
+# A 429 or Retry-After pauses the host for everyone; failed attempts are
+# retried with exponential backoff and full jitter. Every attempt is recorded
+# in chess_coach/monitoring.py.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+SLOT_POLL_INTERVAL = 0.05
+
+
+class SchedulerTimeout(requests.exceptions.RequestException):
+    # Subclass of RequestException, so call sites fall back as for any upstream failure
+    pass
+
+
+def _lock(handle, blocking=True):
+    if fcntl:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(handle):
+    if fcntl:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def ratelimit_dir():
+    return settings.CHESSCOM_RATELIMIT_DIR or os.path.join(settings.CHESSCOM_CACHE_DIR, 'ratelimit')
+
+
+def host_dir(host):
+    directory = os.path.join(ratelimit_dir(), host.replace(':', '_'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def parse_retry_after(value):
+    # Seconds, or an HTTP date
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(settings.CHESSCOM_BACKOFF_MAX, settings.CHESSCOM_BACKOFF_BASE * 2 ** attempt))
+
+
+class SchedulerMetrics:
+    # Per-process counters; the shared bucket state is read by snapshot()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'waiting': self.waiting,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'timeouts': self.timeouts,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+metrics = SchedulerMetrics()
+
+
+@contextmanager
+def _bucket_state(host):
+    # Exclusive read-modify-write of the host's bucket file
+    path = os.path.join(host_dir(host), 'bucket.json')
+    with open(path, 'a+', encoding='utf-8') as handle:
+        _lock(handle)
+        try:
+            handle.seek(0)
+            try:
+                state = json.loads(handle.read() or '{}')
+            except ValueError:
+                state = {}
+            yield state
+            handle.seek(0)
+            handle.truncate()
+            handle.write(json.dumps(state))
+            handle.flush()
+        finally:
+            _unlock(handle)
+
+
+def _take_token(host):
+    # Returns 0 when a token was taken, otherwise the seconds to wait
+    rate = settings.CHESSCOM_RATE_LIMIT
+    burst = settings.CHESSCOM_RATE_BURST
+    with _bucket_state(host) as state:
+        now = time.time()
+        tokens = min(burst, state.get('tokens', burst) + (now - state.get('updated', now)) * rate)
+        state['updated'] = now
+
+        blocked_until = state.get('blocked_until', 0)
+        if now < blocked_until:
+            state['tokens'] = tokens
+            return blocked_until - now
+        if tokens >= 1:
+            state['tokens'] = tokens - 1
+            return 0
+        state['tokens'] = tokens
+        return (1 - tokens) / rate
+
+
+def block_host(host, seconds):
+    # Pauses the host for every process, e.g. after a 429
+    with _bucket_state(host) as state:
+        state['blocked_until'] = max(state.get('blocked_until', 0), time.time() + seconds)
+
+
+def _try_slot(host):
+    directory = host_dir(host)
+    for index in range(settings.CHESSCOM_MAX_CONCURRENCY):
+        handle = open(os.path.join(directory, f'slot-{index}.lock'), 'a+')
+        try:
+            _lock(handle, blocking=False)
+        except OSError:
+            handle.close()
+            continue
+        return handle
+    return None
+
+
+@contextmanager
+def slot(host, timeout=None):
+    # Waits for a free concurrency slot and a token, up to CHESSCOM_SCHEDULER_TIMEOUT
+    timeout = settings.CHESSCOM_SCHEDULER_TIMEOUT if timeout is None else timeout
+    started = time.monotonic()
+    deadline = started + timeout
+    metrics.add(waiting=1)
+    handle = None
+    try:
+        while handle is None:
+            handle = _try_slot(host)
+            if handle is None:
+                if time.monotonic() >= deadline:
+                    raise SchedulerTimeout(f"No free request slot for {host} after {timeout}s.")
+                time.sleep(SLOT_POLL_INTERVAL * random.uniform(0.5, 1.5))
+
+        while True:
+            wait = _take_token(host)
+            if not wait:
+                break
+            if time.monotonic() + wait > deadline:
+                raise SchedulerTimeout(f"Rate limit for {host} would delay the request past {timeout}s.")
+            time.sleep(wait)
+    except SchedulerTimeout:
+        metrics.add(timeouts=1)
+        if handle is not None:
+            _unlock(handle)
+            handle.close()
+        raise
+    finally:
+        metrics.add(waiting=-1, wait_seconds=time.monotonic() - started)
+
+    metrics.add(in_flight=1)
+    try:
+        yield
+    finally:
+        metrics.add(in_flight=-1)
+        _unlock(handle)
+        handle.close()
+
+
+def send(session, url, headers=None, timeout=10):
+    # GET through the scheduler, retrying throttled and failed attempts
+    host = urlparse(url).netloc
+    max_retries = settings.CHESSCOM_MAX_RETRIES
+
+    for attempt in range(max_retries + 1):
+        with slot(host):
+            metrics.add(requests=1)
+            started = time.perf_counter()
+            try:
+                response = session.get(url, headers=headers, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                monitoring.record_upstream(host, type(e).__name__, time.perf_counter() - started)
+                if attempt == max_retries:
+                    raise
+                response = None
+            else:
+                monitoring.record_upstream(host, response.status_code, time.perf_counter() - started)
+
+        if response is not None:
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429 or retry_after:
+                metrics.add(throttled=1)
+                block_host(host, retry_after if retry_after is not None else backoff_delay(attempt + 1))
+
+        metrics.add(retries=1)
+        print(f"Retrying {url} (attempt {attempt + 2}/{max_retries + 1})")
+        time.sleep(backoff_delay(attempt))
+
+
+def snapshot():
+    # Per-process counters plus the shared state of every known host
+    hosts = {}
+    directory = ratelimit_dir()
+    if os.path.isdir(directory):
+        for host in sorted(os.listdir(directory)):
+            path = os.path.join(directory, host, 'bucket.json')
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    state = json.loads(handle.read() or '{}')
+            except (OSError, ValueError):
+                continue
+            busy = 0
+            for index in range(settings.CHESSCOM_MAX_CONCURRENCY):
+                slot_path = os.path.join(directory, host, f'slot-{index}.lock')
+                if not os.path.exists(slot_path):
+                    continue
+                with open(slot_path, 'a+') as handle:
+                    try:
+                        _lock(handle, blocking=False)
+                    except OSError:
+                        busy += 1
+                    else:
+                        _unlock(handle)
+            hosts[host] = {
+                'tokens': round(state.get('tokens', settings.CHESSCOM_RATE_BURST), 2),
+                'blocked_for': round(max(0.0, state.get('blocked_until', 0) - time.time()), 2),
+                'slots_busy': busy,
+            }
+    return {'process': metrics.as_dict(), 'hosts': hosts}
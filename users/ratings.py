@@ -0,0 +1,130 @@
+import datetime
+from collections import defaultdict
+
+from .models import RatingHistory, RatingRollup
+
+
+# Rating history: points are appended from ingested games (every chess.com
+# PGN carries both players' ratings) and from stats refreshes, and the daily
+# and weekly RatingRollup rows of the touched periods are recomputed in the
+# same transaction. Charts read the rollups with one indexed range query.
+
+PERIODS = (RatingRollup.PERIOD_DAY, RatingRollup.PERIOD_WEEK)
+
+
+def period_start(moment, period):
+    day = moment.astimezone(datetime.timezone.utc).date()
+    if period == RatingRollup.PERIOD_WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def parse_pgn_datetime(date_text, time_text):
+    try:
+        moment = datetime.datetime.strptime(f'{date_text} {time_text}', '%Y.%m.%d %H:%M:%S')
+    except ValueError:
+        return None
+    return moment.replace(tzinfo=datetime.timezone.utc)
+
+
+def game_rating_point(user, game):
+    # The user's own rating in the game, at the moment the game ended
+    headers = game.pgn_headers
+    username = game.player_name_of(user)
+    if headers.get('White', '').lower() == username:
+        elo = headers.get('WhiteElo')
+    elif headers.get('Black', '').lower() == username:
+        elo = headers.get('BlackElo')
+    else:
+        return None
+    if not elo or not elo.isdigit():
+        return None
+
+    recorded_at = (
+        parse_pgn_datetime(headers.get('EndDate'), headers.get('EndTime'))
+        or parse_pgn_datetime(headers.get('UTCDate'), headers.get('UTCTime'))
+        or datetime.datetime.combine(game.game_date, datetime.time(), tzinfo=datetime.timezone.utc)
+    )
+    return RatingHistory(
+        user_id=user.pk, time_class=game.time_control.lower(), rating=int(elo),
+        recorded_at=recorded_at, source=RatingHistory.SOURCE_GAME, game_id=game.pk,
+    )
+
+
+def record_game_ratings(user, games):
+    # games must be saved (have a pk) and carry pgn_headers
+    points = [game_rating_point(user, game) for game in games if game.pk]
+    points = [point for point in points if point is not None]
+    return append_points(points)
+
+
+def record_stats_ratings(entries, rating_classes):
+    # entries: (user, stats_data). chess.com reports when the current rating
+    # was reached, so repeated refreshes land on the same point.
+    points = []
+    for user, stats_data in entries:
+        for time_class, api_key in rating_classes.items():
+            last = stats_data.get(api_key, {}).get('last', {})
+            if not last.get('rating') or not last.get('date'):
+                continue
+            points.append(RatingHistory(
+                user_id=user.pk, time_class=time_class, rating=int(last['rating']),
+                recorded_at=datetime.datetime.fromtimestamp(last['date'], tz=datetime.timezone.utc),
+                source=RatingHistory.SOURCE_STATS,
+            ))
+    return append_points(points)
+
+
+def append_points(points):
+    if not points:
+        return 0
+    RatingHistory.objects.bulk_create(points, ignore_conflicts=True)
+    update_rollups(points)
+    return len(points)
+
+
+def update_rollups(points):
+    # Recomputes the day and week rollups touched by points from the stored
+    # history, so ignored duplicates and out-of-order appends stay correct
+    touched = {
+        (point.user_id, point.time_class, period, period_start(point.recorded_at, period))
+        for point in points for period in PERIODS
+    }
+    week_starts = [key[3] for key in touched if key[2] == RatingRollup.PERIOD_WEEK]
+    since = datetime.datetime.combine(min(week_starts), datetime.time(), tzinfo=datetime.timezone.utc)
+    until = datetime.datetime.combine(max(week_starts), datetime.time(), tzinfo=datetime.timezone.utc) + datetime.timedelta(days=7)
+
+    history = RatingHistory.objects.filter(
+        user_id__in={key[0] for key in touched}, time_class__in={key[1] for key in touched},
+        recorded_at__gte=since, recorded_at__lt=until,
+    ).order_by('recorded_at').values_list('user_id', 'time_class', 'recorded_at', 'rating')
+
+    buckets = defaultdict(list)
+    for user_id, time_class, recorded_at, rating in history:
+        for period in PERIODS:
+            key = (user_id, time_class, period, period_start(recorded_at, period))
+            if key in touched:
+                buckets[key].append(rating)
+
+    rollups = [
+        RatingRollup(
+            user_id=user_id, time_class=time_class, period=period, period_start=start,
+            open_rating=ratings[0], close_rating=ratings[-1],
+            min_rating=min(ratings), max_rating=max(ratings), samples=len(ratings),
+        )
+        for (user_id, time_class, period, start), ratings in buckets.items()
+    ]
+    RatingRollup.objects.bulk_create(
+        rollups, update_conflicts=True, unique_fields=['user', 'time_class', 'period', 'period_start'],
+        update_fields=['open_rating', 'close_rating', 'min_rating', 'max_rating', 'samples'],
+    )
+
+
+def rating_series(user, time_class, period=RatingRollup.PERIOD_WEEK, since=None):
+    rollups = RatingRollup.objects.filter(user=user, time_class=time_class, period=period)
+    if since:
+        rollups = rollups.filter(period_start__gte=since)
+    return list(
+        rollups.order_by('period_start')
+        .values('period_start', 'open_rating', 'close_rating', 'min_rating', 'max_rating', 'samples')
+    )
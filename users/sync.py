@@ -0,0 +1,366 @@
+import datetime
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from analysis.ingest import chunked, ingest_games, make_game_key
+from analysis.models import ChessGame
+from . import chesscom
+from .models import ChesscomPlayer, CustomUser, PlayerRating, SyncJob
+from .ratings import record_stats_ratings
+
+
+SEARCH_RESULT_LIMIT = 10
+
+PLAYER_BATCH_SIZE = 500
+
+# PlayerRating.time_class -> key of the chess.com stats payload
+RATING_CLASSES = {
+    'bullet': 'chess_bullet',
+    'blitz': 'chess_blitz',
+    'rapid': 'chess_rapid',
+}
+
+RATING_UPDATE_FIELDS = (
+    'rating', 'rating_change', 'total_games', 'win_count', 'loss_count', 'draw_count', 'last_updated',
+)
+
+DRAW_RESULTS = ['agreed', 'repetition', 'stalemate', 'insufficient', '50move', 'timevsinsufficient', 'draw']
+
+
+def get_display_result(g, username):
+    is_user_white = g['white']['username'].lower() == username
+    user_result = g['white']['result'] if is_user_white else g['black']['result']
+
+    if user_result == 'win':
+        return 'Win'
+    elif user_result in DRAW_RESULTS:
+        return 'Draw'
+    return 'Loss'
+
+
+def game_from_api(user, g):
+    # Builds an unsaved ChessGame from one entry of a chess.com monthly archive.
+    # moves_count is filled in by ingest_games, only for games that are new.
+    username = user.username.lower()
+    pgn_text = g.get('pgn', '')
+    game_datetime = datetime.datetime.fromtimestamp(g['end_time'], tz=datetime.timezone.utc)
+
+    return ChessGame(
+        user=user, pgn=pgn_text, game_key=make_game_key(g.get('url'), pgn_text),
+        game_date=game_datetime.date(),
+        white_player=f"{g['white']['username']} ({g['white']['rating']})",
+        black_player=f"{g['black']['username']} ({g['black']['rating']})",
+        time_control=g.get('time_class', 'Unknown').capitalize(),
+        result_description=get_display_result(g, username),
+    )
+
+
+def save_new_games(user, api_games):
+    games = [game_from_api(user, g) for g in api_games if g.get('pgn')]
+    return len(ingest_games(user, games))
+
+
+def archive_month(archive_url):
+    # .../games/2024/09 -> date(2024, 9, 1), None for an unexpected URL
+    try:
+        year, month = archive_url.rstrip('/').split('/')[-2:]
+        return datetime.date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def sync_user_archives(user, job=None):
+    username = user.username.lower()
+    archives = chesscom.get_archives(username)
+    synced_through = user.archives_synced_through
+
+    games_added = 0
+
+    # Newest month first, down to the newest month of the last sync that got
+    # through every month: it may have gained games since, anything older
+    # has not. A failed sync leaves the mark alone, so its retry walks on past
+    # the months it did store (and so does a sync after a search job).
+    for archive_url in reversed(archives):
+        month = archive_month(archive_url)
+        if synced_through and month and month < synced_through:
+            break
+
+        api_games = chesscom.get_archive_games(archive_url)
+        added = save_new_games(user, api_games)
+        games_added += added
+
+        if job is not None and added:
+            SyncJob.objects.filter(pk=job.pk).update(games_added=games_added)
+
+    newest_month = archive_month(archives[-1]) if archives else None
+    if newest_month:
+        CustomUser.objects.filter(pk=user.pk).update(archives_synced_through=newest_month)
+        user.archives_synced_through = newest_month
+
+    return games_added
+
+
+def get_rating_data(stats_data, time_class_key):
+    data = stats_data.get(time_class_key, {})
+
+    current_rating = 0
+    score_change = 0
+
+    last_data = data.get('last', {})
+    current_rating_value = last_data.get('rating')
+
+    if isinstance(current_rating_value, (int, float)):
+        current_rating = int(current_rating_value)
+
+    prev_rating = last_data.get('prev', 0)
+    if current_rating != 0 and prev_rating != 0:
+        score_change = current_rating - prev_rating
+
+    record = data.get('record', {})
+    win, loss, draw = record.get('win', 0), record.get('loss', 0), record.get('draw', 0)
+    total = win + loss + draw
+
+    return {
+        'rating': current_rating,
+        'change': score_change,
+        'total_games': total,
+        'win_count': win,
+        'loss_count': loss,
+        'draw_count': draw,
+    }
+
+
+def extract_country_code(country_url):
+    if country_url:
+        return country_url.split('/')[-1].upper()
+    return None
+
+
+def save_player_data(user, player_info, stats_data):
+    return save_players_data([(user, player_info, stats_data)]) == 1
+
+
+def drop_username_clashes(batch):
+    # ChesscomPlayer.username is unique: a chess.com account another app user
+    # already holds (or that comes twice in the batch) would fail the whole
+    # upsert, so only that user's entry is skipped
+    usernames = [user.username.lower() for user, _, _ in batch]
+    taken = set(
+        ChesscomPlayer.objects.filter(username__in=usernames)
+        .exclude(user__in=[user.pk for user, _, _ in batch]).values_list('username', flat=True)
+    )
+    kept = []
+    for entry, username in zip(batch, usernames):
+        if username in taken:
+            print(f"Skipped the chess.com profile of {entry[0].username}: {username} is linked to another user.")
+            continue
+        taken.add(username)
+        kept.append(entry)
+    return kept
+
+
+def save_players_data(entries, batch_size=PLAYER_BATCH_SIZE):
+    # entries: (user, player_info, stats_data) tuples. Every batch costs four
+    # statements (username check, player upsert, id lookup, rating upsert),
+    # however many players and time classes it holds, plus the rating
+    # history append. Returns the number of players saved.
+    latest = {user.pk: (user, player_info, stats_data) for user, player_info, stats_data in entries}
+    entries = list(latest.values())
+    now = timezone.now()
+    saved = 0
+
+    for batch in chunked(entries, batch_size):
+        with transaction.atomic():
+            batch = drop_username_clashes(batch)
+            if batch:
+                save_players_batch(batch, now)
+        saved += len(batch)
+
+    return saved
+
+
+def save_players_batch(batch, now):
+    # Call inside a transaction
+    players = [
+        ChesscomPlayer(
+            user=user, username=user.username.lower(),
+            country_code=extract_country_code(player_info.get('country')), last_updated=now,
+        )
+        for user, player_info, stats_data in batch
+    ]
+
+    ChesscomPlayer.objects.bulk_create(
+        players, update_conflicts=True, unique_fields=['user'],
+        update_fields=['username', 'country_code', 'last_updated'],
+    )
+    # Upserted rows do not get their ids back on every backend
+    player_ids = dict(
+        ChesscomPlayer.objects.filter(user__in=[user.pk for user, _, _ in batch]).values_list('user_id', 'pk')
+    )
+
+    ratings = []
+    for user, player_info, stats_data in batch:
+        for time_class, api_key in RATING_CLASSES.items():
+            api_data = get_rating_data(stats_data, api_key)
+            ratings.append(PlayerRating(
+                player_id=player_ids[user.pk], time_class=time_class,
+                rating=api_data['rating'], rating_change=api_data['change'],
+                total_games=api_data['total_games'], win_count=api_data['win_count'],
+                loss_count=api_data['loss_count'], draw_count=api_data['draw_count'],
+                last_updated=now,
+            ))
+
+    PlayerRating.objects.bulk_create(
+        ratings, update_conflicts=True, unique_fields=('player', 'time_class'),
+        update_fields=RATING_UPDATE_FIELDS,
+    )
+    record_stats_ratings([(user, stats_data) for user, _, stats_data in batch], RATING_CLASSES)
+
+
+def refresh_player_data(user):
+    # Worker side of the profile's stale-while-revalidate refresh
+    username = user.username.lower()
+    save_player_data(user, chesscom.get_player(username), chesscom.get_stats(username))
+
+
+def game_matches_query(g, username, query):
+    opponent = g['black']['username'] if g['white']['username'].lower() == username else g['white']['username']
+    game_date = datetime.datetime.fromtimestamp(g['end_time'], tz=datetime.timezone.utc).date()
+    return query in opponent.lower() or query in game_date.strftime('%Y-%m-%d')
+
+
+def search_user_archives(user, query, job=None):
+    # Scans the last CHESSCOM_SEARCH_MONTHS months in parallel (at most
+    # CHESSCOM_SEARCH_CONCURRENCY downloads at once). Matches are stored as each
+    # month arrives, and the scan stops once SEARCH_RESULT_LIMIT games matched.
+    username = user.username.lower()
+    query = query.lower()
+    archives = chesscom.get_archives(username)
+    recent_archives = list(reversed(archives[-settings.CHESSCOM_SEARCH_MONTHS:]))
+
+    pending_archives = iter(recent_archives)
+    matched = 0
+    games_added = 0
+
+    with ThreadPoolExecutor(max_workers=settings.CHESSCOM_SEARCH_CONCURRENCY) as executor:
+        # Sliding window: a new month is only requested when a download finishes,
+        # so nothing beyond the in-flight months is fetched once the cap is hit
+        in_flight = {
+            executor.submit(chesscom.get_archive_games, archive_url)
+            for archive_url in itertools.islice(pending_archives, settings.CHESSCOM_SEARCH_CONCURRENCY)
+        }
+
+        while in_flight and matched < SEARCH_RESULT_LIMIT:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                api_games = future.result()
+                matches = [g for g in api_games if g.get('pgn') and game_matches_query(g, username, query)]
+                matches = matches[:SEARCH_RESULT_LIMIT - matched]
+
+                if matches:
+                    matched += len(matches)
+                    games_added += save_new_games(user, matches)
+
+                    if job is not None:
+                        SyncJob.objects.filter(pk=job.pk).update(games_added=games_added)
+
+                if matched < SEARCH_RESULT_LIMIT:
+                    next_archive = next(pending_archives, None)
+                    if next_archive:
+                        in_flight.add(executor.submit(chesscom.get_archive_games, next_archive))
+
+    return games_added
+
+
+def fail_stale_jobs(jobs=None):
+    # Running jobs whose worker was killed would otherwise block their user
+    # and kind forever (unique_active_sync_job)
+    jobs = SyncJob.objects.all() if jobs is None else jobs
+    stale_before = timezone.now() - datetime.timedelta(seconds=settings.CHESSCOM_SYNC_STALE_AFTER)
+    return jobs.filter(status=SyncJob.STATUS_RUNNING, started_at__lt=stale_before).update(
+        status=SyncJob.STATUS_FAILED, error='The worker stopped before the job finished.', finished_at=timezone.now()
+    )
+
+
+def enqueue_sync(user, force=False, kind=SyncJob.KIND_ARCHIVES, query=''):
+    # Returns the job the caller should wait on: an already queued/running one,
+    # a matching job that finished less than CHESSCOM_SYNC_INTERVAL seconds ago, or a new one.
+    same_jobs = SyncJob.objects.filter(user=user, kind=kind, query=query)
+    fail_stale_jobs(same_jobs)
+
+    active_job = same_jobs.filter(status__in=[SyncJob.STATUS_PENDING, SyncJob.STATUS_RUNNING]).first()
+    if active_job:
+        return active_job
+
+    if not force:
+        fresh_after = timezone.now() - datetime.timedelta(seconds=settings.CHESSCOM_SYNC_INTERVAL)
+        recent_job = same_jobs.filter(status=SyncJob.STATUS_DONE, finished_at__gte=fresh_after).first()
+        if recent_job:
+            return recent_job
+
+    try:
+        with transaction.atomic():
+            return SyncJob.objects.create(user=user, kind=kind, query=query)
+    except IntegrityError:
+        # Another process queued the same job in the meantime (unique_active_sync_job)
+        return same_jobs.filter(status__in=[SyncJob.STATUS_PENDING, SyncJob.STATUS_RUNNING]).first()
+
+
+def enqueue_search(user, query):
+    return enqueue_sync(user, kind=SyncJob.KIND_SEARCH, query=query.lower()[:100])
+
+
+def enqueue_profile_refresh(user):
+    return enqueue_sync(user, kind=SyncJob.KIND_PROFILE)
+
+
+def run_job(job):
+    # Claim the job atomically so that several workers can share one queue
+    claimed = SyncJob.objects.filter(pk=job.pk, status=SyncJob.STATUS_PENDING).update(
+        status=SyncJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    try:
+        if job.kind == SyncJob.KIND_SEARCH:
+            games_added = search_user_archives(job.user, job.query, job)
+        elif job.kind == SyncJob.KIND_PROFILE:
+            refresh_player_data(job.user)
+            games_added = None
+        else:
+            games_added = sync_user_archives(job.user, job)
+    except requests.exceptions.RequestException as e:
+        print(f"ERROR: API connection failed while syncing {job.user.username}: {e}")
+        SyncJob.objects.filter(pk=job.pk).update(
+            status=SyncJob.STATUS_FAILED, error=str(e), finished_at=timezone.now()
+        )
+    except Exception as e:
+        print(f"Error during archive sync for {job.user.username}: {e}")
+        SyncJob.objects.filter(pk=job.pk).update(
+            status=SyncJob.STATUS_FAILED, error=str(e), finished_at=timezone.now()
+        )
+    else:
+        if games_added is None:
+            print(f"Refreshed the chess.com profile of {job.user.username}.")
+        else:
+            print(f"Synced {games_added} new games for {job.user.username}.")
+        SyncJob.objects.filter(pk=job.pk).update(
+            status=SyncJob.STATUS_DONE, games_added=games_added or 0, finished_at=timezone.now()
+        )
+    return True
+
+
+def run_pending_jobs():
+    processed = 0
+    pending_jobs = SyncJob.objects.filter(status=SyncJob.STATUS_PENDING).select_related('user').order_by('created_at')
+    for job in pending_jobs:
+        if run_job(job):
+            processed += 1
+    return processed
@@ -1,3 +1,815 @@
-from django.test import TestCase
+import datetime
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analysis.models import ChessGame
+from analysis.pgn_scan import scan_pgn
+from chess_coach import monitoring
+from . import chesscom, ratelimit
+from .chesscom_stub import ChesscomStub
+from .management.commands import bench_views
+from .models import ChesscomPlayer, CustomUser, PlayerRating, RatingHistory, RatingRollup, SyncJob
+from .sync import enqueue_profile_refresh, enqueue_sync, run_pending_jobs, save_new_games, save_players_data, sync_user_archives
+from .views import CSRF_PLACEHOLDER
 
 # Create your tests here.
+
+ARCHIVE_BASE = 'https://api.chess.com/pub/player/magnus/games/'
+
+
+def make_api_game(index, opponent='hikaru', end_time=1727600000):
+    pgn = (
+        f'[Event "Live Chess"]\n[White "magnus"]\n[Black "{opponent}"]\n[Result "1-0"]\n'
+        f'[Link "https://www.chess.com/game/live/{index}"]\n\n1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n'
+    )
+    return {
+        'url': f'https://www.chess.com/game/live/{index}',
+        'pgn': pgn,
+        'end_time': end_time + index,
+        'time_class': 'blitz',
+        'white': {'username': 'magnus', 'rating': 2800, 'result': 'win'},
+        'black': {'username': opponent, 'rating': 2750, 'result': 'checkmated'},
+    }
+
+
+def clear_game_caches():
+    # Cached pages are keyed by user id, and ids come back after each test's
+    # rollback. Both aliases are in memory for the test run (chess_coach/test_runner.py).
+    cache.clear()
+    caches['game_versions'].clear()
+
+
+class FakeChesscom:
+    """Serves archive JSON for the sync worker instead of the network."""
+
+    def __init__(self, months):
+        self.months = months
+        self.requested = []
+
+    def __call__(self, url, timeout=10):
+        self.requested.append(url)
+        if url == chesscom.archives_url('magnus'):
+            return {'archives': [ARCHIVE_BASE + month for month in self.months]}
+        return {'games': self.months[url[len(ARCHIVE_BASE):]]}
+
+
+class SyncWorkerTests(TestCase):
+
+    def setUp(self):
+        clear_game_caches()
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+
+    def test_dashboard_queues_sync_without_calling_chesscom(self):
+        with mock.patch('requests.Session.request', side_effect=AssertionError('network call from a view')):
+            response = self.client.get(reverse('users:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SyncJob.objects.filter(user=self.user, status=SyncJob.STATUS_PENDING).count(), 1)
+
+        # A second view reuses the queued job instead of stacking another one
+        self.client.get(reverse('users:dashboard'))
+        self.assertEqual(SyncJob.objects.filter(user=self.user).count(), 1)
+
+    def test_worker_syncs_newest_months_down_to_the_last_synced_one(self):
+        fake = FakeChesscom({
+            '2024/08': [make_api_game(i) for i in range(3)],
+            '2024/09': [make_api_game(i) for i in range(3, 6)],
+        })
+        ChessGame.objects.create(
+            user=self.user, pgn=make_api_game(0)['pgn'], game_key='chess.com/game/live/0', game_date='2024-08-01',
+            white_player='magnus (2800)', black_player='hikaru (2750)',
+            time_control='Blitz', result_description='Win', moves_count=4,
+        )
+        job = SyncJob.objects.create(user=self.user)
+
+        with mock.patch('users.chesscom.get_json', fake):
+            self.assertEqual(run_pending_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_DONE)
+        self.assertEqual(job.games_added, 5)
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 6)
+
+        # Second run: only the newest month of the last sync may hold anything new
+        fake.requested.clear()
+        SyncJob.objects.create(user=self.user)
+        with mock.patch('users.chesscom.get_json', fake):
+            run_pending_jobs()
+        self.assertEqual(fake.requested, [chesscom.archives_url('magnus'), ARCHIVE_BASE + '2024/09'])
+
+    @override_settings(CHESSCOM_SYNC_STALE_AFTER=3600)
+    def test_stale_running_job_is_replaced(self):
+        stale = SyncJob.objects.create(
+            user=self.user, status=SyncJob.STATUS_RUNNING, started_at=timezone.now() - datetime.timedelta(days=3),
+        )
+        fresh = SyncJob.objects.create(
+            user=self.user, kind=SyncJob.KIND_PROFILE, status=SyncJob.STATUS_RUNNING, started_at=timezone.now(),
+        )
+
+        job = enqueue_sync(self.user, force=True)
+        self.assertNotEqual(job.pk, stale.pk)
+        self.assertEqual(job.status, SyncJob.STATUS_PENDING)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, SyncJob.STATUS_FAILED)
+        # A job inside the timeout may still have a live worker
+        self.assertEqual(enqueue_sync(self.user, kind=SyncJob.KIND_PROFILE).pk, fresh.pk)
+
+        with mock.patch('users.chesscom.get_json', FakeChesscom({'2024/09': [make_api_game(1)]})):
+            call_command('sync_chesscom', '--once', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_DONE)
+
+    def test_failed_sync_is_retried_past_the_months_it_stored(self):
+        fake = FakeChesscom({
+            '2024/07': [make_api_game(i) for i in range(3)],
+            '2024/08': [make_api_game(i) for i in range(3, 6)],
+            '2024/09': [make_api_game(i) for i in range(6, 9)],
+        })
+
+        def failing_get_json(url, timeout=10):
+            if url.endswith('2024/08'):
+                raise requests.exceptions.ConnectionError('connection reset')
+            return fake(url, timeout)
+
+        SyncJob.objects.create(user=self.user)
+        with mock.patch('users.chesscom.get_json', failing_get_json):
+            run_pending_jobs()
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 3)
+
+        # The retry adds nothing for 2024/09 but still walks the older months
+        SyncJob.objects.create(user=self.user)
+        with mock.patch('users.chesscom.get_json', fake):
+            run_pending_jobs()
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 9)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.archives_synced_through, datetime.date(2024, 9, 1))
+
+    def test_months_stored_by_a_search_do_not_stop_the_sync(self):
+        fake = FakeChesscom({
+            '2024/08': [make_api_game(i) for i in range(3)],
+            '2024/09': [make_api_game(i, opponent='firouzja') for i in range(3, 5)],
+        })
+        SyncJob.objects.create(user=self.user, kind=SyncJob.KIND_SEARCH, query='firouzja')
+        with mock.patch('users.chesscom.get_json', fake):
+            run_pending_jobs()
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 2)
+
+        SyncJob.objects.create(user=self.user)
+        with mock.patch('users.chesscom.get_json', fake):
+            run_pending_jobs()
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 5)
+
+    @override_settings(CHESSCOM_SEARCH_MONTHS=6, CHESSCOM_SEARCH_CONCURRENCY=1)
+    def test_search_scan_stops_at_result_cap(self):
+        months = {f'2024/0{m}': [make_api_game(m * 10 + i, opponent='firouzja') for i in range(5)] for m in range(1, 7)}
+        fake = FakeChesscom(months)
+
+        response = self.client.get(reverse('users:search_games'), {'query': 'Firouzja'})
+        self.assertEqual(response.json()['games'], [])
+        job = SyncJob.objects.get(pk=response.json()['sync_job']['job'])
+        self.assertEqual((job.kind, job.query), (SyncJob.KIND_SEARCH, 'firouzja'))
+
+        with mock.patch('users.chesscom.get_json', fake):
+            run_pending_jobs()
+
+        # Newest months are scanned first; two months already give 10 matches
+        self.assertEqual(fake.requested[1:], [ARCHIVE_BASE + '2024/06', ARCHIVE_BASE + '2024/05'])
+        self.assertEqual(len(self.client.get(reverse('users:search_games'), {'query': 'firouzja'}).json()['games']), 10)
+
+    @override_settings(CHESSCOM_SEARCH_CONCURRENCY=3)
+    def test_search_scan_downloads_months_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=2)
+        fake = FakeChesscom({f'2024/0{m}': [make_api_game(m)] for m in range(1, 4)})
+
+        def fake_get_json(url, timeout=10):
+            if url != chesscom.archives_url('magnus'):
+                barrier.wait()
+            return fake(url, timeout)
+
+        SyncJob.objects.create(user=self.user, kind=SyncJob.KIND_SEARCH, query='hikaru')
+        with mock.patch('users.chesscom.get_json', fake_get_json):
+            run_pending_jobs()
+
+        self.assertEqual(SyncJob.objects.get().status, SyncJob.STATUS_DONE)
+        self.assertEqual(ChessGame.objects.filter(user=self.user).count(), 3)
+
+    def test_sync_status_reports_finished_job(self):
+        job = SyncJob.objects.create(user=self.user)
+        response = self.client.get(reverse('users:sync_status'), {'job': job.pk})
+        self.assertFalse(response.json()['finished'])
+
+        with mock.patch('users.chesscom.get_json', FakeChesscom({'2024/09': [make_api_game(1)]})):
+            run_pending_jobs()
+
+        data = self.client.get(reverse('users:sync_status'), {'job': job.pk}).json()
+        self.assertTrue(data['finished'])
+        self.assertEqual(data['games_added'], 1)
+
+
+def make_response(status_code, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    response.headers.update(headers or {})
+    return response
+
+
+class ChesscomClientTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        override = override_settings(CHESSCOM_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_finished_month_is_served_from_disk(self):
+        url = ARCHIVE_BASE + '2020/01'
+        payload = {'games': [make_api_game(1)]}
+
+        with mock.patch.object(chesscom.get_session(), 'get', return_value=make_response(200, payload)) as get:
+            self.assertEqual(chesscom.get_archive_games(url), payload['games'])
+            self.assertEqual(chesscom.get_archive_games(url), payload['games'])
+
+        self.assertEqual(get.call_count, 1)
+
+    def test_archive_list_is_revalidated_with_etag(self):
+        url = chesscom.archives_url('magnus')
+        payload = {'archives': [ARCHIVE_BASE + '2020/01']}
+        responses = [make_response(200, payload, {'ETag': '"v1"'}), make_response(304)]
+
+        with mock.patch.object(chesscom.get_session(), 'get', side_effect=responses) as get:
+            chesscom.get_archives('magnus')
+            self.assertEqual(chesscom.get_archives('magnus'), payload['archives'])
+
+        self.assertEqual(get.call_args_list[1].kwargs['headers'], {'If-None-Match': '"v1"'})
+        self.assertEqual(get.call_args_list[1].args, (url,))
+
+
+@override_settings(CHESSCOM_BACKOFF_BASE=0.01, CHESSCOM_RATE_LIMIT=100, CHESSCOM_RATE_BURST=10)
+class RequestSchedulerTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        override = override_settings(CHESSCOM_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_throttled_request_honors_retry_after(self):
+        payload = {'username': 'magnus'}
+        responses = [make_response(429, {}, {'Retry-After': '1'}), make_response(200, payload)]
+        throttled = ratelimit.metrics.throttled
+
+        started = time.monotonic()
+        with mock.patch.object(chesscom.get_session(), 'get', side_effect=responses) as get:
+            self.assertEqual(chesscom.get_player('magnus'), payload)
+
+        self.assertEqual(get.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+        self.assertEqual(ratelimit.metrics.throttled, throttled + 1)
+
+    @override_settings(CHESSCOM_MAX_RETRIES=1)
+    def test_gives_up_after_the_retries(self):
+        with mock.patch.object(chesscom.get_session(), 'get', return_value=make_response(503, {})) as get:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                chesscom.get_player('magnus')
+        self.assertEqual(get.call_count, 2)
+
+    @override_settings(CHESSCOM_RATE_LIMIT=10, CHESSCOM_RATE_BURST=1)
+    def test_token_bucket_spaces_out_requests(self):
+        started = time.monotonic()
+        for _ in range(4):
+            with ratelimit.slot('api.chess.com'):
+                pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+    @override_settings(CHESSCOM_MAX_CONCURRENCY=1)
+    def test_concurrency_cap_is_shared_through_lock_files(self):
+        with ratelimit.slot('api.chess.com'):
+            self.assertEqual(ratelimit.snapshot()['hosts']['api.chess.com']['slots_busy'], 1)
+
+            # Separate lock files handles behave like another process
+            waiter = threading.Thread(target=self.assert_slot_times_out)
+            waiter.start()
+            waiter.join()
+
+        with ratelimit.slot('api.chess.com', timeout=0.1):
+            pass
+
+    def assert_slot_times_out(self):
+        with self.assertRaises(ratelimit.SchedulerTimeout):
+            with ratelimit.slot('api.chess.com', timeout=0.1):
+                pass
+
+    def test_status_endpoint_is_staff_only(self):
+        user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('users:chesscom_status')).status_code, 302)
+
+        CustomUser.objects.filter(pk=user.pk).update(is_staff=True)
+        self.assertIn('process', self.client.get(reverse('users:chesscom_status')).json())
+
+
+STATS_PAYLOAD = {
+    'chess_blitz': {'last': {'rating': 2810, 'prev': 2800}, 'record': {'win': 10, 'loss': 2, 'draw': 3}},
+}
+
+
+class AsyncProfileTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+
+    def test_profile_and_stats_are_fetched_concurrently(self):
+        # Both fetches must be in flight at once for the barrier to open
+        barrier = threading.Barrier(2, timeout=2)
+
+        def fake_get_json(url, timeout=10):
+            barrier.wait()
+            return STATS_PAYLOAD if url.endswith('/stats') else {'country': 'https://api.chess.com/pub/country/NO'}
+
+        with mock.patch('users.chesscom.get_json', fake_get_json):
+            response = self.client.get(reverse('users:profile'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ChesscomPlayer.objects.get(user=self.user).country_code, 'NO')
+        self.assertEqual(PlayerRating.objects.get(time_class='blitz').rating, 2810)
+
+    @override_settings(CHESSCOM_PROFILE_TIMEOUT=0.1)
+    def test_first_visit_gives_up_after_the_timeout(self):
+        def slow_get_json(url, timeout=10):
+            time.sleep(0.5)
+            return {}
+
+        with mock.patch('users.chesscom.get_json', slow_get_json):
+            response = self.client.get(reverse('users:profile'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['ratings'], {})
+        self.assertFalse(ChesscomPlayer.objects.filter(user=self.user).exists())
+
+
+class ProfileFreshnessTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        self.player = ChesscomPlayer.objects.create(user=self.user, username='magnus', country_code='NO')
+        PlayerRating.objects.create(player=self.player, time_class='blitz', rating=2700)
+
+    def make_stale(self):
+        ChesscomPlayer.objects.filter(pk=self.player.pk).update(
+            last_updated=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+    @override_settings(CHESSCOM_PROFILE_TTL=600)
+    def test_username_change_drops_the_old_profile(self):
+        self.client.post(reverse('users:settings'), {'update_chess_username': '1', 'username': 'hikaru'})
+
+        self.assertFalse(ChesscomPlayer.objects.filter(user=self.user).exists())
+        self.assertFalse(PlayerRating.objects.exists())
+        with mock.patch('users.views.aupdate_player_data', mock.AsyncMock(return_value=False)) as update:
+            response = self.client.get(reverse('users:profile'))
+        update.assert_awaited_once()
+        self.assertEqual(response.context['ratings'], {})
+
+    @override_settings(CHESSCOM_PROFILE_TTL=600)
+    def test_fresh_profile_renders_from_the_db(self):
+        with mock.patch('requests.Session.request', side_effect=AssertionError('network call from a view')):
+            response = self.client.get(reverse('users:profile'))
+
+        self.assertEqual(response.context['ratings']['blitz']['rating'], '2700')
+        self.assertFalse(SyncJob.objects.exists())
+
+    @override_settings(CHESSCOM_PROFILE_TTL=600)
+    def test_stale_profile_is_served_and_refreshed_once_in_the_background(self):
+        self.make_stale()
+
+        with mock.patch('requests.Session.request', side_effect=AssertionError('network call from a view')):
+            for _ in range(3):
+                response = self.client.get(reverse('users:profile'))
+                self.assertEqual(response.context['ratings']['blitz']['rating'], '2700')
+
+        job = SyncJob.objects.get()
+        self.assertEqual(job.kind, SyncJob.KIND_PROFILE)
+
+        def fake_get_json(url, timeout=10):
+            return STATS_PAYLOAD if url.endswith('/stats') else {'country': 'https://api.chess.com/pub/country/NO'}
+
+        with mock.patch('users.chesscom.get_json', fake_get_json), mock.patch('builtins.print') as log:
+            run_pending_jobs()
+
+        log.assert_called_once_with('Refreshed the chess.com profile of magnus.')
+        self.assertEqual(PlayerRating.objects.get(time_class='blitz').rating, 2810)
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.context['ratings']['blitz']['rating'], '2810')
+        self.assertEqual(SyncJob.objects.count(), 1)
+
+    def test_only_one_active_job_per_kind_can_exist(self):
+        SyncJob.objects.create(user=self.user, kind=SyncJob.KIND_PROFILE)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SyncJob.objects.create(user=self.user, kind=SyncJob.KIND_PROFILE)
+
+        # A racing enqueue that missed the active job gets it back instead of failing
+        active = SyncJob.objects.get()
+        with mock.patch('django.db.models.query.QuerySet.first', side_effect=[None, None, active]):
+            self.assertEqual(enqueue_profile_refresh(self.user), active)
+
+
+class RatingUpsertTests(TestCase):
+
+    def test_many_players_are_written_in_four_statements(self):
+        users = [CustomUser.objects.create_user(f'player{i}', f'p{i}@example.com', 'pass12345') for i in range(30)]
+        player_info = {'country': 'https://api.chess.com/pub/country/NO'}
+
+        with CaptureQueriesContext(connection) as queries:
+            save_players_data([(user, player_info, STATS_PAYLOAD) for user in users])
+        statements = [q for q in queries.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(PlayerRating.objects.count(), 90)
+
+        # Second run updates the existing rows in place
+        stats = {'chess_blitz': {'last': {'rating': 2900, 'prev': 2810}, 'record': {'win': 11}}}
+        save_players_data([(user, player_info, stats) for user in users])
+
+        self.assertEqual(PlayerRating.objects.count(), 90)
+        rating = PlayerRating.objects.get(player__user=users[0], time_class='blitz')
+        self.assertEqual((rating.rating, rating.rating_change, rating.win_count), (2900, 90, 11))
+
+    def test_username_held_by_another_user_skips_only_that_player(self):
+        holder = CustomUser.objects.create_user('Hikaru', 'h1@example.com', 'pass12345')
+        ChesscomPlayer.objects.create(user=holder, username='hikaru')
+        users = [
+            CustomUser.objects.create_user('hikaru', 'h2@example.com', 'pass12345'),
+            CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345'),
+            CustomUser.objects.create_user('MAGNUS', 'magnus2@example.com', 'pass12345'),
+        ]
+
+        with mock.patch('builtins.print'):
+            saved = save_players_data([(user, {}, STATS_PAYLOAD) for user in users])
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(ChesscomPlayer.objects.get(username='hikaru').user, holder)
+        self.assertEqual(ChesscomPlayer.objects.get(username='magnus').user, users[1])
+        self.assertEqual(PlayerRating.objects.filter(player__user=users[1]).count(), 3)
+
+    def test_refresh_ratings_command(self):
+        CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+
+        def fake_get_json(url, timeout=10):
+            return STATS_PAYLOAD if url.endswith('/stats') else {}
+
+        with mock.patch('users.chesscom.get_json', fake_get_json):
+            call_command('refresh_ratings', stdout=io.StringIO())
+
+        self.assertEqual(PlayerRating.objects.get(time_class='blitz').rating, 2810)
+
+
+def make_rated_api_game(index, rating, end_date, end_time='12:00:00'):
+    g = make_api_game(index)
+    g['pgn'] = g['pgn'].replace(
+        '[Result "1-0"]\n',
+        f'[Result "1-0"]\n[WhiteElo "{rating}"]\n[BlackElo "2750"]\n[EndDate "{end_date}"]\n[EndTime "{end_time}"]\n',
+    )
+    return g
+
+
+class RatingHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+
+    def test_ingested_games_feed_history_and_rollups(self):
+        # Newest month first, like the archive sync; 2024-09-02 is a Monday
+        save_new_games(self.user, [
+            make_rated_api_game(3, 2830, '2024.09.03'),
+            make_rated_api_game(4, 2810, '2024.09.03', '18:00:00'),
+        ])
+        save_new_games(self.user, [
+            make_rated_api_game(1, 2800, '2024.09.02'),
+            make_rated_api_game(2, 2790, '2024.09.02', '13:00:00'),
+        ])
+
+        self.assertEqual(RatingHistory.objects.filter(user=self.user, time_class='blitz').count(), 4)
+
+        week = RatingRollup.objects.get(period=RatingRollup.PERIOD_WEEK)
+        self.assertEqual(
+            (week.period_start, week.open_rating, week.close_rating, week.min_rating, week.max_rating, week.samples),
+            (datetime.date(2024, 9, 2), 2800, 2810, 2790, 2830, 4),
+        )
+        days = RatingRollup.objects.filter(period=RatingRollup.PERIOD_DAY).order_by('period_start')
+        self.assertEqual([(d.close_rating, d.samples) for d in days], [(2790, 2), (2810, 2)])
+
+        response = self.client.get(reverse('users:rating_history'), {'time_class': 'blitz', 'period': 'day'})
+        self.assertEqual(
+            [(p['date'], p['close']) for p in response.json()['points']],
+            [('2024-09-02', 2790), ('2024-09-03', 2810)],
+        )
+
+        # Games cached before the history existed are picked up by the backfill
+        RatingHistory.objects.all().delete()
+        call_command('backfill_rating_history', stdout=io.StringIO())
+        self.assertEqual(RatingHistory.objects.count(), 4)
+
+        # Deleting the games (chess.com username change) drops their points
+        ChessGame.objects.filter(user=self.user).delete()
+        self.assertFalse(RatingHistory.objects.exists())
+
+    def test_stats_refreshes_add_one_point_per_rating_change(self):
+        stats = {'chess_blitz': {'last': {'rating': 2810, 'prev': 2800, 'date': 1725300000}}}
+        save_players_data([(self.user, {}, stats)])
+        save_players_data([(self.user, {}, stats)])
+
+        point = RatingHistory.objects.get()
+        self.assertEqual((point.rating, point.source), (2810, RatingHistory.SOURCE_STATS))
+        self.assertEqual(RatingRollup.objects.get(period=RatingRollup.PERIOD_DAY).samples, 1)
+
+    def test_username_change_drops_the_old_accounts_history(self):
+        save_new_games(self.user, [make_rated_api_game(1, 2800, '2024.09.02')])
+        stats = {'chess_blitz': {'last': {'rating': 2810, 'prev': 2800, 'date': 1725300000}}}
+        save_players_data([(self.user, {}, stats)])
+
+        self.client.post(reverse('users:settings'), {'update_chess_username': '1', 'username': 'hikaru'})
+
+        self.assertFalse(RatingHistory.objects.filter(user=self.user).exists())
+        self.assertFalse(RatingRollup.objects.filter(user=self.user).exists())
+
+
+class LoadMoreGamesTests(TestCase):
+
+    def setUp(self):
+        clear_game_caches()
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        # Several games share a date, so ordering relies on cached_at and id as well
+        ChessGame.objects.bulk_create([
+            ChessGame(
+                user=self.user, pgn=f'game {i}', game_key=f'key-{i}', game_date=f'2024-09-{1 + i // 4:02d}',
+                white_player='magnus (2800)', black_player=f'opponent{i} (2700)',
+                time_control='Blitz', result_description='Win', moves_count=20,
+            )
+            for i in range(12)
+        ])
+
+    def test_cursor_pages_walk_every_game_once(self):
+        seen = []
+        cursor = self.client.get(reverse('users:dashboard')).context['games_page']['next_cursor']
+
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(reverse('users:load_more_games'), {'cursor': cursor}).json()
+            self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+            seen.extend(game['pk'] for game in data['games'])
+            cursor = data['next_cursor']
+            if not data['has_more_db_games']:
+                break
+
+        expected = list(ChessGame.objects.filter(user=self.user).order_by('-game_date', '-cached_at', '-id')
+                        .values_list('pk', flat=True)[5:])
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('users:load_more_games'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ChesscomStubTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.stub = ChesscomStub(games_per_month=20, movetext_pool=10).start()
+        self.addCleanup(self.stub.stop)
+        override = override_settings(CHESSCOM_API_BASE=self.stub.api_base, CHESSCOM_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_archives_are_served_through_the_client(self):
+        self.stub.add_player('magnus', 45)
+
+        archives = chesscom.get_archives('magnus')
+        self.assertEqual(len(archives), 3)
+        self.assertEqual(len(chesscom.get_archive_games(archives[0])), 5)
+        self.assertEqual(len(chesscom.get_archive_games(archives[-1])), 20)
+        self.assertIn('chess_blitz', chesscom.get_stats('magnus'))
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            chesscom.get_player('nobody')
+
+    def test_bench_views_measures_every_view(self):
+        user = bench_views.seed_user(self.stub, 'bench45', 45)
+        self.assertEqual(ChessGame.objects.filter(user=user).count(), 45)
+
+        with mock.patch('builtins.print'):
+            results = bench_views.bench_user(user, requests=2, warmup=1)
+
+        self.assertEqual(
+            set(results),
+            {'dashboard', 'load_more_games', 'load_more_games_deep', 'search_games', 'search_games_date', 'profile'},
+        )
+        for summary in results.values():
+            self.assertLessEqual(summary['latency_ms']['p50'], summary['latency_ms']['max'])
+            self.assertGreater(summary['queries']['min'], 0)
+
+    def test_compare_reports_flags_regressions(self):
+        def row(p95, queries):
+            return {'games': 10, 'view': 'dashboard', 'latency_ms': {'p50': 1.0, 'p95': p95}, 'queries': {'max': queries}}
+
+        baseline = {'results': [row(10.0, 5)]}
+        self.assertFalse(bench_views.compare_reports({'results': [row(11.0, 5)]}, baseline)[0][0])
+        self.assertTrue(bench_views.compare_reports({'results': [row(15.0, 5)]}, baseline)[0][0])
+        self.assertTrue(bench_views.compare_reports({'results': [row(10.0, 6)]}, baseline)[0][0])
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        monitoring.registry.reset()
+        clear_game_caches()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        override = override_settings(CHESSCOM_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode('utf-8')
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    def test_view_latency_and_queries_are_recorded(self):
+        self.client.get(reverse('users:dashboard'))
+        body = self.scrape()
+
+        self.assertIn('chesscoach_view_requests_total{view="users:dashboard",status="200"} 1', body)
+        self.assertIn('chesscoach_view_latency_seconds_count{view="users:dashboard"} 1', body)
+        self.assertIn('chesscoach_view_latency_seconds_bucket{view="users:dashboard",le="+Inf"} 1', body)
+        queries = [line for line in body.splitlines() if line.startswith('chesscoach_view_db_queries_sum{view="users:dashboard"}')]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(float(queries[0].split()[-1]), 0)
+
+    def test_upstream_calls_and_pgn_parses_are_recorded(self):
+        with mock.patch.object(chesscom.get_session(), 'get', return_value=make_response(200, {'username': 'magnus'})):
+            chesscom.get_player('magnus')
+        scan_pgn('[White "a"]\n\n1. e4 e5 *')
+        body = self.scrape()
+
+        self.assertIn('chesscoach_upstream_requests_total{host="api.chess.com",status="200"} 1', body)
+        self.assertIn('chesscoach_upstream_latency_seconds_count{host="api.chess.com"} 1', body)
+        self.assertIn('chesscoach_pgn_parse_seconds_count{parser="scan"} 1', body)
+        self.assertIn('chesscoach_upstream_host_slots_busy{host="api.chess.com"} 0', body)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=1, METRICS_SLOW_REQUEST_SAMPLE=1.0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with mock.patch('builtins.print') as printed, \
+                mock.patch('chess_coach.middleware.time.perf_counter', side_effect=itertools.count()):
+            self.client.get(reverse('users:dashboard'))
+
+        reports = [call.args[0] for call in printed.call_args_list if str(call.args[0]).startswith('Slow request')]
+        self.assertEqual(len(reports), 1)
+        self.assertIn('(users:dashboard)', reports[0])
+        self.assertIn('SELECT', reports[0])
+
+
+class ChesscomMirrorTests(TestCase):
+
+    def setUp(self):
+        for name in ('CHESSCOM_CACHE_DIR', 'CHESSCOM_MIRROR_DIR'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            override = override_settings(**{name: directory.name})
+            override.enable()
+            self.addCleanup(override.disable)
+
+    def test_recorded_responses_are_replayed_without_network(self):
+        payload = {'username': 'magnus'}
+        with override_settings(CHESSCOM_API_MODE='record'), \
+                mock.patch.object(chesscom.get_session(), 'get', return_value=make_response(200, payload)):
+            self.assertEqual(chesscom.get_player('magnus'), payload)
+
+        with override_settings(CHESSCOM_API_MODE='replay'), \
+                mock.patch.object(chesscom.get_session(), 'get', side_effect=AssertionError('network')):
+            self.assertEqual(chesscom.get_player('magnus'), payload)
+            with self.assertRaises(chesscom.MirrorMiss):
+                chesscom.get_stats('magnus')
+
+    def test_not_found_is_replayed_as_an_error(self):
+        with override_settings(CHESSCOM_API_MODE='record'), \
+                mock.patch.object(chesscom.get_session(), 'get', return_value=make_response(404, {'code': 0})):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                chesscom.get_player('nobody')
+
+        with override_settings(CHESSCOM_API_MODE='replay'):
+            with self.assertRaises(requests.exceptions.HTTPError) as raised:
+                chesscom.get_player('nobody')
+        self.assertEqual(raised.exception.response.status_code, 404)
+
+    def test_identical_bodies_are_stored_once(self):
+        with override_settings(CHESSCOM_API_MODE='record'), \
+                mock.patch.object(chesscom.get_session(), 'get', side_effect=lambda *args, **kwargs: make_response(200, {'games': []})):
+            chesscom.get_archive_games(ARCHIVE_BASE + '2024/01')
+            chesscom.get_archive_games(ARCHIVE_BASE + '2024/02')
+
+        mirror = settings.CHESSCOM_MIRROR_DIR
+        refs = [name for _, _, names in os.walk(os.path.join(mirror, 'refs')) for name in names]
+        objects = [name for _, _, names in os.walk(os.path.join(mirror, 'objects')) for name in names]
+        self.assertEqual((len(refs), len(objects)), (2, 1))
+
+    def test_sync_runs_from_a_recorded_mirror(self):
+        user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        with ChesscomStub(games_per_month=10, movetext_pool=5) as stub:
+            stub.add_player('magnus', 25)
+            with override_settings(CHESSCOM_API_BASE=stub.api_base, CHESSCOM_API_MODE='record'):
+                recorded = [chesscom.get_archive_games(url) for url in chesscom.get_archives('magnus')]
+                api_base = stub.api_base
+
+        # The stub is gone: everything below comes from the mirror
+        with override_settings(CHESSCOM_API_BASE=api_base, CHESSCOM_API_MODE='replay'), mock.patch('builtins.print'):
+            self.assertEqual(sync_user_archives(user), sum(len(games) for games in recorded))
+        self.assertEqual(ChessGame.objects.filter(user=user).count(), 25)
+
+    @override_settings(CHESSCOM_API_MODE='offline')
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            chesscom.get_player('magnus')
+
+
+class GameCacheTests(TestCase):
+
+    def setUp(self):
+        clear_game_caches()
+        self.user = CustomUser.objects.create_user('magnus', 'magnus@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        with mock.patch('builtins.print'):
+            save_new_games(self.user, [make_api_game(i) for i in range(8)])
+
+    def game_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries, mock.patch('builtins.print'):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in queries.captured_queries if 'analysis_chessgame' in q['sql']]
+
+    def test_repeat_dashboard_skips_the_game_queries(self):
+        _, first = self.game_queries(reverse('users:dashboard'))
+        response, second = self.game_queries(reverse('users:dashboard'))
+
+        self.assertTrue(first)
+        self.assertEqual(second, [])
+        self.assertEqual(response.context['total_games'], 8)
+        # The cached rows get this session's CSRF token
+        content = response.content.decode('utf-8')
+        self.assertNotIn(CSRF_PLACEHOLDER, content)
+        self.assertEqual(content.count('name="csrfmiddlewaretoken" value="'), 5)
+        self.assertNotIn('csrfmiddlewaretoken" value=""', content)
+
+    def test_ingest_invalidates_the_cached_pages(self):
+        self.game_queries(reverse('users:dashboard'))
+        cursor = self.client.get(reverse('users:dashboard')).context['games_page']['next_cursor']
+        _, first = self.game_queries(reverse('users:load_more_games'), {'cursor': cursor})
+        _, second = self.game_queries(reverse('users:load_more_games'), {'cursor': cursor})
+        self.assertTrue(first)
+        self.assertEqual(second, [])
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('builtins.print'):
+            save_new_games(self.user, [make_api_game(100, end_time=1737600000)])
+
+        response, queries = self.game_queries(reverse('users:dashboard'))
+        self.assertTrue(queries)
+        self.assertEqual(response.context['total_games'], 9)
+
+    def test_username_change_invalidates_the_cached_pages(self):
+        self.game_queries(reverse('users:dashboard'))
+        self.client.post(reverse('users:settings'), {'update_chess_username': '1', 'username': 'hikaru'})
+
+        response, _ = self.game_queries(reverse('users:dashboard'))
+        self.assertEqual(response.context['total_games'], 0)
@@ -12,6 +12,9 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'), 
     path('search_games/', views.search_games, name='search_games'),
     path('load_more_games/', views.load_more_games, name='load_more_games'),
+    path('sync_status/', views.sync_status, name='sync_status'),
+    path('rating_history/', views.rating_history, name='rating_history'),
+    path('chesscom_status/', views.chesscom_status, name='chesscom_status'),
     path('delete_account/', views.delete_account, name='delete_account'),
 
 ]
\ No newline at end of file
@@ -1,29 +1,36 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, update_session_auth_hash 
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserUpdateForm, ChessUsernameUpdateForm
-from .models import CustomUser, ChesscomPlayer, PlayerRating
+from .models import CustomUser, ChesscomPlayer, RatingHistory, RatingRollup, SyncJob
 from django.contrib.auth.forms import PasswordChangeForm 
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth import login as auth_login 
 from django.contrib.auth import logout as auth_logout
-import requests
-import io 
-import chess.pgn # type: ignore
+import asyncio
+import base64
 import datetime
-from requests.exceptions import RequestException
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings as django_settings
 import locale
-from analysis.models import ChessGame
+from analysis.models import ChessGame, ExplorerMove, GameStats
+from analysis.search import search_user_games
+from analysis.stats import get_user_stats
+from django.db.models import Q
 from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.utils import timezone
+from . import chesscom, gamecache, ratelimit
+from .ratings import rating_series
+from .sync import enqueue_profile_refresh, enqueue_search, enqueue_sync, save_player_data
 
 
 # Create your views here.
 
-API_HEADERS = {
-    'User-Agent': 'ChessCoach(but still under development)/1.0 (contact: meleknurbacakli5@gmail.com)' 
-}
-
 try:
     locale.setlocale(locale.LC_TIME, 'en_US.UTF-8')
 except locale.Error:
@@ -34,6 +41,11 @@ except locale.Error:
 
 DEFAULT_LIMIT = 5
 
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+# Newest first; id breaks ties so that keyset cursors are unambiguous
+GAME_LIST_ORDER = ('-game_date', '-cached_at', '-id')
+
 # Registration view
 def register(request):
     if request.method == 'POST':
@@ -69,102 +81,33 @@ def logout(request):
     auth_logout(request)
     return redirect('home')
 
-def get_rating_data(stats_data, time_class_key):
-    data = stats_data.get(time_class_key, {})
-    
-    current_rating = 0
-    score_change = 0 
-    
-    last_data = data.get('last', {})
-    current_rating_value = last_data.get('rating')
-    
-    if isinstance(current_rating_value, (int, float)):
-        current_rating = int(current_rating_value)
-
-    prev_rating = last_data.get('prev', 0)
-    if current_rating != 0 and prev_rating != 0:
-        score_change = current_rating - prev_rating
-        
-    record = data.get('record', {})
-    win, loss, draw = record.get('win', 0), record.get('loss', 0), record.get('draw', 0)
-    total = win + loss + draw
-    
-    return {
-        'rating': current_rating,
-        'change': score_change,
-        'total_games': total,
-        'win_count': win, 
-        'loss_count': loss,
-        'draw_count': draw,
-    }
-
-def extract_country_code(country_url):
-    if country_url:
-        return country_url.split('/')[-1].upper()
-    return None 
-
-
-def update_player_data(user):
+async def aupdate_player_data(user):
     username = user.username.lower()
     
     try:
-        # 1. Player Profile Info API Call
-        player_info_url = f'https://api.chess.com/pub/player/{username}'
-        player_info_response = requests.get(player_info_url, headers=API_HEADERS, timeout=5)
-        player_info_response.raise_for_status()
-        player_info = player_info_response.json()
-        
-        # 2. Player Stats API Call
-        stats_url = f'https://api.chess.com/pub/player/{username}/stats'
-        stats_response = requests.get(stats_url, headers=API_HEADERS, timeout=5)
-        stats_response.raise_for_status()
-        stats_data = stats_response.json()
+        # Profile info and stats are fetched concurrently, so the wait is
+        # max(a, b) instead of a + b, and capped at CHESSCOM_PROFILE_TIMEOUT
+        player_info, stats_data = await asyncio.wait_for(
+            asyncio.gather(chesscom.aget_player(username), chesscom.aget_stats(username)),
+            timeout=django_settings.CHESSCOM_PROFILE_TIMEOUT,
+        )
 
     except requests.exceptions.RequestException as e:
         print(f"API Connection Error for {username}: {e}")
         return False 
-    
-    player_obj, created = ChesscomPlayer.objects.update_or_create(
-        user=user, 
-        defaults={
-            'username': username,
-            'country_code': extract_country_code(player_info.get('country')),
-            'last_updated': timezone.now()
-        }
-    )
-    
-    rating_classes = {
-        'bullet': 'chess_bullet',
-        'blitz': 'chess_blitz',
-        'rapid': 'chess_rapid',
-    }
-    
-    for time_class, api_key in rating_classes.items():
-        api_data = get_rating_data(stats_data, api_key)
-        new_rating = api_data['rating']
-        
-        rating_obj, created = PlayerRating.objects.get_or_create(
-            player=player_obj,
-            time_class=time_class,
-            defaults={'rating': new_rating}
-        )
-        
-        if created or rating_obj.rating != new_rating:
-            rating_obj.rating = new_rating
-            rating_obj.rating_change = api_data['change']
-            rating_obj.total_games = api_data['total_games']
-            rating_obj.win_count = api_data['win_count']
-            rating_obj.loss_count = api_data['loss_count']
-            rating_obj.draw_count = api_data['draw_count']
-            rating_obj.last_updated = timezone.now()
-            rating_obj.save()
-            print(f"Rating CHANGE detected for {time_class}. Updated to {new_rating}.")
-        else:
-            print(f"Rating UNCHANGED for {time_class}. Using local DB data.")
+    except asyncio.TimeoutError:
+        print(f"API Timeout for {username}. Using local DB data.")
+        return False
 
-        
+    await sync_to_async(save_player_data)(user, player_info, stats_data)
     return True
 
+def update_player_data(user):
+    return async_to_sync(aupdate_player_data)(user)
+
+def get_profile_last_updated(user):
+    return ChesscomPlayer.objects.filter(user=user).values_list('last_updated', flat=True).first()
+
 def get_player_context_from_db(user):
     username = user.username.lower()
     
@@ -200,11 +143,21 @@ def get_player_context_from_db(user):
     return context
 
 @login_required
-def profile(request):
-    user = request.user
+async def profile(request):
+    user = await request.auser()
     username = user.username.lower()
-    api_success = update_player_data(user) 
-    context = get_player_context_from_db(user)
+    api_success = True
+
+    # Stale-while-revalidate: fresh ratings render straight from the DB, stale
+    # ones too while a single queued worker job refreshes them. Only a first
+    # visit, with nothing stored yet, waits for chess.com.
+    last_updated = await sync_to_async(get_profile_last_updated)(user)
+    if last_updated is None:
+        api_success = await aupdate_player_data(user)
+    elif timezone.now() - last_updated > datetime.timedelta(seconds=django_settings.CHESSCOM_PROFILE_TTL):
+        await sync_to_async(enqueue_profile_refresh)(user)
+
+    context = await sync_to_async(get_player_context_from_db)(user)
     
     if context is None:
         if not api_success:
@@ -216,8 +169,9 @@ def profile(request):
 
         
     context['active_tab'] = 'overview'
+    context['game_stats'] = await sync_to_async(get_user_stats)(user)
 
-    return render(request, 'profile.html', context)
+    return await sync_to_async(render)(request, 'profile.html', context)
 
 @login_required
 def settings(request):
@@ -253,7 +207,18 @@ def settings(request):
                 
                 if new_username is not None:
                     chess_username_form.save() 
+                    # The new account's archives are synced from scratch
+                    CustomUser.objects.filter(pk=request.user.pk).update(archives_synced_through=None)
                     ChessGame.objects.filter(user=request.user).delete()
+                    GameStats.objects.filter(user=request.user).delete()
+                    ExplorerMove.objects.filter(user=request.user).delete()
+                    # Stats points and rollups of the old account outlive its games
+                    RatingHistory.objects.filter(user=request.user).delete()
+                    RatingRollup.objects.filter(user=request.user).delete()
+                    # The old account's profile and ratings (PlayerRating cascades);
+                    # the next profile visit fetches the new one
+                    ChesscomPlayer.objects.filter(user=request.user).delete()
+                    gamecache.bump_games_version(request.user.pk)
                     messages.success(request, f"Chess.com username successfully set to '{new_username}'.")
                 else:
                     messages.error(request, "Username cannot be empty.")
@@ -289,124 +254,92 @@ def delete_account(request):
                     
     return redirect('users:settings')
 
-def get_moves_from_pgn(pgn_text):
-    try:
-        pgn_io = io.StringIO(pgn_text)
-        game = chess.pgn.read_game(pgn_io)
-        
-        if game is None:
-            return 0
-        moves_count = len(list(game.mainline_moves()))
-        
-        return (moves_count + 1) // 2
-        
-    except Exception as e:
-        print(f"PGN okuma hatası: {e}")
-        return 0
-
-@login_required
-def dashboard(request):
-    username = request.user.username.lower()
+def game_to_dict(game_obj, username):
+    return {
+        'pk': game_obj.pk,
+        'player_top': game_obj.white_player,
+        'player_bottom': game_obj.black_player,
+        'time_control': game_obj.time_control,
+        'result_description': game_obj.result_description,
+        'moves_count': game_obj.moves_count,
+        'date': game_obj.game_date.strftime("%b %d, %Y"),
+        'is_user_white': game_obj.white_player.lower().startswith(username),
+    }
 
-    DEFAULT_LIMIT = 5
-    current_limit = DEFAULT_LIMIT 
+def encode_cursor(game_obj):
+    raw = f"{game_obj.game_date.isoformat()}|{game_obj.cached_at.isoformat()}|{game_obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    # Raises ValueError for anything that is not a cursor we produced
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    game_date, cached_at, pk = raw.split('|')
+    return datetime.date.fromisoformat(game_date), datetime.datetime.fromisoformat(cached_at), int(pk)
+
+def get_games_page(user, cursor=None, limit=DEFAULT_LIMIT):
+    # Keyset pagination over (game_date, cached_at, id), served by the
+    # chessgame_user_recent_idx index: every page costs the same as the first.
+    games_qs = ChessGame.objects.filter(user=user).defer(*ChessGame.HEAVY_FIELDS).order_by(*GAME_LIST_ORDER)
+
+    if cursor:
+        game_date, cached_at, pk = decode_cursor(cursor)
+        games_qs = games_qs.filter(
+            Q(game_date__lt=game_date)
+            | Q(game_date=game_date, cached_at__lt=cached_at)
+            | Q(game_date=game_date, cached_at=cached_at, pk__lt=pk)
+        )
 
-    latest_db_game = ChessGame.objects.filter(user=request.user).order_by('-game_date', '-cached_at').first()
+    # One extra row tells whether another page exists, no COUNT needed
+    games = list(games_qs[:limit + 1])
+    has_more = len(games) > limit
+    games = games[:limit]
+    next_cursor = encode_cursor(games[-1]) if games else cursor
 
+    return games, has_more, next_cursor
 
-    try:
-        archives_url = f'https://api.chess.com/pub/player/{username}/games/archives'
-        archives_response = requests.get(archives_url, headers=API_HEADERS, timeout=10)
-        archives_response.raise_for_status()
-        archives = archives_response.json().get('archives', [])
-
-        if archives:
-            latest_archive_url = archives[-1]
-
-            games_response = requests.get(latest_archive_url, headers=API_HEADERS, timeout=10)
-            games_response.raise_for_status()
-            api_games = games_response.json().get('games', [])
-            latest_api_pgn = api_games[-1].get('pgn', '')
-            
-            is_new_game = latest_db_game and latest_db_game.pgn != latest_api_pgn
-            is_initial_load = not latest_db_game
-            
-            db_game_count = ChessGame.objects.filter(user=request.user).count()
-            is_under_limit = db_game_count < DEFAULT_LIMIT
-            
-            
-            if is_new_game or is_initial_load or is_under_limit:
-                
-                new_games_to_save = []
-                api_games_to_check = api_games[-DEFAULT_LIMIT:]
+def sync_job_to_dict(job):
+    return {
+        'job': job.pk,
+        'status': job.status,
+        'finished': job.is_finished,
+        'games_added': job.games_added,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
 
-                for g in api_games_to_check:
-                    pgn_text = g.get('pgn', '')
-                    
-                    if not ChessGame.objects.filter(user=request.user, pgn=pgn_text).exists():
-                        new_games_to_save.append(g)
+def render_game_rows(games_list):
+    # The CSRF token differs per session, so the cached rows carry a placeholder
+    return render_to_string('dashboard_games.html', {'games': games_list, 'csrf_placeholder': CSRF_PLACEHOLDER})
 
-                if new_games_to_save:
-                    print(f"Loading {len(new_games_to_save)} new games from API.")
-                    
-                    for g in new_games_to_save:
-                        pgn_text = g.get('pgn', '')
-                        moves_count = get_moves_from_pgn(pgn_text)
-                        timestamp_sec = g['end_time']
-                        game_datetime = datetime.datetime.fromtimestamp(timestamp_sec, tz=datetime.timezone.utc)
-                        game_date_db = game_datetime.date()
-                        white_player_formatted = f"{g['white']['username']} ({g['white']['rating']})"
-                        black_player_formatted = f"{g['black']['username']} ({g['black']['rating']})"
-                        is_user_white = g['white']['username'].lower() == username
-                        user_result = g['white']['result'] if is_user_white else g['black']['result']
-                        
-                        if user_result == 'win':
-                            display_result = 'Win'
-                        elif user_result in ['agreed', 'repetition', 'stalemate', 'insufficient', '50move', 'timevsinsufficient', 'draw']:
-                            display_result = 'Draw'
-                        else:
-                            display_result = 'Loss'
-
-                        ChessGame.objects.create(
-                            user=request.user, pgn=pgn_text, game_date=game_date_db,
-                            white_player=white_player_formatted, black_player=black_player_formatted,
-                            time_control=g.get('time_class', 'Unknown').capitalize(),
-                            result_description=display_result, moves_count=moves_count,
-                        )
-                
-            else:
-                print("No new games detected. Using local DB cache.")
+def build_dashboard_page(user):
+    username = user.username.lower()
+    total_games_count = ChessGame.objects.filter(user=user).count()
+    
+    games_for_display, has_more, next_cursor = get_games_page(user)
+    
+    games_list = [game_to_dict(game_obj, username) for game_obj in games_for_display]
 
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: API connection failed. Using local DB cache: {e}")
-    except Exception as e:
-        print(f"Error during API sync or processing: {e}")
+    return {
+        'rows': render_game_rows(games_list),
+        'total_games': total_games_count,
+        'games_page': {'next_cursor': next_cursor, 'has_more': has_more},
+    }
 
+@login_required
+def dashboard(request):
+    username = request.user.username.lower()
 
+    # Fetching from chess.com happens in the sync_chesscom worker; the page only reads the DB
+    sync_job = enqueue_sync(request.user)
 
-    all_games_qs = ChessGame.objects.filter(user=request.user).order_by('-game_date', '-cached_at')
-    total_games_count = all_games_qs.count()
-    
-    games_for_display = all_games_qs[:DEFAULT_LIMIT]
-    
-    games_list = []
-    for game_obj in games_for_display:
-        game_info = {
-            'pk': game_obj.pk,
-            'player_top': game_obj.white_player,
-            'player_bottom': game_obj.black_player,
-            'time_control': game_obj.time_control,
-            'result_description': game_obj.result_description,
-            'moves_count': game_obj.moves_count,
-            'date': game_obj.game_date.strftime("%b %d, %Y"),
-            'is_user_white': game_obj.white_player.lower().startswith(username),
-        }
-        games_list.append(game_info)
+    # Same game-list version, same rows: repeat visits skip the game queries and the rendering
+    page = gamecache.get_or_build(request.user.pk, 'dashboard', lambda: build_dashboard_page(request.user))
 
     context = {
-        'games': games_list,
+        'game_rows': mark_safe(page['rows'].replace(CSRF_PLACEHOLDER, get_token(request))),
         'current_username': username,
-        'total_games': total_games_count,
+        'total_games': page['total_games'],
+        'games_page': page['games_page'],
+        'sync_job': sync_job_to_dict(sync_job),
     }
     return render(request, 'dashboard.html', context)
 
@@ -416,212 +349,107 @@ def search_games(request):
     username = request.user.username.lower()
     results = []
     
-    db_games_qs = ChessGame.objects.filter(user=request.user)
-    
     if query:
-        filtered_db_games_qs = db_games_qs.filter(
-            white_player__icontains=query
-        ) | db_games_qs.filter(
-            black_player__icontains=query
-        ) | db_games_qs.filter(
-            game_date__icontains=query
-        )
-        
-        for game in filtered_db_games_qs.order_by('-game_date', '-cached_at'):
-            results.append({
-                'pk': game.pk,
-                'player_top': game.white_player,
-                'player_bottom': game.black_player,
-                'time_control': game.time_control,
-                'result_description': game.result_description,
-                'moves_count': game.moves_count,
-                'date': game.game_date.strftime("%b %d, %Y"),
-            })
-
-    if not results and query:
-        print(f"Searching from API: {query}")
-        new_games_saved = 0
-        try:
-            archives_url = f'https://api.chess.com/pub/player/{username}/games/archives'
-            archives_response = requests.get(archives_url, headers=API_HEADERS, timeout=10)
-            archives_response.raise_for_status()
-            archives = archives_response.json().get('archives', [])
+        # Ranked prefix search over opponents, dates, openings and results (analysis/search.py)
+        for game in search_user_games(request.user, query):
+            results.append(game_to_dict(game, username))
 
-            recent_archives = archives[-6:]
+    response = {'games': results}
 
-            for archive_url in reversed(recent_archives):
-                games_response = requests.get(archive_url, headers=API_HEADERS, timeout=10)
-                games_response.raise_for_status()
-                api_games = games_response.json().get('games', [])
+    # No local hits: the worker scans recent chess.com months for this query,
+    # the client polls sync_status and repeats the search as matches are stored
+    if not results and query:
+        response['sync_job'] = sync_job_to_dict(enqueue_search(request.user, query))
 
-                for g in api_games:
-                    pgn_text = g.get('pgn', '')
-                    opponent = g['black']['username'] if g['white']['username'].lower() == username else g['white']['username']
-                    
-                    game_date_db = datetime.datetime.fromtimestamp(g['end_time'], tz=datetime.timezone.utc).date()
-
-                    if query in opponent.lower() or query in game_date_db.strftime('%Y-%m-%d'):
-                        
-                        if ChessGame.objects.filter(user=request.user, pgn=pgn_text).exists():
-                            existing_game = ChessGame.objects.get(user=request.user, pgn=pgn_text)
-                            pk_value = existing_game.pk
-                        else:
-                            white_player_formatted = f"{g['white']['username']} ({g['white']['rating']})"
-                            black_player_formatted = f"{g['black']['username']} ({g['black']['rating']})"
-                            is_user_white = g['white']['username'].lower() == username
-                            user_result = g['white']['result'] if is_user_white else g['black']['result']
-                            
-                            if user_result == 'win':
-                                display_result = 'Win'
-                            elif user_result in ['agreed', 'repetition', 'stalemate', 'insufficient', '50move', 'timevsinsufficient', 'draw']:
-                                display_result = 'Draw'
-                            else:
-                                display_result = 'Loss'
-
-                            moves_count = get_moves_from_pgn(pgn_text)
-
-                            new_game_obj = ChessGame.objects.create(
-                                user=request.user, pgn=pgn_text, game_date=game_date_db,
-                                white_player=white_player_formatted, black_player=black_player_formatted,
-                                time_control=g.get('time_class', 'Unknown').capitalize(),
-                                result_description=display_result, moves_count=moves_count,
-                            )
-                            new_games_saved += 1
-                            pk_value = new_game_obj.pk
-
-                        results.append({
-                            'pk': pk_value,
-                            'player_top': white_player_formatted, 
-                            'player_bottom': black_player_formatted,
-                            'time_control': new_game_obj.time_control if 'new_game_obj' in locals() else existing_game.time_control,
-                            'result_description': new_game_obj.result_description if 'new_game_obj' in locals() else existing_game.result_description,
-                            'moves_count': moves_count,
-                            'date': game_date_db.strftime("%b %d, %Y"),
-                        })
-
-                        if len(results) >= 10:
-                            break
-                
-                if len(results) >= 10:
-                    break
-            
-            if new_games_saved > 0:
-                 print(f"{new_games_saved} number of games matching the search criteria were saved in the DB.")
+    return JsonResponse(response)
 
-        except requests.RequestException as e:
-            print("API search failed:", e)
+def build_games_page(user, cursor):
+    # JSON page for load_more_games, or None once the DB is exhausted
+    games_to_return, has_more_db_games, next_cursor = get_games_page(user, cursor)
+    if not games_to_return:
+        return None
 
-    return JsonResponse({'games': results})
+    username = user.username.lower()
+    return {
+        'games': [game_to_dict(game_obj, username) for game_obj in games_to_return],
+        'loaded_from': 'db',
+        'has_more_db_games': has_more_db_games,
+        'next_cursor': next_cursor,
+    }
 
 @login_required
 def load_more_games(request):
 
-    offset = int(request.GET.get('offset', DEFAULT_LIMIT))
-    limit = DEFAULT_LIMIT
-    username = request.user.username.lower()
-    
-    db_games_qs = ChessGame.objects.filter(user=request.user).order_by('-game_date', '-cached_at')
-    games_to_return = db_games_qs[offset:offset + limit]
-    
-    games_list = []
-    
-    if games_to_return.exists():
-        print(f"Loading {games_to_return.count()} games from DB cache (offset: {offset}).")
-        for game_obj in games_to_return:
-            game_info = {
-                'pk': game_obj.pk,
-                'player_top': game_obj.white_player,
-                'player_bottom': game_obj.black_player,
-                'time_control': game_obj.time_control,
-                'result_description': game_obj.result_description,
-                'moves_count': game_obj.moves_count,
-                'date': game_obj.game_date.strftime("%b %d, %Y"),
-                'is_user_white': game_obj.white_player.lower().startswith(username),
-            }
-            games_list.append(game_info)
-        
-        has_more_db_games = db_games_qs.count() > (offset + limit)
+    cursor = request.GET.get('cursor') or None
 
-        return JsonResponse({
-            'games': games_list,
-            'loaded_from': 'db',
-            'has_more_db_games': has_more_db_games
-        })
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor.'}, status=400)
 
-    print("DB cache is exhausted. Attempting to sync/load from API.")
+    page = gamecache.get_or_build(
+        request.user.pk, f"load_more:{cursor or ''}", lambda: build_games_page(request.user, cursor)
+    )
     
-    try:
-        archives_url = f'https://api.chess.com/pub/player/{username}/games/archives'
-        archives_response = requests.get(archives_url, headers=API_HEADERS, timeout=10)
-        archives_response.raise_for_status()
-        archives = archives_response.json().get('archives', [])
-        
-        if archives:
-            latest_archive_url = archives[-1]
-            games_response = requests.get(latest_archive_url, headers=API_HEADERS, timeout=10)
-            games_response.raise_for_status()
-            api_games = games_response.json().get('games', [])
-            
-            new_games_saved_count = 0
-            
-            for g in reversed(api_games):
-                pgn_text = g.get('pgn', '')
-                
-                if not ChessGame.objects.filter(user=request.user, pgn=pgn_text).exists():
-                    game_datetime = datetime.datetime.fromtimestamp(g['end_time'], tz=datetime.timezone.utc)
-                    game_date_db = game_datetime.date()
-                    white_player_formatted = f"{g['white']['username']} ({g['white']['rating']})"
-                    black_player_formatted = f"{g['black']['username']} ({g['black']['rating']})"
-                    is_user_white = g['white']['username'].lower() == username
-                    user_result = g['white']['result'] if is_user_white else g['black']['result']
-                    
-                    if user_result == 'win':
-                        display_result = 'Win'
-                    elif user_result in ['agreed', 'repetition', 'stalemate', 'insufficient', '50move', 'timevsinsufficient', 'draw']:
-                        display_result = 'Draw'
-                    else:
-                        display_result = 'Loss'
-
-                    moves_count = get_moves_from_pgn(pgn_text)
-                    new_game_obj = ChessGame.objects.create(
-                        user=request.user, pgn=pgn_text, game_date=game_date_db,
-                        white_player=white_player_formatted, black_player=black_player_formatted,
-                        time_control=g.get('time_class', 'Unknown').capitalize(),
-                        result_description=display_result, moves_count=moves_count,
-                    )
-                    
-                    games_list.append({
-                        'pk': new_game_obj.pk,
-                        'player_top': white_player_formatted,
-                        'player_bottom': black_player_formatted,
-                        'time_control': new_game_obj.time_control,
-                        'result_description': new_game_obj.result_description,
-                        'moves_count': new_game_obj.moves_count,
-                        'date': new_game_obj.game_date.strftime("%b %d, %Y"),
-                        'is_user_white': is_user_white,
-                    })
-                    
-                    new_games_saved_count += 1
-
-                    if new_games_saved_count >= limit:
-                        break
-                        
-            if new_games_saved_count > 0:
-                return JsonResponse({
-                    'games': games_list,
-                    'loaded_from': 'api',
-                    'has_more_db_games': True 
-                })
+    if page:
+        print(f"Loading {len(page['games'])} games from DB cache.")
 
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: API connection failed during Load More: {e}")
-        pass 
-    except Exception as e:
-        print(f"Error during API sync or processing in Load More: {e}")
-        pass
+        return JsonResponse(page)
+
+    print("DB cache is exhausted. Queueing an archive sync.")
 
     return JsonResponse({
         'games': [],
         'loaded_from': 'none',
-        'has_more_db_games': False
+        'has_more_db_games': False,
+        'next_cursor': cursor,
+        'sync_job': sync_job_to_dict(enqueue_sync(request.user)),
     })
+
+@login_required
+def sync_status(request):
+    sync_jobs = SyncJob.objects.filter(user=request.user)
+
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        sync_jobs = sync_jobs.filter(pk=job_id)
+
+    sync_job = sync_jobs.first()
+    if sync_job is None:
+        return JsonResponse({'job': None, 'status': None, 'finished': True, 'games_added': 0, 'finished_at': None})
+
+    return JsonResponse(sync_job_to_dict(sync_job))
+
+@login_required
+def rating_history(request):
+    # Chart data: one range read of the daily or weekly rollups
+    time_class = request.GET.get('time_class', 'blitz')
+    period = request.GET.get('period', RatingRollup.PERIOD_WEEK)
+    if period not in (RatingRollup.PERIOD_DAY, RatingRollup.PERIOD_WEEK):
+        return JsonResponse({'error': 'Invalid period.'}, status=400)
+
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = datetime.date.fromisoformat(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date.'}, status=400)
+
+    points = [
+        {
+            'date': point['period_start'].isoformat(),
+            'open': point['open_rating'],
+            'close': point['close_rating'],
+            'low': point['min_rating'],
+            'high': point['max_rating'],
+            'games': point['samples'],
+        }
+        for point in rating_series(request.user, time_class, period, since)
+    ]
+    return JsonResponse({'time_class': time_class, 'period': period, 'points': points})
+
+@staff_member_required
+def chesscom_status(request):
+    # Queue depth and throttling of the chess.com request scheduler
+    return JsonResponse(ratelimit.snapshot())